@@ -0,0 +1,58 @@
+"""
+Compares the cost of building an EventHandler with new MongoDB, Slack and
+Places clients per Slack interaction with handing out handlers from the
+long-lived ServiceContainer.
+
+Run with: python -m benchmarks.handler_construction
+"""
+
+import os
+import timeit
+
+os.environ.setdefault("GOOGLE_PLACES_API_KEY", "benchmark")
+
+from pymongo import MongoClient  # noqa: E402
+
+from lib.api.google_places import GooglePlaces  # noqa: E402
+from lib.api.mongodb import EventMongoDAL, db_connection_string  # noqa: E402
+from lib.api.slack import Slack  # noqa: E402
+from lib.event_handler import EventHandler  # noqa: E402
+from lib.services import ServiceContainer  # noqa: E402
+
+ROUNDS = 200
+
+
+def per_request():
+    # Every interaction used to connect its own clients: a MongoClient for the
+    # DAL, closed again when the request ends, and the WebClient and
+    # PlacesClient that Slack and GooglePlaces create
+    mongo_client = MongoClient(db_connection_string, tz_aware=True)
+    event_dal = EventMongoDAL("T_BENCHMARK")
+    event_dal.database = mongo_client.events
+    event_handler = EventHandler(
+        "T_BENCHMARK",
+        event_dal=event_dal,
+        slack=Slack("T_BENCHMARK"),
+        google_places=GooglePlaces(),
+    )
+    mongo_client.close()
+    return event_handler
+
+
+def main():
+    services = ServiceContainer()
+    services.event_handler("T_BENCHMARK")  # warm up the shared dependencies
+
+    before = timeit.timeit(per_request, number=ROUNDS) / ROUNDS
+    after = (
+        timeit.timeit(lambda: services.event_handler("T_BENCHMARK"), number=ROUNDS)
+        / ROUNDS
+    )
+
+    print(f"EventHandler per request:  {before * 1e6:10.1f} us")
+    print(f"ServiceContainer handler:  {after * 1e6:10.1f} us")
+    print(f"Speedup:                   {before / after:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmarks EventMongoDAL.list_events over a seeded collection of 100k events
+spread over a few hundred teams and several years, comparing the old unbounded
+query with the windowed one on starts_at, with and without the indexes of
+INDEXES["events"].
+
+Needs a MongoDB instance, by default the one in MONGO_DB_CONNECTION_STRING.
+The events are written to a separate benchmark database which is dropped afterwards.
+
+Run with: python -m benchmarks.list_events
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from lib.api.mongodb import INDEXES, EventMongoDAL, get_mongo_client
+from lib.models.event import Event
+from lib.utils.date_utils import DEFAULT_TIMEZONE, to_starts_at
+
+DATABASE = "events_benchmark"
+EVENTS = 100_000
+TEAMS = 200
+ROUNDS = 50
+
+
+def seed(database):
+    random.seed(42)
+    today = datetime.now()
+    documents = []
+    for i in range(EVENTS):
+        date = (today + timedelta(days=random.randint(-3 * 365, 60))).strftime(
+            "%Y-%m-%d"
+        )
+        time_of_day = f"{random.randint(16, 20)}:{random.choice(['00', '30'])}"
+        participants = [f"U{j}" for j in range(random.randint(0, 30))]
+        documents.append(
+            {
+                "team_id": f"T{i % TEAMS:05d}",
+                "date": date,
+                "time": time_of_day,
+                "starts_at": to_starts_at(date, time_of_day, DEFAULT_TIMEZONE),
+                "timezone": DEFAULT_TIMEZONE,
+                "location": {"name": f"Place {i}"},
+                "description": "Benchmark event",
+                "participants": participants,
+                "participant_count": len(participants),
+                "author": "U0",
+            }
+        )
+    database.events.insert_many(documents)
+
+
+def unbounded(dal):
+    # The query list_events used to run
+    events = dal.database.events.find({"team_id": dal.team_id}).sort(
+        [("date", 1), ("time", 1)]
+    )
+    return [Event(**event) for event in events]
+
+
+def measure(name, func, dal):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        count = len(func(dal))
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    print(f"{name:40} {elapsed * 1000:8.2f} ms  ({count} events)")
+
+
+def main():
+    client = get_mongo_client()
+    client.drop_database(DATABASE)
+    database = client[DATABASE]
+    seed(database)
+
+    dal = EventMongoDAL("T00001")
+    dal.database = database
+    try:
+        measure("unbounded, no index", unbounded, dal)
+        measure("windowed, no index", lambda d: d.list_events(), dal)
+
+        database.events.create_indexes(INDEXES["events"])
+        measure("unbounded, indexed", unbounded, dal)
+        measure("windowed, indexed", lambda d: d.list_events(), dal)
+        measure("windowed, indexed, limit 10", lambda d: d.list_events(limit=10), dal)
+    finally:
+        client.drop_database(DATABASE)
+
+
+if __name__ == "__main__":
+    main()
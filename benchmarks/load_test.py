@@ -0,0 +1,93 @@
+"""
+Load tests a running deployment with signed /event commands, to compare the
+gunicorn/Flask app in bolt.py with the ASGI app in bolt_async.py.
+
+Start either app against a test workspace, then run e.g.:
+
+    python -m benchmarks.load_test http://localhost:3000/slack/events --team T123
+
+SLACK_SIGNING_SECRET must match the one of the app under test.
+"""
+
+import argparse
+import hashlib
+import hmac
+import os
+import statistics
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def signed_request(url, secret, body) -> urllib.request.Request:
+    timestamp = str(int(time.time()))
+    signature = hmac.new(
+        secret.encode(), f"v0:{timestamp}:{body}".encode(), hashlib.sha256
+    ).hexdigest()
+    return urllib.request.Request(
+        url,
+        data=body.encode(),
+        headers={
+            "Content-Type": "application/x-www-form-urlencoded",
+            "X-Slack-Request-Timestamp": timestamp,
+            "X-Slack-Signature": f"v0={signature}",
+        },
+    )
+
+
+def command_body(team_id, text) -> str:
+    return urllib.parse.urlencode(
+        {
+            "command": "/event",
+            "text": text,
+            "team_id": team_id,
+            "user_id": "ULOADTEST",
+            "channel_id": "CLOADTEST",
+            "response_url": "https://hooks.slack.com/commands/load-test",
+            "trigger_id": "load-test",
+        }
+    )
+
+
+def timed_request(url, secret, body) -> tuple[float, int]:
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(signed_request(url, secret, body)) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return time.perf_counter() - start, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("url")
+    parser.add_argument("--team", required=True, help="An installed team id")
+    parser.add_argument("--text", default="list")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    secret = os.environ["SLACK_SIGNING_SECRET"]
+    body = command_body(args.team, args.text)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(
+            pool.map(
+                lambda _: timed_request(args.url, secret, body), range(args.requests)
+            )
+        )
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status != 200)
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    print(f"requests      {len(results)} ({errors} errors)")
+    print(f"throughput    {len(results) / elapsed:8.1f} req/s")
+    print(f"median        {statistics.median(latencies) * 1000:8.1f} ms")
+    print(f"p99           {p99 * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
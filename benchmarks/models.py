@@ -0,0 +1,151 @@
+"""
+Compares building and rendering events with the slotted Event and EventPlace
+models against the previous ones, a plain Event class built with
+Event(**document) and an EventPlace wrapping a protobuf Place.
+
+Run with: python -m benchmarks.models
+"""
+
+import os
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("GOOGLE_PLACES_API_KEY", "benchmark")
+
+from bson import ObjectId  # noqa: E402
+from google.maps.places_v1.types import Place  # noqa: E402
+
+from lib.models.event import Event  # noqa: E402
+from lib.models.event_place import PLACE_SNAPSHOT_VERSION  # noqa: E402
+from lib.utils.slack_helpers import print_event_list  # noqa: E402
+
+EVENTS = (10, 100, 500)
+ROUNDS = 20
+
+
+class LegacyPlace:
+    def __init__(self, place: Place):
+        self.gMapsPlace = place
+
+    def name(self):
+        return self.gMapsPlace.display_name.text
+
+    def rating(self):
+        if "rating" in self.gMapsPlace:
+            return self.gMapsPlace.rating
+        return "Not rated"
+
+    def address(self):
+        return self.gMapsPlace.formatted_address
+
+
+class LegacyEvent:
+    def __init__(
+        self,
+        _id,
+        team_id,
+        date,
+        time,
+        location,
+        description=None,
+        participants=None,
+        author=None,
+        starts_at=None,
+        timezone=None,
+    ):
+        self._id = _id
+        self.team_id = team_id
+        self.date = date
+        self.time = time
+        self.location = LegacyPlace(
+            Place(
+                id=location["place_id"],
+                display_name={"text": location["name"]},
+                formatted_address=location["address"],
+                rating=location["rating"],
+                types=location["types"],
+                google_maps_uri=location["google_maps_url"],
+            )
+        )
+        self.participants = participants if participants is not None else []
+        self.author = author
+        self.description = description
+        self.starts_at = starts_at
+        self.timezone = timezone
+
+
+def documents(count):
+    start = datetime(2024, 1, 1, 16, tzinfo=timezone.utc)
+    return [
+        {
+            "_id": ObjectId(),
+            "team_id": "T_BENCHMARK",
+            "date": (start + timedelta(days=i)).strftime("%Y-%m-%d"),
+            "time": "18:00",
+            "location": {
+                "version": PLACE_SNAPSHOT_VERSION,
+                "name": f"Place {i}",
+                "address": f"Street {i}, Stockholm",
+                "rating": 4.2,
+                "types": ["restaurant", "bar"],
+                "place_id": f"place-{i}",
+                "website_uri": "https://example.com",
+                "google_maps_url": f"https://maps.google.com/?cid={i}",
+            },
+            "description": "Benchmark event",
+            "participants": [f"U{j}" for j in range(i % 10)],
+            "author": "U0",
+            "starts_at": start + timedelta(days=i),
+            "timezone": "Europe/Stockholm",
+        }
+        for i in range(count)
+    ]
+
+
+def read_fields(events):
+    # The fields print_event_body reads from every event
+    return [
+        (event.location.name(), event.location.rating(), event.location.address())
+        for event in events
+    ]
+
+
+def peak_memory(build, docs) -> int:
+    tracemalloc.start()
+    events = build(docs)  # noqa: F841
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    legacy_build = lambda docs: [LegacyEvent(**doc) for doc in docs]  # noqa: E731
+    build = lambda docs: [Event.from_document(doc) for doc in docs]  # noqa: E731
+
+    for count in EVENTS:
+        docs = documents(count)
+        legacy_events = legacy_build(docs)
+        events = build(docs)
+        timings = {
+            "build previous": timeit.timeit(lambda: legacy_build(docs), number=ROUNDS),
+            "build slotted": timeit.timeit(lambda: build(docs), number=ROUNDS),
+            "read previous": timeit.timeit(
+                lambda: read_fields(legacy_events), number=ROUNDS
+            ),
+            "read slotted": timeit.timeit(lambda: read_fields(events), number=ROUNDS),
+            "render slotted": timeit.timeit(
+                lambda: print_event_list(events, "U1"), number=ROUNDS
+            ),
+        }
+        print(f"{count} events")
+        for name, seconds in timings.items():
+            print(f"  {name + ':':16}{seconds / ROUNDS * 1e3:10.2f} ms")
+        print(
+            f"  {'memory previous:':16}{peak_memory(legacy_build, docs) / 1024:10.0f} KiB"
+        )
+        print(f"  {'memory slotted:':16}{peak_memory(build, docs) / 1024:10.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
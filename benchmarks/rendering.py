@@ -0,0 +1,174 @@
+"""
+Benchmarks the Block Kit renderers in lib/utils/slack_helpers.py for
+synthetic teams of 10, 100 and 1000 events with many participants,
+reporting the time and the peak allocations of a single render.
+
+Results can be saved and compared with an earlier run, which exits with
+an error when a render got slower by more than the tolerance:
+
+    python -m benchmarks.rendering --save baseline.json
+    python -m benchmarks.rendering --compare baseline.json
+
+Run with: python -m benchmarks.rendering
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("GOOGLE_PLACES_API_KEY", "benchmark")
+
+from google.maps.places_v1.types import Place  # noqa: E402
+
+from lib.models.event import Event  # noqa: E402
+from lib.models.event_place import PLACE_SNAPSHOT_VERSION, EventPlace  # noqa: E402
+from lib.utils.slack_helpers import (  # noqa: E402
+    print_event_body,
+    print_event_created,
+    print_event_list,
+    show_events_view,
+)
+
+TEAM_SIZES = (10, 100, 1000)
+PARTICIPANTS = 40
+USER = "U00001"
+
+
+def team_events(count) -> list[Event]:
+    start = datetime(2024, 1, 1, 16, tzinfo=timezone.utc)
+    return [
+        Event(
+            _id=f"{i:024x}",
+            team_id="T_BENCHMARK",
+            date=(start + timedelta(days=i)).strftime("%Y-%m-%d"),
+            time="18:00",
+            location={
+                "version": PLACE_SNAPSHOT_VERSION,
+                "name": f"Place {i}",
+                "address": f"Street {i}, Stockholm",
+                "rating": 4.2,
+                "types": ["restaurant", "bar", "cafe"],
+                "place_id": f"place-{i}",
+                "website_uri": "https://example.com",
+                "google_maps_url": f"https://maps.google.com/?cid={i}",
+            },
+            description="Benchmark event",
+            participants=[f"U{j:05d}" for j in range(PARTICIPANTS)],
+            author=USER if i % 3 == 0 else "U99999",
+            starts_at=start + timedelta(days=i),
+            timezone="Europe/Stockholm",
+        )
+        for i in range(count)
+    ]
+
+
+def suggestion() -> EventPlace:
+    return EventPlace(
+        Place(
+            id="place-1",
+            display_name={"text": "Place 1"},
+            formatted_address="Street 1, Stockholm",
+            rating=4.2,
+            types=["restaurant", "bar"],
+            website_uri="https://example.com",
+            current_opening_hours={
+                "open_now": True,
+                "weekday_descriptions": [f"Day {d}: 11-23" for d in range(7)],
+            },
+        )
+    )
+
+
+def cases():
+    """
+    The renders to measure, as name and function
+    """
+    place = suggestion()
+    yield "format_block", lambda: place.format_block()
+    event = team_events(1)[0]
+    yield "print_event_created", lambda: print_event_created(event)
+    for size in TEAM_SIZES:
+        events = team_events(size)
+        bodies = [print_event_body(event) for event in events]
+        yield f"print_event_list[{size}]", lambda e=events: print_event_list(e, USER)
+        yield f"show_events_view[{size}]", lambda e=events: show_events_view(USER, e)
+        # The render of a cached event list, only the buttons are rendered per user
+        yield (
+            f"show_events_view_cached[{size}]",
+            lambda e=events, b=bodies: show_events_view(USER, e, b),
+        )
+
+
+def measure(render, repeat=5) -> dict:
+    timer = timeit.Timer(render)
+    # Run each render for at least 0.2 seconds and keep the fastest repeat
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    tracemalloc.start()
+    render()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": seconds, "peak_bytes": peak}
+
+
+def compare(results, baseline, tolerance) -> list[str]:
+    """
+    Get the renders that got slower than the baseline by more than the tolerance
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: {ratio:.2f}x slower")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with the results in this file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="The slowdown accepted by --compare (default 0.2, i.e. 20%%)",
+    )
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    results = {}
+    print(f"{'render':32}{'time':>12}{'peak alloc':>14}{'vs baseline':>14}")
+    for name, render in cases():
+        result = results[name] = measure(render)
+        change = ""
+        if name in baseline:
+            change = f"{result['seconds'] / baseline[name]['seconds'] - 1:+.0%}"
+        print(
+            f"{name:32}{result['seconds'] * 1e3:9.3f} ms"
+            f"{result['peak_bytes'] / 1024:10.0f} KiB{change:>14}"
+        )
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("Regressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmarks the event queries of a storage backend: listing the upcoming
+events of a team, listing them for a viewer, joining and leaving, and
+inserting and deleting, over 100k seeded events of a few hundred teams.
+
+Runs on the in-memory engine by default, so no database is needed. With
+--backend mongodb the events are written to a separate benchmark database
+of MONGO_DB_CONNECTION_STRING, which is dropped afterwards.
+
+Run with: python -m benchmarks.storage [--backend mongodb]
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("GOOGLE_PLACES_API_KEY", "benchmark")
+
+from lib.api.memory import MemoryStorage  # noqa: E402
+from lib.api.mongodb import ensure_indexes, get_mongo_client  # noqa: E402
+from lib.api.storage import MongoStorage  # noqa: E402
+from lib.models.event import Event  # noqa: E402
+
+DATABASE = "events_storage_benchmark"
+EVENTS = 100_000
+TEAMS = 200
+ROUNDS = 200
+
+
+def seed(storage):
+    random.seed(42)
+    today = datetime.now()
+    event_dals = [storage.event_dal(f"T{i:05d}") for i in range(TEAMS)]
+    ids = []
+    for i in range(EVENTS):
+        event_dal = event_dals[i % TEAMS]
+        date = today + timedelta(days=random.randint(-3 * 365, 60))
+        id = event_dal.insert_event(
+            Event(
+                _id=None,
+                team_id=event_dal.team_id,
+                date=date.strftime("%Y-%m-%d"),
+                time=f"{random.randint(16, 20)}:{random.choice(['00', '30'])}",
+                location={"name": f"Place {i}"},
+                description="Benchmark event",
+                author="U0",
+            )
+        )
+        if event_dal.team_id == "T00001":
+            ids.append(id)
+    return ids
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        func(i)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    print(f"{name:40} {elapsed * 1_000_000:10.1f} µs")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backend", choices=["memory", "mongodb"], default="memory")
+    args = parser.parse_args(argv)
+
+    client = None
+    if args.backend == "mongodb":
+        client = get_mongo_client()
+        client.drop_database(DATABASE)
+        ensure_indexes(client[DATABASE])
+        storage = MongoStorage(client[DATABASE])
+    else:
+        storage = MemoryStorage()
+
+    try:
+        start = time.perf_counter()
+        ids = seed(storage)
+        print(
+            f"{'seed ' + str(EVENTS) + ' events':40} {time.perf_counter() - start:10.2f} s"
+        )
+
+        event_dal = storage.event_dal("T00001")
+        measure("list upcoming, limit 10", lambda i: event_dal.list_events(limit=10))
+        measure(
+            "list upcoming for a viewer, limit 10",
+            lambda i: event_dal.list_events(limit=10, viewer="U1"),
+        )
+        measure(
+            "join and leave",
+            lambda i: (
+                event_dal.join_event(ids[i], "U1"),
+                event_dal.leave_event(ids[i], "U1"),
+            ),
+        )
+        measure(
+            "insert and delete",
+            lambda i: event_dal.delete_event(
+                event_dal.insert_event(
+                    Event(
+                        _id=None,
+                        team_id="T00001",
+                        date="2030-01-01",
+                        time="18:00",
+                        location={"name": "Place"},
+                        author="U0",
+                    )
+                ),
+                "U0",
+            ),
+        )
+    finally:
+        if client is not None:
+            client.drop_database(DATABASE)
+
+
+if __name__ == "__main__":
+    main()
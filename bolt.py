@@ -1,3 +1,4 @@
+import atexit
 import logging
 import os
 
@@ -8,13 +9,22 @@ from slack_bolt.adapter.flask import SlackRequestHandler
 from slack_bolt.oauth.oauth_settings import OAuthSettings
 from slack_sdk.oauth.state_store import FileOAuthStateStore
 
-from lib.api import google_places
-from lib.api.mongodb import OauthMongoDAL
+from lib.api.mongodb import OAUTH_STATE_EXPIRATION_SECONDS, ensure_indexes
+from lib.archive import EventArchiver
+from lib.bolt.listeners import create_event_from_view, handle_command, uses_trigger
 from lib.bolt.MongoDBBoltOAuth import MongoInstallationStore
 from lib.bolt.MongoDBBoltOAuthStateStore import MongoDBOAuthStateStore
-from lib.event_handler import EventHandler
-from lib.utils.helpers import validate_token
-from lib.utils.slack_helpers import build_create_dialog
+from lib.bolt.settings import BOT_SCOPES, USER_SCOPES
+from lib.change_watcher import ChangeWatcher
+from lib.reminders import ReminderScheduler
+from lib.services import ServiceContainer
+from lib.utils.background import BackgroundExecutor
+from lib.utils.invalidation import invalidation_bus
+from lib.utils.metrics import metrics
+from lib.utils.slack_helpers import (
+    build_create_dialog,
+    build_participants_loading_view,
+)
 
 load_dotenv()
 
@@ -25,27 +35,11 @@ oauth_settings = OAuthSettings(
     client_id=os.environ["SLACK_CLIENT_ID"],
     client_secret=os.environ["SLACK_CLIENT_SECRET"],
     installation_store=MongoInstallationStore(),
-    state_store=MongoDBOAuthStateStore(expiration_seconds=600),
-    scopes=[
-        "channels:history",
-        "channels:join",
-        "chat:write",
-        "chat:write.customize",
-        "chat:write.public",
-        "commands",
-        "groups:history",
-        "im:history",
-        "im:read",
-        "im:write",
-        "im:write.topic",
-        "incoming-webhook",
-        "mpim:history",
-        "mpim:read",
-        "mpim:write",
-        "mpim:write.topic",
-        "channels:read",
-    ],
-    user_scopes=["channels:write.invites"],
+    state_store=MongoDBOAuthStateStore(
+        expiration_seconds=OAUTH_STATE_EXPIRATION_SECONDS
+    ),
+    scopes=BOT_SCOPES,
+    user_scopes=USER_SCOPES,
 )
 
 app = App(
@@ -53,8 +47,19 @@ app = App(
     signing_secret=os.environ.get("SLACK_SIGNING_SECRET"),
     oauth_settings=oauth_settings,
 )
-google_places = google_places.GooglePlaces()
-oauth_dal = OauthMongoDAL()
+services = ServiceContainer()
+background = BackgroundExecutor()
+atexit.register(background.shutdown, timeout=25)
+oauth_dal = services.storage.oauth_dal()
+if os.getenv("MONGO_ENSURE_INDEXES", "true") == "true":
+    ensure_indexes()
+if os.getenv("REMINDERS_ENABLED") == "true":
+    ReminderScheduler(services).start_in_background()
+if os.getenv("ARCHIVE_ENABLED") == "true":
+    EventArchiver().start_in_background()
+if os.getenv("CHANGE_WATCH_ENABLED") == "true":
+    invalidation_bus.subscribe(("events",), services.refresh_home_tabs)
+    ChangeWatcher().start_in_background()
 
 
 @app.middleware  # Middleware to dynamically set the bot token
@@ -64,48 +69,28 @@ def set_bot_token(context, next, logger):
         logger.error("No team_id found in the context.")
         return
 
-    workspace = oauth_dal.get_workspace(team_id)
+    workspace = oauth_dal.get_workspace(team_id, context.get("enterprise_id"))
     if workspace:
         context["bot_token"] = workspace["bot_token"]
+        context["client"] = services.web_client(team_id, workspace["bot_token"])
         logger.info(f"Bot token set for team {team_id}")
     else:
         logger.error(f"No token found for team {team_id}")
     next()
 
 
-def handle_command(command, respond, say, client):
-    token = command.get("token", None)
-    type = command.get("type", None)
-    ssl_check = command.get("ssl_check", None)
-    challenge = command.get("challenge", None)
-    text = command.get("text", None)
-
-    if not validate_token(token):
-        return respond("Unauthorized")
-
-    if type is not None and type == "block_actions":
-        event_handler = EventHandler(
-            command.get("user").get("team_id"), client, say, respond
-        )
-        return event_handler.handle_interactive_event(command)
-    if challenge is not None:
-        return {"challenge": challenge}
-    if ssl_check is not None:
-        return {"ssl_check": ssl_check}
-    if text is not None:
-        event_handler = EventHandler(command.get("team_id"), client, say, respond)
-        return event_handler.parse_command(text, command)
-
-
 @app.command("/event")
 def command_event(ack, respond, command, say, client):
     ack()
-    handle_command(command, respond, say, client)
+    if uses_trigger(command):
+        handle_command(services, command, respond, say, client)
+    else:
+        background.submit(handle_command, services, command, respond, say, client)
 
 
 @app.options("suggest_place")
 def suggest_place(ack, payload):
-    suggestions = google_places.get_place_suggestions(payload["value"])
+    suggestions = services.google_places.get_place_suggestions(payload["value"])
     ack(options=suggestions)
 
 
@@ -119,51 +104,79 @@ def handle_some_action(ack, body, payload, client):
     ack()
     client.views_open(
         trigger_id=body["trigger_id"],
-        view=build_create_dialog(value=payload["value"]),
+        view=build_create_dialog(
+            value=payload["value"], google_places=services.google_places
+        ),
     )
 
 
 @app.action("create_event_action")
 def handle_create_event_action(ack, body, client):
     ack()
-    client.views_open(trigger_id=body["trigger_id"], view=build_create_dialog())
+    client.views_open(
+        trigger_id=body["trigger_id"],
+        view=build_create_dialog(google_places=services.google_places),
+    )
 
 
 @app.action("join_event")
 def handle_join_action(ack, body, respond, say, client):
     ack()
-    handle_command(body, respond, say, client)
+    background.submit(handle_command, services, body, respond, say, client)
 
 
 @app.action("leave_event")
 def handle_leave_action(ack, body, respond, say, client):
     ack()
-    handle_command(body, respond, say, client)
+    background.submit(handle_command, services, body, respond, say, client)
 
 
 @app.action("delete_event")
 def handle_delete_action(ack, body, respond, say, client):
     ack()
-    handle_command(body, respond, say, client)
+    background.submit(handle_command, services, body, respond, say, client)
+
+
+@app.action("more_events")
+def handle_more_events_action(ack, body, respond, say, client):
+    ack()
+    background.submit(handle_command, services, body, respond, say, client)
+
+
+@app.action("show_participants")
+def handle_show_participants_action(ack, body, respond, say, client):
+    ack()
+    if body.get("view", {}).get("callback_id") != "participants_view":
+        # The trigger_id expires after three seconds, open the modal now and
+        # fill in the participants from the background
+        response = client.views_open(
+            trigger_id=body["trigger_id"], view=build_participants_loading_view()
+        )
+        body = {**body, "view": response["view"]}
+    background.submit(handle_command, services, body, respond, say, client)
 
 
 @app.view("create_event_dialog|")
 def handle_view_submission_events(ack, body, client, say, respond):
     ack()
-    event_handler = EventHandler(body.get("team").get("id"), client, say, respond)
-    event_handler.create_event_response(body)
-    if body.get("view", {}).get("id"):
-        user_id = body.get("user").get("id")
-        event_handler.update_events_view(user_id)
+    background.submit(create_event_from_view, services, body, client, say, respond)
 
 
 @app.event("app_home_opened")
 def show_home_tab(ack, client, event, body):
     ack()
     if event.get("view", {}).get("id"):
-        event_handler = EventHandler(event.get("view", {}).get("team_id"), client)
-        user_id = event.get("user")
-        event_handler.update_events_view(user_id)
+        event_handler = services.event_handler(
+            event.get("view", {}).get("team_id"), client
+        )
+        background.submit(event_handler.update_events_view, event.get("user"))
+
+
+@app.event("channel_created")
+@app.event("channel_rename")
+def refresh_channels(ack, body):
+    ack()
+    services.slack(body.get("team_id")).channels.refresh_in_background()
 
 
 flask_app = Flask(__name__)
@@ -177,5 +190,10 @@ def slack_events():
     return handler.handle(request)
 
 
+@flask_app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+
 if __name__ == "__main__":
     flask_app.run(port=int(os.environ.get("PORT", 3000)), host="0.0.0.0")
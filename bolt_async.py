@@ -0,0 +1,229 @@
+"""
+The app on Bolt's AsyncApp, served by any ASGI server:
+
+    uvicorn bolt_async:api --host 0.0.0.0 --port 3000
+
+The hot paths (the bot token lookup and the place picker) use the async MongoDB
+driver and the async Places client, the EventHandler logic is shared with
+bolt.py and runs on worker threads.
+"""
+
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+from slack_bolt.adapter.asgi.async_handler import AsyncSlackRequestHandler
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.context.respond import Respond
+from slack_bolt.context.say import Say
+from slack_bolt.oauth.async_oauth_settings import AsyncOAuthSettings
+
+from lib.api.google_places import AsyncGooglePlaces
+from lib.api.mongodb import (
+    OAUTH_STATE_EXPIRATION_SECONDS,
+    AsyncOauthMongoDAL,
+    ensure_indexes,
+)
+from lib.archive import EventArchiver
+from lib.bolt.AsyncMongoDBBoltOAuth import (
+    AsyncMongoDBOAuthStateStore,
+    AsyncMongoInstallationStore,
+)
+from lib.bolt.listeners import create_event_from_view, handle_command, uses_trigger
+from lib.bolt.settings import BOT_SCOPES, USER_SCOPES
+from lib.change_watcher import ChangeWatcher
+from lib.reminders import ReminderScheduler
+from lib.services import ServiceContainer
+from lib.utils.helpers import validate_token
+from lib.utils.invalidation import invalidation_bus
+from lib.utils.metrics import metrics
+from lib.utils.slack_helpers import (
+    build_create_dialog,
+    build_participants_loading_view,
+)
+
+load_dotenv()
+
+
+logging.basicConfig(level=logging.INFO)
+oauth_settings = AsyncOAuthSettings(
+    client_id=os.environ["SLACK_CLIENT_ID"],
+    client_secret=os.environ["SLACK_CLIENT_SECRET"],
+    installation_store=AsyncMongoInstallationStore(),
+    state_store=AsyncMongoDBOAuthStateStore(
+        expiration_seconds=OAUTH_STATE_EXPIRATION_SECONDS
+    ),
+    scopes=BOT_SCOPES,
+    user_scopes=USER_SCOPES,
+)
+
+app = AsyncApp(
+    token=os.environ.get("SLACK_APP_TOKEN"),
+    signing_secret=os.environ.get("SLACK_SIGNING_SECRET"),
+    oauth_settings=oauth_settings,
+)
+services = ServiceContainer()
+google_places = AsyncGooglePlaces()
+oauth_dal = AsyncOauthMongoDAL()
+if os.getenv("MONGO_ENSURE_INDEXES", "true") == "true":
+    ensure_indexes()
+if os.getenv("REMINDERS_ENABLED") == "true":
+    ReminderScheduler(services).start_in_background()
+if os.getenv("ARCHIVE_ENABLED") == "true":
+    EventArchiver().start_in_background()
+if os.getenv("CHANGE_WATCH_ENABLED") == "true":
+    invalidation_bus.subscribe(("events",), services.refresh_home_tabs)
+    ChangeWatcher().start_in_background()
+
+
+def sync_functions(context):
+    """
+    Build the sync client, say and respond functions the EventHandler expects
+    from the context of an async request.
+    """
+    client = services.web_client(context.get("team_id"), context.get("bot_token"))
+    say = Say(client=client, channel=context.channel_id)
+    respond = Respond(response_url=context.response_url)
+    return client, say, respond
+
+
+@app.middleware  # Middleware to dynamically set the bot token
+async def set_bot_token(context, next, logger):
+    team_id = context.get("team_id")
+    if not team_id:
+        logger.error("No team_id found in the context.")
+        return
+
+    workspace = await oauth_dal.get_workspace(team_id, context.get("enterprise_id"))
+    if workspace:
+        context["bot_token"] = workspace["bot_token"]
+        context["client"] = services.async_web_client(team_id, workspace["bot_token"])
+        logger.info(f"Bot token set for team {team_id}")
+    else:
+        logger.error(f"No token found for team {team_id}")
+    await next()
+
+
+@app.command("/event")
+async def command_event(ack, command, context, client, respond):
+    await ack()
+    if uses_trigger(command):
+        # Open the modal before the trigger_id expires, without a worker thread
+        if not validate_token(command.get("token")):
+            return await respond("Unauthorized")
+        await client.views_open(
+            trigger_id=command["trigger_id"],
+            view=build_create_dialog(google_places=services.google_places),
+        )
+        return await respond("Please follow the instructions in the dialog!")
+    client, say, respond = sync_functions(context)
+    await asyncio.to_thread(handle_command, services, command, respond, say, client)
+
+
+@app.options("suggest_place")
+async def suggest_place(ack, payload):
+    suggestions = await google_places.get_place_suggestions(payload["value"])
+    await ack(options=suggestions)
+
+
+@app.action("suggest_place")
+async def handle_suggest_place(ack):
+    await ack()
+
+
+@app.action("create_event_suggest")
+async def handle_some_action(ack, body, payload, client):
+    await ack()
+    view = await asyncio.to_thread(
+        build_create_dialog,
+        value=payload["value"],
+        google_places=services.google_places,
+    )
+    await client.views_open(trigger_id=body["trigger_id"], view=view)
+
+
+@app.action("create_event_action")
+async def handle_create_event_action(ack, body, client):
+    await ack()
+    await client.views_open(
+        trigger_id=body["trigger_id"],
+        view=build_create_dialog(google_places=services.google_places),
+    )
+
+
+@app.action("join_event")
+@app.action("leave_event")
+@app.action("delete_event")
+@app.action("more_events")
+async def handle_event_action(ack, body, context):
+    await ack()
+    client, say, respond = sync_functions(context)
+    await asyncio.to_thread(handle_command, services, body, respond, say, client)
+
+
+@app.action("show_participants")
+async def handle_show_participants_action(ack, body, context, client):
+    await ack()
+    if body.get("view", {}).get("callback_id") != "participants_view":
+        # The trigger_id expires after three seconds, open the modal before
+        # the participants are looked up
+        response = await client.views_open(
+            trigger_id=body["trigger_id"], view=build_participants_loading_view()
+        )
+        body = {**body, "view": response["view"]}
+    sync_client, say, respond = sync_functions(context)
+    await asyncio.to_thread(handle_command, services, body, respond, say, sync_client)
+
+
+@app.view("create_event_dialog|")
+async def handle_view_submission_events(ack, body, context):
+    await ack()
+    client, say, respond = sync_functions(context)
+    await asyncio.to_thread(
+        create_event_from_view, services, body, client, say, respond
+    )
+
+
+@app.event("app_home_opened")
+async def show_home_tab(ack, event, context):
+    await ack()
+    if event.get("view", {}).get("id"):
+        client, _, _ = sync_functions(context)
+        event_handler = services.event_handler(
+            event.get("view", {}).get("team_id"), client
+        )
+        await asyncio.to_thread(event_handler.update_events_view, event.get("user"))
+
+
+@app.event("channel_created")
+@app.event("channel_rename")
+async def refresh_channels(ack, body):
+    await ack()
+    services.slack(body.get("team_id")).channels.refresh_in_background()
+
+
+slack_handler = AsyncSlackRequestHandler(app)
+
+
+async def api(scope, receive, send):
+    """
+    The ASGI application, serves the metrics next to the Slack endpoints
+    """
+    if scope["type"] == "http" and scope["path"] == "/metrics":
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/plain; version=0.0.4")],
+            }
+        )
+        await send({"type": "http.response.body", "body": metrics.render().encode()})
+        return
+    await slack_handler(scope, receive, send)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(api, host="0.0.0.0", port=int(os.environ.get("PORT", 3000)))
@@ -1,19 +1,206 @@
+import asyncio
 import logging
 import os
+import threading
+from datetime import datetime, timezone
 
 import google.maps.places_v1.types as place_types
 from google.maps import places_v1
 
-fieldMask = "places.displayName,places.formattedAddress,places.priceLevel,places.rating,places.types,places.id,places.current_opening_hours,places.icon_mask_base_uri,places.website_uri,places.photos,places.reviews,places.business_status"
+from lib.api.mongodb import PlaceCacheMongoDAL
+from lib.models.event_place import PLACE_SNAPSHOT_FIELDS, EventPlace
+from lib.utils.cache import TTLCache
+from lib.utils.metrics import metrics
+
+fieldMask = "places.displayName,places.formattedAddress,places.priceLevel,places.rating,places.types,places.id,places.current_opening_hours,places.icon_mask_base_uri,places.website_uri,places.business_status"
+# The options list only renders the name and address and uses the id as value
+suggestionFieldMask = "places.id,places.displayName,places.formattedAddress"
+# The Places API field behind each field of the place snapshot stored on events
+SNAPSHOT_PLACE_FIELDS = {
+    "name": "displayName",
+    "address": "formattedAddress",
+    "rating": "rating",
+    "types": "types",
+    "place_id": "id",
+    "website_uri": "websiteUri",
+    "google_maps_url": "googleMapsUri",
+}
+# Only what format_place stores, other fields raise the billed SKU
+detailsFieldMask = ",".join(
+    SNAPSHOT_PLACE_FIELDS[field] for field in PLACE_SNAPSHOT_FIELDS
+)
+
+# Suggestions only list places that are open now, so they are kept briefly
+suggestion_cache = TTLCache(
+    maxsize=int(os.getenv("PLACES_SUGGESTION_CACHE_SIZE", 2048)),
+    ttl=int(os.getenv("PLACES_SUGGESTION_CACHE_TTL_SECONDS", 300)),
+    name="place_suggestions",
+)
+# A cached prefix may only answer a longer query if enough of its results match it
+PREFIX_MIN_RESULTS = 5
+
+
+def normalize_query(query) -> str:
+    return " ".join(query.lower().split())
+
+
+def suggestions_request(query, region_code) -> places_v1.SearchTextRequest:
+    return places_v1.SearchTextRequest(
+        text_query=query, open_now=True, region_code=region_code
+    )
+
+
+def format_suggestions(places) -> list[dict]:
+    """
+    Format places as options for the place picker
+    """
+    return [
+        {
+            "text": {
+                "type": "plain_text",
+                "text": place.display_name.text,
+            },
+            "description": {
+                "type": "plain_text",
+                "text": place.formatted_address,
+            },
+            "value": place.id,
+        }
+        for place in places
+    ]
+
+
+def suggestions_from_prefix(region_code, query) -> list[dict] | None:
+    """
+    Answer a refined query from the cached results of a shorter query,
+    e.g. "pub soho" from "pub", if enough of those results match it.
+    """
+    tokens = query.split()
+    for end in range(len(query) - 1, 2, -1):
+        cached = suggestion_cache.peek((region_code, query[:end]))
+        if cached is None:
+            continue
+        matching = [
+            suggestion
+            for suggestion in cached
+            if all(
+                token
+                in normalize_query(
+                    f"{suggestion['text']['text']} {suggestion['description']['text']}"
+                )
+                for token in tokens
+            )
+        ]
+        if len(matching) >= PREFIX_MIN_RESULTS:
+            return matching
+        return None
+    return None
+
+
+class PlaceDetailsCache:
+    """
+    A two tier cache of place details, an in-memory LRU in front of the
+    places_cache collection in MongoDB. Places are stored in their binary
+    protobuf form and refetched once they are older than max_age_seconds.
+    """
+
+    def __init__(
+        self, place_dal=None, max_age_seconds=None, maxsize=None, persist=None
+    ):
+        """
+        :param place_dal: The store of the second tier, defaults to places_cache in MongoDB
+        :param max_age_seconds: How long a place is served before it is refetched
+        :param maxsize: The size of the in-memory tier
+        :param persist: Whether to use the second tier, defaults to PLACES_CACHE_PERSIST
+        """
+        self.max_age_seconds = max_age_seconds or int(
+            os.getenv("PLACES_DETAILS_MAX_AGE_SECONDS", 7 * 24 * 3600)
+        )
+        self.memory = TTLCache(
+            maxsize=maxsize or int(os.getenv("PLACES_DETAILS_CACHE_SIZE", 1024)),
+            ttl=self.max_age_seconds,
+        )
+        self._place_dal = place_dal
+        self.persist = (
+            persist
+            if persist is not None
+            else os.getenv("PLACES_CACHE_PERSIST") != "false"
+        )
+        self.hits = 0
+        self.misses = 0
+        metrics.register_gauge("place_details_cache_hit_ratio", self.hit_ratio)
+
+    @property
+    def place_dal(self):
+        if self._place_dal is None and self.persist:
+            self._place_dal = PlaceCacheMongoDAL()
+        return self._place_dal
+
+    def get(self, place_id) -> tuple[place_types.Place | None, bool]:
+        """
+        Get a place from the cache
+        :param place_id: The Google place id
+        :return: The place, or None if it isn't cached, and whether it is stale
+        """
+        place = self.memory.get(place_id)
+        if place is not None:
+            self._hit("memory")
+            return place, False
+
+        document = self.place_dal.get_place(place_id) if self.place_dal else None
+        if document is None:
+            self._miss()
+            return None, False
+
+        place = place_types.Place.deserialize(document["data"])
+        fetched_at = document["fetched_at"]
+        if fetched_at.tzinfo is None:
+            fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+        age = (datetime.now(timezone.utc) - fetched_at).total_seconds()
+        if age > self.max_age_seconds:
+            self._miss()
+            return place, True
+
+        self.memory.set(place_id, place, ttl=self.max_age_seconds - age)
+        self._hit("mongo")
+        return place, False
+
+    def set(self, place: place_types.Place):
+        """
+        Store a place in both tiers of the cache
+        :param place: The place to store
+        """
+        self.memory.set(place.id, place)
+        if self.place_dal:
+            self.place_dal.save_place(place.id, place_types.Place.serialize(place))
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _hit(self, tier):
+        self.hits += 1
+        metrics.inc("place_details_cache_hits_total", tier=tier)
+        metrics.inc("places_api_calls_saved_total")
+
+    def _miss(self):
+        self.misses += 1
+        metrics.inc("place_details_cache_misses_total")
 
 
 class GooglePlaces:
-    def __init__(self):
+    def __init__(self, details_cache=None):
         self.logger = logging.getLogger()
         self.logger.setLevel(logging.INFO)
         self.gMaps = places_v1.PlacesClient(
             client_options={"api_key": os.environ["GOOGLE_PLACES_API_KEY"]},
         )
+        self.region_code = os.getenv("GOOGLE_PLACES_REGION")
+        self.details_cache = (
+            details_cache if details_cache is not None else PlaceDetailsCache()
+        )
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
 
     def get_suggestions(self, area) -> list[place_types.Place]:
         suggestions = places_v1.SearchTextRequest(text_query=area, open_now=True)
@@ -26,49 +213,130 @@ class GooglePlaces:
         return []
 
     def get_place_information(self, place_id) -> place_types.Place:
+        """
+        Get the details of a place, served from the place details cache when possible.
+        A stale cached place is returned if the place can't be fetched.
+        :param place_id: The Google place id
+        :return: The place
+        """
+        cached, stale = self.details_cache.get(place_id)
+        if cached is not None and not stale:
+            return cached
+
         place = places_v1.GetPlaceRequest(
             name=f"places/{place_id}",
         )
-        fieldMask = "*"
-        return self.gMaps.get_place(
-            request=place, metadata=[("x-goog-fieldmask", fieldMask)]
-        )
+        try:
+            place = self.gMaps.get_place(
+                request=place, metadata=[("x-goog-fieldmask", detailsFieldMask)]
+            )
+        except Exception as e:
+            if cached is None:
+                raise
+            self.logger.warning(f"Serving stale place {place_id}: {e}")
+            return cached
+
+        self.details_cache.set(place)
+        return place
 
     def get_place_suggestions(self, place_name) -> list[dict]:
-        self.logger.info(place_name)
-        suggestions = []
-        places = places_v1.SearchTextRequest(text_query=place_name, open_now=True)
+        """
+        Get the options for the place picker, served from the suggestion cache when possible.
+        Identical queries that arrive while a search is running wait for that search.
+        :param place_name: The text the user typed
+        :return: A list of Slack options
+        """
+        query = normalize_query(place_name)
+        key = (self.region_code, query)
+        suggestions = suggestion_cache.get(key)
+        if suggestions is not None:
+            return suggestions
 
+        # Not cached under the refined query, so it is searched once the
+        # results of the prefix expire
+        suggestions = suggestions_from_prefix(self.region_code, query)
+        if suggestions is not None:
+            return suggestions
+
+        with self._in_flight_lock:
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                self._in_flight[key] = threading.Event()
+
+        if in_flight is not None:
+            in_flight.wait(timeout=2)
+            suggestions = suggestion_cache.get(key)
+            if suggestions is not None:
+                return suggestions
+
+        try:
+            suggestions = self._search_place_suggestions(query)
+            suggestion_cache.set(key, suggestions)
+            return suggestions
+        finally:
+            if in_flight is None:
+                with self._in_flight_lock:
+                    self._in_flight.pop(key).set()
+
+    def _search_place_suggestions(self, query) -> list[dict]:
+        self.logger.info(query)
         places_result = self.gMaps.search_text(
-            request=places, metadata=[("x-goog-fieldmask", fieldMask)]
+            request=suggestions_request(query, self.region_code),
+            metadata=[("x-goog-fieldmask", suggestionFieldMask)],
         )
+        return format_suggestions(places_result.places)
 
-        for place in places_result.places:
-            suggestions.append(
-                {
-                    "text": {
-                        "type": "plain_text",
-                        "text": place.display_name.text,
-                    },
-                    "description": {
-                        "type": "plain_text",
-                        "text": place.formatted_address,
-                    },
-                    "value": place.id,
-                }
-            )
+    def format_place(self, place: place_types.Place):
+        return EventPlace(place).to_document()
 
+
+class AsyncGooglePlaces:
+    """
+    The place picker search of GooglePlaces for the AsyncApp, built on the
+    async Places client and sharing the suggestion cache.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger()
+        self.logger.setLevel(logging.INFO)
+        self.gMaps = places_v1.PlacesAsyncClient(
+            client_options={"api_key": os.environ["GOOGLE_PLACES_API_KEY"]},
+        )
+        self.region_code = os.getenv("GOOGLE_PLACES_REGION")
+        self._in_flight = {}
+
+    async def get_place_suggestions(self, place_name) -> list[dict]:
+        """
+        Get the options for the place picker, served from the suggestion cache when possible.
+        Identical queries that arrive while a search is running share that search.
+        :param place_name: The text the user typed
+        :return: A list of Slack options
+        """
+        query = normalize_query(place_name)
+        key = (self.region_code, query)
+        suggestions = suggestion_cache.get(key)
+        if suggestions is not None:
+            return suggestions
+
+        # Not cached under the refined query, so it is searched once the
+        # results of the prefix expire
+        suggestions = suggestions_from_prefix(self.region_code, query)
+        if suggestions is not None:
+            return suggestions
+
+        search = self._in_flight.get(key)
+        if search is None:
+            search = asyncio.ensure_future(self._search_place_suggestions(query))
+            self._in_flight[key] = search
+            search.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        suggestions = await asyncio.shield(search)
+        suggestion_cache.set(key, suggestions)
         return suggestions
 
-    def format_place(self, place: place_types.Place):
-        return {
-            "name": place.display_name.text,
-            "address": place.formatted_address,
-            "price_level": place.price_level,
-            "rating": place.rating,
-            "types": list(place.types),
-            "place_id": place.id,
-            "website_uri": place.website_uri,
-            "business_status": place.business_status,
-            "google_maps_url": place.google_maps_uri,
-        }
+    async def _search_place_suggestions(self, query) -> list[dict]:
+        self.logger.info(query)
+        places_result = await self.gMaps.search_text(
+            request=suggestions_request(query, self.region_code),
+            metadata=[("x-goog-fieldmask", suggestionFieldMask)],
+        )
+        return format_suggestions(places_result.places)
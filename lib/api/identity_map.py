@@ -0,0 +1,150 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import replace
+
+from lib.models.event import Event
+
+_identity_map = ContextVar("identity_map", default=None)
+
+
+def apply_change(events, change, limit=None, include=None) -> list[Event] | None:
+    """
+    Apply a change recorded by an IdentityMap to a list of events sorted by start.
+    Changed events are replaced by copies, the given list and events are never modified.
+    :param events: The events of a query
+    :param change: The change as recorded by the IdentityMap
+    :param limit: The limit of the query, if any
+    :param include: Tells whether an inserted event matches the query, defaults to all
+    :return: The events after the change, or None if they can only be known by querying again
+    """
+    kind, event_id, value = change
+    if kind == "inserted":
+        if value.starts_at is None or (include is not None and not include(value)):
+            return events
+        patched = sorted(
+            [*events, value], key=lambda event: (event.starts_at, str(event._id))
+        )
+        return patched[:limit] if limit is not None else patched
+
+    index = next(
+        (i for i, event in enumerate(events) if str(event._id) == event_id), None
+    )
+    if index is None:
+        return events
+    if kind == "deleted":
+        if limit is not None and len(events) >= limit:
+            # The event following the list would move up into it
+            return None
+        return events[:index] + events[index + 1 :]
+
+    event = events[index]
+    participants = [user for user in event.participants if user != value]
+    if kind == "joined":
+        participants.append(value)
+    # The DAL only records joins and leaves that changed the participants
+    count = event.participant_count + (1 if kind == "joined" else -1)
+    patched = list(events)
+    patched[index] = replace(
+        event, participants=participants, participant_count=max(count, 0)
+    )
+    return patched
+
+
+class IdentityMap:
+    """
+    The events read and written during one Slack interaction. The event DAL
+    answers repeated reads of the interaction from it, keeps the lists it
+    loaded in step with the writes of the interaction and records the writes,
+    so cached renders can be patched instead of queried again.
+    """
+
+    def __init__(self):
+        self.events = {}
+        self.lists = {}
+        self.changes = []
+
+    def get(self, event_id) -> Event | None:
+        return self.events.get(str(event_id))
+
+    def add(self, event) -> Event:
+        """
+        Add a loaded event, returning the instance already mapped for its id if any
+        """
+        return self.events.setdefault(str(event._id), event)
+
+    def get_list(self, key) -> list[Event] | None:
+        entry = self.lists.get(key)
+        return list(entry[0]) if entry is not None else None
+
+    def add_list(self, key, events, limit=None, include=None) -> list[Event]:
+        """
+        Add the result of a query
+        :param key: The key identifying the query
+        :param events: The events the query returned
+        :param limit: The limit of the query, if any
+        :param include: Tells whether an event inserted later matches the query
+        :return: The events, mapped to the instances already loaded
+        """
+        events = [self.add(event) for event in events]
+        self.lists[key] = (events, limit, include)
+        return list(events)
+
+    def inserted(self, event):
+        self._record(("inserted", str(event._id), event))
+
+    def joined(self, event_id, user):
+        self._record(("joined", str(event_id), user))
+
+    def left(self, event_id, user):
+        self._record(("left", str(event_id), user))
+
+    def deleted(self, event_id):
+        self._record(("deleted", str(event_id), None))
+
+    def take_changes(self) -> list[tuple]:
+        """
+        Get the changes recorded since the last call
+        """
+        changes, self.changes = self.changes, []
+        return changes
+
+    def _record(self, change):
+        self.changes.append(change)
+        kind, event_id, value = change
+        if kind == "deleted":
+            self.events.pop(event_id, None)
+        elif kind == "inserted":
+            self.events[event_id] = value
+        elif event_id in self.events:
+            self.events[event_id] = apply_change([self.events[event_id]], change)[0]
+        for key, (events, limit, include) in list(self.lists.items()):
+            patched = apply_change(events, change, limit, include)
+            if patched is None:
+                del self.lists[key]
+            else:
+                patched = [self.events.get(str(e._id), e) for e in patched]
+                self.lists[key] = (patched, limit, include)
+
+
+def current_identity_map() -> IdentityMap | None:
+    """
+    Get the identity map of the current interaction, None outside of request_scope
+    """
+    return _identity_map.get()
+
+
+@contextmanager
+def request_scope():
+    """
+    Run the enclosed code as one interaction with its own identity map.
+    Nested scopes share the identity map of the outer one.
+    """
+    if _identity_map.get() is not None:
+        yield _identity_map.get()
+        return
+    identity_map = IdentityMap()
+    token = _identity_map.set(identity_map)
+    try:
+        yield identity_map
+    finally:
+        _identity_map.reset(token)
@@ -0,0 +1,322 @@
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from dataclasses import replace
+from datetime import datetime, timezone
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+
+from lib.api.identity_map import current_identity_map
+from lib.api.mongodb import (
+    ALREADY_PARTICIPANT,
+    CHANGED_EVENT_PROJECTION,
+    EVENT_NOT_FOUND,
+    EVENT_REQUIRED_FIELDS,
+    NOT_EVENT_AUTHOR,
+    NOT_PARTICIPANT,
+    PARTICIPANTS_PAGE_SIZE,
+    SUMMARY_FIELDS,
+    WRITE_FAILED,
+    EventMongoDAL,
+)
+from lib.models.event import PARTICIPANT_PREVIEW_SIZE, Event
+from lib.utils.date_utils import DEFAULT_TIMEZONE, day_bounds, today_in
+
+
+def project(document, projection) -> dict:
+    """
+    Apply a MongoDB style projection of included (1) or excluded (0) fields
+    to a document, dotted fields select fields of embedded documents
+    """
+    if not projection:
+        return document
+    if not any(projection.values()):
+        return {key: value for key, value in document.items() if key not in projection}
+    projected = {"_id": document["_id"]} if "_id" in document else {}
+    for field in projection:
+        key, _, rest = field.partition(".")
+        if key not in document:
+            continue
+        if rest and isinstance(document[key], dict):
+            nested = project(document[key], {rest: 1})
+            projected[key] = {**projected.get(key, {}), **nested}
+        else:
+            projected[key] = document[key]
+    return projected
+
+
+class MemoryStorage:
+    """
+    Keeps events and workspace installations in memory, for tests and for
+    benchmarks without a database. Events are indexed by team and start, so
+    listing a window of a team's events costs a binary search. Not shared
+    between processes and lost when the process exits.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.events = {}
+        # The (starts_at, _id) of the events of each team in order
+        self.event_index = defaultdict(list)
+        # Installations by team and org wide installations by enterprise
+        self.installations = {}
+        self.enterprise_installations = {}
+
+    def event_dal(self, team_id, timezone=None) -> "MemoryEventDAL":
+        return MemoryEventDAL(team_id, self, timezone)
+
+    def oauth_dal(self) -> "MemoryOauthDAL":
+        return MemoryOauthDAL(self)
+
+    def place_dal(self) -> None:
+        """
+        Place details are only cached in memory, there is nothing to persist them to
+        """
+        return None
+
+    def save_installation(self, installation):
+        """
+        Store the installation document of a workspace, replacing an earlier one
+        """
+        with self.lock:
+            if installation.get("team_id") is not None:
+                self.installations[installation["team_id"]] = dict(installation)
+            else:
+                self.enterprise_installations[installation["enterprise_id"]] = dict(
+                    installation
+                )
+
+    def add_event(self, document):
+        with self.lock:
+            self.events[document["_id"]] = document
+            if document.get("starts_at") is not None:
+                insort(
+                    self.event_index[document["team_id"]],
+                    (document["starts_at"], document["_id"]),
+                )
+
+    def remove_event(self, document):
+        with self.lock:
+            del self.events[document["_id"]]
+            if document.get("starts_at") is not None:
+                index = self.event_index[document["team_id"]]
+                key = (document["starts_at"], document["_id"])
+                del index[bisect_left(index, key)]
+
+
+class MemoryEventDAL:
+    """
+    The queries of EventMongoDAL on a MemoryStorage, with the same results,
+    including the conditional join and leave and the delete by author.
+    """
+
+    def __init__(self, team_id, storage=None, timezone=None):
+        self.logger = logging.getLogger()
+        self.storage = storage if storage is not None else MemoryStorage()
+        self.team_id = team_id
+        self.timezone = timezone or DEFAULT_TIMEZONE
+
+    page_cursor = staticmethod(EventMongoDAL.page_cursor)
+
+    def insert_event(self, event: Event):
+        id = ObjectId()
+        document = {
+            **event.to_document(),
+            "_id": id,
+            "participants": list(event.participants),
+            "updated_at": datetime.now(timezone.utc),
+        }
+        self.storage.add_event(document)
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.inserted(replace(event, _id=id))
+        return str(id)
+
+    def list_events(
+        self,
+        start_date=None,
+        end_date=None,
+        limit=None,
+        after=None,
+        projection=None,
+        viewer=None,
+    ) -> list[Event]:
+        """
+        List the events of the team, sorted by their start, see EventMongoDAL.list_events
+        """
+        start, _ = day_bounds(
+            start_date or today_in(self.timezone),
+            self.timezone,
+        )
+        end = day_bounds(end_date, self.timezone)[1] if end_date is not None else None
+        identity_map = None
+        if viewer is None and after is None and not projection:
+            identity_map = current_identity_map()
+        key = ("list_events", self.team_id, start, end, limit)
+        if identity_map is not None:
+            events = identity_map.get_list(key)
+            if events is not None:
+                return events
+
+        with self.storage.lock:
+            index = self.storage.event_index.get(self.team_id, [])
+            first = bisect_left(index, (start,))
+            if after is not None:
+                starts_at, id = after.split("|")
+                cursor = (datetime.fromisoformat(starts_at), ObjectId(id))
+                first = max(first, bisect_right(index, cursor))
+            last = bisect_left(index, (end,)) if end is not None else len(index)
+            if limit is not None:
+                last = min(last, first + limit)
+            documents = [
+                self._read(self.storage.events[id], projection, viewer)
+                for _, id in index[first:last]
+            ]
+        events = [Event.from_document(document) for document in documents]
+        if identity_map is not None:
+            events = identity_map.add_list(
+                key,
+                events,
+                limit,
+                lambda event: event.team_id == self.team_id
+                and event.starts_at >= start
+                and (end is None or event.starts_at < end),
+            )
+        return events
+
+    def list_participants(
+        self, id, page=0, page_size=PARTICIPANTS_PAGE_SIZE
+    ) -> tuple[list[str], int] | None:
+        with self.storage.lock:
+            document = self._find(id)
+            if document is None:
+                return None
+            first = page * page_size
+            participants = document["participants"]
+            return participants[first : first + page_size], len(participants)
+
+    def get_event(self, id) -> Event:
+        identity_map = current_identity_map()
+        if identity_map is not None and identity_map.get(id) is not None:
+            return identity_map.get(id)
+        with self.storage.lock:
+            document = self._find(id)
+            if document is None:
+                self.logger.info(f"Event {id} not found")
+                return None
+            event = Event.from_document(self._read(document))
+        if identity_map is not None:
+            event = identity_map.add(event)
+        return event
+
+    def join_event(self, id, author) -> tuple[Event | None, str | None]:
+        if not ObjectId.is_valid(id):
+            return None, WRITE_FAILED
+        with self.storage.lock:
+            document = self._find(id)
+            if document is None:
+                return None, EVENT_NOT_FOUND
+            if author in document["participants"]:
+                return None, ALREADY_PARTICIPANT
+            event = Event.from_document(project(document, CHANGED_EVENT_PROJECTION))
+            document["participants"].append(author)
+            document["participant_count"] = len(document["participants"])
+            document["updated_at"] = datetime.now(timezone.utc)
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.joined(id, author)
+        return event, None
+
+    def leave_event(self, id, author) -> tuple[Event | None, str | None]:
+        if not ObjectId.is_valid(id):
+            return None, WRITE_FAILED
+        with self.storage.lock:
+            document = self._find(id)
+            if document is None:
+                return None, EVENT_NOT_FOUND
+            if author not in document["participants"]:
+                return None, NOT_PARTICIPANT
+            event = Event.from_document(project(document, CHANGED_EVENT_PROJECTION))
+            document["participants"] = [
+                user for user in document["participants"] if user != author
+            ]
+            document["participant_count"] = len(document["participants"])
+            document["updated_at"] = datetime.now(timezone.utc)
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.left(id, author)
+        return event, None
+
+    def delete_event(self, id, author) -> tuple[Event | None, str | None]:
+        try:
+            ObjectId(id)
+        except (InvalidId, TypeError) as e:
+            self.logger.error(e)
+            return None, WRITE_FAILED
+        with self.storage.lock:
+            document = self._find(id)
+            if document is None:
+                self.logger.info(f"Event {id} not found")
+                return None, EVENT_NOT_FOUND
+            if document.get("author") != author:
+                self.logger.warning(
+                    f"User {author} is not the author of the event {id}"
+                )
+                return None, NOT_EVENT_AUTHOR
+            self.storage.remove_event(document)
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.deleted(id)
+        return Event.from_document(project(document, CHANGED_EVENT_PROJECTION)), None
+
+    def _find(self, id) -> dict | None:
+        try:
+            document = self.storage.events.get(ObjectId(id))
+        except (InvalidId, TypeError):
+            return None
+        return document
+
+    @staticmethod
+    def _read(document, projection=None, viewer=None) -> dict:
+        """
+        Copy a stored document the way MongoDB would return it, so changes
+        to the returned events don't reach the storage
+        """
+        participants = document.get("participants") or []
+        if viewer is not None:
+            return {
+                **project(document, {field: 1 for field in SUMMARY_FIELDS}),
+                "participants": participants[:PARTICIPANT_PREVIEW_SIZE],
+                "participant_count": len(participants),
+                "joined": viewer in participants,
+            }
+        if projection and any(projection.values()):
+            projection = {
+                **projection,
+                **{field: 1 for field in EVENT_REQUIRED_FIELDS},
+            }
+        document = project(document, projection)
+        if "participants" in document:
+            document = {**document, "participants": list(participants)}
+        return document
+
+
+class MemoryOauthDAL:
+    """
+    The workspace lookup of OauthMongoDAL on a MemoryStorage
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage if storage is not None else MemoryStorage()
+
+    def get_workspace(self, team_id, enterprise_id=None):
+        with self.storage.lock:
+            if team_id is not None:
+                installation = self.storage.installations.get(team_id)
+            else:
+                installation = self.storage.enterprise_installations.get(enterprise_id)
+            return dict(installation) if installation is not None else None
@@ -1,38 +1,908 @@
 import logging
 import os
+import socket
+import threading
+import uuid
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterator
 
 from bson.objectid import ObjectId
 from dotenv import load_dotenv
-from pymongo import MongoClient, ReturnDocument
+from pymongo import (
+    ASCENDING,
+    AsyncMongoClient,
+    IndexModel,
+    MongoClient,
+    ReplaceOne,
+    UpdateOne,
+    monitoring,
+)
+from pymongo.errors import DuplicateKeyError, OperationFailure
 
-from lib.models.event import Event
+from lib.api.identity_map import current_identity_map
+from lib.models.event import PARTICIPANT_PREVIEW_SIZE, Event
+from lib.utils.cache import TTLCache
+from lib.utils.date_utils import DEFAULT_TIMEZONE, day_bounds, to_starts_at, today_in
+from lib.utils.invalidation import invalidation_bus
+from lib.utils.metrics import metrics
 
 load_dotenv()
 db_connection_string = os.getenv("MONGO_DB_CONNECTION_STRING")
 
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_async_client = None
+_async_client_pid = None
+
+# Tags the events written by this process, the ChangeWatcher skips the changes
+# the process already applied to its own caches
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+# The ids of the events this process deleted, a deleted event can't be tagged
+local_deletes = TTLCache(maxsize=4096, ttl=600, name="local_deletes")
+
+OAUTH_STATE_EXPIRATION_SECONDS = 600
+REMINDER_MARKER_EXPIRE_SECONDS = 7 * 24 * 3600
+
+# Why a join, leave or delete of EventMongoDAL didn't change an event
+EVENT_NOT_FOUND = "not_found"
+NOT_EVENT_AUTHOR = "not_author"
+ALREADY_PARTICIPANT = "already_participant"
+NOT_PARTICIPANT = "not_participant"
+WRITE_FAILED = "failed"
+# The fields of a joined, left or deleted event the messages render
+CHANGED_EVENT_PROJECTION = {
+    "team_id": 1,
+    "date": 1,
+    "time": 1,
+    "starts_at": 1,
+    "timezone": 1,
+    "location.name": 1,
+}
+# The fields list_events always loads, an Event can't be built without them
+EVENT_REQUIRED_FIELDS = ("team_id", "date", "time", "starts_at", "timezone", "location")
+# The fields of the events listed for a viewer, next to the computed
+# participant_count, joined and preview of the participants
+SUMMARY_FIELDS = (
+    "team_id",
+    "date",
+    "time",
+    "starts_at",
+    "timezone",
+    "location",
+    "description",
+    "author",
+)
+PARTICIPANTS_PAGE_SIZE = 50
+
+# The indexes backing the queries of the DALs, the installation store and the
+# state store, keyed by collection. Applied with ensure_indexes at startup.
+INDEXES = {
+    "events": [
+        # list_events: team_id equality, starts_at range, sorted by starts_at and _id
+        # EventBatchMongoDAL: starts_at range across teams, sorted by team_id first
+        IndexModel(
+            [("team_id", ASCENDING), ("starts_at", ASCENDING), ("_id", ASCENDING)]
+        ),
+    ]
+    + (
+        # Optionally let MongoDB delete past events instead of archiving them
+        [
+            IndexModel(
+                [("starts_at", ASCENDING)],
+                expireAfterSeconds=int(os.environ["EVENT_EXPIRE_AFTER_SECONDS"]),
+            )
+        ]
+        if os.getenv("EVENT_EXPIRE_AFTER_SECONDS")
+        else []
+    ),
+    "events_archive": [
+        IndexModel([("team_id", ASCENDING), ("starts_at", ASCENDING)]),
+    ],
+    "slack_installations": [
+        # find_installation and get_workspace by team, save and delete_* by enterprise and team
+        IndexModel([("team_id", ASCENDING), ("user_id", ASCENDING)]),
+        # find_installation for enterprise installs
+        IndexModel([("enterprise_id", ASCENDING), ("user_id", ASCENDING)]),
+    ],
+    "slack_bots": [
+        IndexModel([("team_id", ASCENDING)]),
+        IndexModel([("enterprise_id", ASCENDING)]),
+    ],
+    "oauth_states": [
+        IndexModel([("state", ASCENDING)], unique=True),
+        IndexModel(
+            [("created_at", ASCENDING)],
+            expireAfterSeconds=OAUTH_STATE_EXPIRATION_SECONDS,
+        ),
+    ],
+    "slack_channels": [
+        IndexModel([("team_id", ASCENDING)], unique=True),
+    ],
+    "reminders_sent": [
+        IndexModel(
+            [("sent_at", ASCENDING)],
+            expireAfterSeconds=REMINDER_MARKER_EXPIRE_SECONDS,
+        ),
+    ],
+    "places_cache": [
+        IndexModel(
+            [("fetched_at", ASCENDING)],
+            expireAfterSeconds=int(
+                os.getenv("PLACES_CACHE_EXPIRE_SECONDS", 30 * 24 * 3600)
+            ),
+        ),
+    ],
+}
+
+workspace_cache = TTLCache(
+    maxsize=int(os.getenv("WORKSPACE_CACHE_SIZE", 1024)),
+    ttl=int(os.getenv("WORKSPACE_CACHE_TTL_SECONDS", 300)),
+    name="workspaces",
+)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Records connection pool events of the shared client in the metrics registry.
+    """
+
+    def pool_created(self, event):
+        metrics.inc("mongo_pool_created_total", address=_address(event))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        metrics.inc("mongo_pool_cleared_total", address=_address(event))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        metrics.inc("mongo_pool_connections_created_total", address=_address(event))
+        metrics.add("mongo_pool_connections_open", 1, address=_address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        metrics.add("mongo_pool_connections_open", -1, address=_address(event))
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        metrics.inc("mongo_pool_checkout_failures_total", address=_address(event))
+
+    def connection_checked_out(self, event):
+        metrics.inc("mongo_pool_checkouts_total", address=_address(event))
+        metrics.add("mongo_pool_connections_in_use", 1, address=_address(event))
+
+    def connection_checked_in(self, event):
+        metrics.add("mongo_pool_connections_in_use", -1, address=_address(event))
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+def _pool_options() -> dict:
+    """
+    Read the connection pool settings from the environment.
+    """
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+    }
+    if os.getenv("MONGO_MAX_IDLE_TIME_MS"):
+        options["maxIdleTimeMS"] = int(os.getenv("MONGO_MAX_IDLE_TIME_MS"))
+    if os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS"):
+        options["waitQueueTimeoutMS"] = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS"))
+    return options
+
+
+def get_mongo_client() -> MongoClient:
+    """
+    Get the process-wide MongoClient, creating it lazily on first use.
+    A new client is created after a fork since pymongo clients are not fork-safe.
+    :return: The shared MongoClient
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = MongoClient(
+                    db_connection_string,
+                    tz_aware=True,
+                    event_listeners=[PoolMetricsListener()],
+                    **_pool_options(),
+                )
+                _client_pid = pid
+    return _client
+
+
+def close_mongo_client():
+    """
+    Close the shared MongoClient, the next call to get_mongo_client creates a new one.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def get_async_mongo_client() -> AsyncMongoClient:
+    """
+    Get the process-wide AsyncMongoClient used by the AsyncApp, creating it lazily on first use.
+    :return: The shared AsyncMongoClient
+    """
+    global _async_client, _async_client_pid
+    if _async_client is None or _async_client_pid != os.getpid():
+        _async_client = AsyncMongoClient(
+            db_connection_string,
+            tz_aware=True,
+            event_listeners=[PoolMetricsListener()],
+            **_pool_options(),
+        )
+        _async_client_pid = os.getpid()
+    return _async_client
+
+
+class MongoDAL:
+    """
+    Base of the DALs. The database is looked up on every use instead of being
+    kept, so DALs created before a fork use the client of the child process.
+    Assigning database, e.g. in tests and benchmarks, overrides the lookup.
+    """
+
+    _database = None
+
+    def _client(self):
+        return get_mongo_client()
+
+    @property
+    def database(self):
+        if self._database is not None:
+            return self._database
+        return self._client().events
+
+    @database.setter
+    def database(self, database):
+        self._database = database
+
+
+def ensure_indexes(database=None) -> dict:
+    """
+    Create the indexes in INDEXES that don't exist yet. Safe to run on every start,
+    the expiry of existing TTL indexes is updated in place.
+    :param database: The database to apply the indexes to, defaults to the app database
+    :return: The names of the ensured indexes per collection
+    """
+    logger = logging.getLogger()
+    database = database if database is not None else get_mongo_client().events
+    enable_pre_images(database)
+    ensured = {}
+    for collection, indexes in INDEXES.items():
+        ensured[collection] = []
+        for index in indexes:
+            document = index.document
+            try:
+                database[collection].create_indexes([index])
+            except OperationFailure as e:
+                # IndexOptionsConflict, e.g. the TTL of an existing index changed
+                if e.code != 85 or "expireAfterSeconds" not in document:
+                    raise
+                database.command(
+                    "collMod",
+                    collection,
+                    index={
+                        "keyPattern": document["key"],
+                        "expireAfterSeconds": document["expireAfterSeconds"],
+                    },
+                )
+            ensured[collection].append(document["name"])
+        logger.info(f"Ensured indexes on {collection}: {ensured[collection]}")
+    return ensured
+
+
+def enable_pre_images(database):
+    """
+    Keep the last version of changed events, so the change stream knows the
+    team of a deleted event. Needs MongoDB 6.0 or later.
+    :param database: The database to configure
+    """
+    try:
+        database.command(
+            "collMod", "events", changeStreamPreAndPostImages={"enabled": True}
+        )
+    except OperationFailure as e:
+        if e.code != 26:  # NamespaceNotFound
+            logging.getLogger().warning(
+                f"Could not enable change stream pre-images: {e}"
+            )
+            return
+        database.create_collection(
+            "events", changeStreamPreAndPostImages={"enabled": True}
+        )
+
+
+def index_report(database=None) -> dict:
+    """
+    Compare the indexes in the database with INDEXES
+    :param database: The database to inspect, defaults to the app database
+    :return: Per collection the missing indexes and the existing indexes that were never used
+    """
+    database = database if database is not None else get_mongo_client().events
+    report = {}
+    for collection, indexes in INDEXES.items():
+        existing = {
+            stats["name"]: stats["accesses"]["ops"]
+            for stats in database[collection].aggregate([{"$indexStats": {}}])
+        }
+        report[collection] = {
+            "missing": [
+                index.document["name"]
+                for index in indexes
+                if index.document["name"] not in existing
+            ],
+            "unused": [
+                name for name, ops in existing.items() if ops == 0 and name != "_id_"
+            ],
+        }
+    return report
+
+
+class OauthMongoDAL(MongoDAL):
+    def __init__(self):
+        self.logger = logging.getLogger()
+        self.logger.setLevel(logging.INFO)
+
+    def get_workspace(self, team_id, enterprise_id=None):
+        """
+        Get the installation of a workspace, served from the workspace cache when possible
+        :param team_id: The id of the team
+        :param enterprise_id: The id of the enterprise, if any
+        :return: The installation document or None if the workspace is not installed
+        """
+        key = (enterprise_id, team_id)
+        workspace = workspace_cache.get(key)
+        if workspace is not None:
+            return workspace
+
+        try:
+            workspace = self.database.slack_installations.find_one(
+                self.workspace_query(team_id, enterprise_id)
+            )
+        except Exception as e:
+            self.logger.error(f"Error fetching workspace: {e}")
+            return None
+
+        if workspace is not None:
+            workspace_cache.set(key, workspace)
+        return workspace
+
+    @staticmethod
+    def workspace_query(team_id, enterprise_id) -> dict:
+        if team_id is not None:
+            return {"team_id": team_id}
+        return {"enterprise_id": enterprise_id}
+
+    @staticmethod
+    def invalidate_workspace(enterprise_id, team_id):
+        """
+        Remove a workspace from the workspace cache, e.g. after it was (un)installed
+        :param enterprise_id: The id of the enterprise, if any
+        :param team_id: The id of the team, None for org wide installations
+        """
+        if team_id is not None:
+            workspace_cache.invalidate_where(lambda key, _: key[1] == team_id)
+        else:
+            workspace_cache.invalidate_where(lambda key, _: key[0] == enterprise_id)
+
+
+def _workspace_changed(message):
+    if message["team_id"] is None and message["enterprise_id"] is None:
+        workspace_cache.clear()
+    else:
+        OauthMongoDAL.invalidate_workspace(message["enterprise_id"], message["team_id"])
+
+
+invalidation_bus.subscribe(("slack_installations", "slack_bots"), _workspace_changed)
+
+
+class AsyncOauthMongoDAL(MongoDAL):
+    """
+    The workspace lookup of OauthMongoDAL for the AsyncApp, sharing the workspace cache.
+    """
 
-class OauthMongoDAL:
     def __init__(self):
         self.logger = logging.getLogger()
         self.logger.setLevel(logging.INFO)
-        self.mongodb = MongoClient(db_connection_string)
-        self.database = self.mongodb.events
 
-    def get_workspace(self, team_id):
+    def _client(self):
+        return get_async_mongo_client()
+
+    async def get_workspace(self, team_id, enterprise_id=None):
+        """
+        Get the installation of a workspace, served from the workspace cache when possible
+        :param team_id: The id of the team
+        :param enterprise_id: The id of the enterprise, if any
+        :return: The installation document or None if the workspace is not installed
+        """
+        key = (enterprise_id, team_id)
+        workspace = workspace_cache.get(key)
+        if workspace is not None:
+            return workspace
+
         try:
-            return self.database.slack_installations.find_one({"team_id": team_id})
+            workspace = await self.database.slack_installations.find_one(
+                OauthMongoDAL.workspace_query(team_id, enterprise_id)
+            )
         except Exception as e:
             self.logger.error(f"Error fetching workspace: {e}")
             return None
 
+        if workspace is not None:
+            workspace_cache.set(key, workspace)
+        return workspace
+
+
+class ChannelMongoDAL(MongoDAL):
+    def __init__(self):
+        self.logger = logging.getLogger()
+        self.logger.setLevel(logging.INFO)
+
+    def get_channels(self, team_id, max_age_seconds) -> dict | None:
+        """
+        Get the persisted channel directory of a team
+        :param team_id: The id of the team
+        :param max_age_seconds: Directories older than this are ignored
+        :return: A dictionary of channel name to channel id, or None if missing or stale
+        """
+        try:
+            result = self.database.slack_channels.find_one(
+                {
+                    "team_id": team_id,
+                    "updated_at": {
+                        "$gte": datetime.now(timezone.utc)
+                        - timedelta(seconds=max_age_seconds)
+                    },
+                }
+            )
+        except Exception as e:
+            self.logger.error(f"Error fetching channels: {e}")
+            return None
+        if result is None:
+            return None
+        return {channel["name"]: channel["id"] for channel in result["channels"]}
+
+    def save_channels(self, team_id, channels: dict):
+        """
+        Persist the channel directory of a team
+        :param team_id: The id of the team
+        :param channels: A dictionary of channel name to channel id
+        """
+        try:
+            self.database.slack_channels.update_one(
+                {"team_id": team_id},
+                {
+                    "$set": {
+                        "channels": [
+                            {"name": name, "id": id} for name, id in channels.items()
+                        ],
+                        "updated_at": datetime.now(timezone.utc),
+                    }
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            self.logger.error(f"Error saving channels: {e}")
 
-class EventMongoDAL:
-    def __init__(self, team_id):
+
+class PlaceCacheMongoDAL(MongoDAL):
+    def __init__(self):
+        self.logger = logging.getLogger()
+        self.logger.setLevel(logging.INFO)
+
+    @property
+    def collection(self):
+        return self.database.places_cache
+
+    def get_place(self, place_id) -> dict | None:
+        """
+        Get a cached place
+        :param place_id: The Google place id
+        :return: A dictionary with the serialized place in data and when it was fetched in fetched_at
+        """
+        try:
+            return self.collection.find_one({"_id": place_id})
+        except Exception as e:
+            self.logger.error(f"Error fetching cached place: {e}")
+            return None
+
+    def save_place(self, place_id, data: bytes):
+        """
+        Cache a place
+        :param place_id: The Google place id
+        :param data: The place serialized to its binary protobuf form
+        """
+        try:
+            self.collection.update_one(
+                {"_id": place_id},
+                {"$set": {"data": data, "fetched_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+        except Exception as e:
+            self.logger.error(f"Error caching place: {e}")
+
+
+class ReminderMongoDAL(MongoDAL):
+    """
+    The queries of the daily reminders, which work across all teams.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger()
+        self.logger.setLevel(logging.INFO)
+
+    def bots(self) -> list[dict]:
+        """
+        Get the bot installation of every team
+        :return: A list of documents with team_id, bot_token and, if set, timezone
+        """
+        return list(
+            self.database.slack_bots.find(
+                {"team_id": {"$ne": None}},
+                {"_id": 0, "team_id": 1, "bot_token": 1, "timezone": 1},
+            )
+        )
+
+    def sent(self, dates: dict) -> set[str]:
+        """
+        Get the teams that already got their reminder for the given date
+        :param dates: A dictionary of team id to date
+        :return: The ids of the teams that were reminded
+        """
+        markers = self.database.reminders_sent.find(
+            {"_id": {"$in": [f"{team_id}|{date}" for team_id, date in dates.items()]}},
+            {"_id": 1},
+        )
+        return {marker["_id"].split("|")[0] for marker in markers}
+
+    def mark_sent(self, team_id, date) -> bool:
+        """
+        Record that a team got its reminder for a date
+        :return: False if the reminder was already recorded, e.g. by another instance
+        """
+        try:
+            self.database.reminders_sent.insert_one(
+                {
+                    "_id": f"{team_id}|{date}",
+                    "team_id": team_id,
+                    "date": date,
+                    "sent_at": datetime.now(timezone.utc),
+                }
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def unmark_sent(self, team_id, date):
+        """
+        Remove the record of a reminder, e.g. when it couldn't be posted
+        """
+        self.database.reminders_sent.delete_one({"_id": f"{team_id}|{date}"})
+
+    def acquire_lock(self, name, owner, ttl_seconds) -> bool:
+        """
+        Take or extend a lock shared by all app instances
+        :param name: The name of the lock
+        :param owner: A unique id of the caller
+        :param ttl_seconds: When the lock is released if the owner doesn't extend it
+        :return: True if the caller holds the lock
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            self.database.locks.find_one_and_update(
+                {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+                {
+                    "$set": {
+                        "owner": owner,
+                        "expires_at": now + timedelta(seconds=ttl_seconds),
+                    }
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def release_lock(self, name, owner):
+        self.database.locks.delete_one({"_id": name, "owner": owner})
+
+
+class ChangeMongoDAL(MongoDAL):
+    """
+    The queries of the ChangeWatcher: the resume tokens of its change streams
+    and, for deployments without change streams, fingerprints of the watched
+    collections to poll for changes.
+    """
+
+    # The field that changes whenever a document of a collection is written
+    UPDATED_FIELDS = {
+        "events": "updated_at",
+        "slack_installations": "installed_at",
+        "slack_bots": "installed_at",
+    }
+
+    def __init__(self):
+        self.logger = logging.getLogger()
+        self.logger.setLevel(logging.INFO)
+
+    def load_token(self, name):
+        """
+        Get the resume token a change stream stopped at, None to start from now
+        """
+        document = self.database.change_stream_tokens.find_one({"_id": name})
+        return document["token"] if document is not None else None
+
+    def save_token(self, name, token):
+        self.database.change_stream_tokens.update_one(
+            {"_id": name},
+            {"$set": {"token": token, "saved_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    def fingerprints(self, collection, now=None) -> dict[tuple, tuple]:
+        """
+        Summarize the documents of a collection per workspace. The summary of a
+        workspace changes when one of its documents is inserted, updated or deleted.
+        Only the events that haven't started more than a day ago are summarized.
+        :return: A dictionary of (enterprise_id, team_id) to the summary
+        """
+        match = {}
+        if collection == "events":
+            now = now or datetime.now(timezone.utc)
+            match = {"starts_at": {"$gte": now - timedelta(days=1)}}
+        groups = self.database[collection].aggregate(
+            [
+                {"$match": match},
+                {
+                    "$group": {
+                        "_id": {
+                            "enterprise_id": "$enterprise_id",
+                            "team_id": "$team_id",
+                        },
+                        "count": {"$sum": 1},
+                        "updated": {"$max": f"${self.UPDATED_FIELDS[collection]}"},
+                    }
+                },
+            ]
+        )
+        return {
+            (group["_id"].get("enterprise_id"), group["_id"].get("team_id")): (
+                group["count"],
+                group["updated"],
+            )
+            for group in groups
+        }
+
+
+class EventBatchMongoDAL(MongoDAL):
+    """
+    Queries over the events of all teams for background jobs. The events are
+    streamed from one aggregation in cursor batches and yielded per team, so
+    memory use depends on the largest team rather than on the number of teams.
+    """
+
+    def __init__(self, batch_size=None):
+        self.logger = logging.getLogger()
+        self.logger.setLevel(logging.INFO)
+        self.batch_size = batch_size or int(os.getenv("EVENT_BATCH_SIZE", 1000))
+
+    def events_between(
+        self, start, end, teams=None
+    ) -> Iterator[tuple[str, list[Event]]]:
+        """
+        Get the events starting in a time range, grouped by team
+        :param start: The first moment to include, a timezone aware datetime
+        :param end: The end of the range, exclusive
+        :param teams: Optional team ids to limit the query to
+        :return: An iterator of team id and the events of the team, sorted by start
+        """
+        match = {"starts_at": {"$gte": start, "$lt": end}}
+        if teams is not None:
+            match["team_id"] = {"$in": list(teams)}
+        cursor = self.database.events.aggregate(
+            [
+                {"$match": match},
+                {"$sort": {"team_id": 1, "starts_at": 1, "_id": 1}},
+            ],
+            batchSize=self.batch_size,
+        )
+        for team_id, documents in groupby(cursor, key=itemgetter("team_id")):
+            yield team_id, [Event.from_document(document) for document in documents]
+
+    def events_on(
+        self, date, teams=None, tz=DEFAULT_TIMEZONE
+    ) -> Iterator[tuple[str, list[Event]]]:
+        """
+        Get the events of a day, grouped by team
+        :param date: The date of the events as %Y-%m-%d
+        :param teams: Optional team ids to limit the query to
+        :param tz: The timezone the day is in
+        :return: An iterator of team id and the events of the team, sorted by start
+        """
+        return self.events_between(*day_bounds(date, tz), teams)
+
+    def archive_before(self, before, dry_run=False) -> dict:
+        """
+        Move the events that started before the given moment to events_archive,
+        in batches. Archived events are upserted before they are deleted, so an
+        interrupted run is completed by the next one.
+        :param before: A timezone aware datetime, the events starting from it are kept
+        :param dry_run: Only count the events that would be moved
+        :return: The number of events archived or to archive and the batches used
+        """
+        query = {"starts_at": {"$lt": before}}
+        if dry_run:
+            return {
+                "archived": 0,
+                "to_archive": self.database.events.count_documents(query),
+                "batches": 0,
+            }
+
+        stats = {"archived": 0, "batches": 0}
+        while True:
+            # Sorted like the (team_id, starts_at, _id) index so it can be used
+            batch = list(
+                self.database.events.find(query)
+                .sort([("team_id", 1), ("starts_at", 1), ("_id", 1)])
+                .limit(self.batch_size)
+            )
+            if not batch:
+                break
+            archived_at = datetime.now(timezone.utc)
+            self.database.events_archive.bulk_write(
+                [
+                    ReplaceOne(
+                        {"_id": event["_id"]},
+                        {**event, "archived_at": archived_at},
+                        upsert=True,
+                    )
+                    for event in batch
+                ],
+                ordered=False,
+            )
+            deleted = self.database.events.delete_many(
+                {"_id": {"$in": [event["_id"] for event in batch]}}
+            ).deleted_count
+            stats["archived"] += deleted
+            stats["batches"] += 1
+            metrics.inc("events_archived_total", deleted)
+        return stats
+
+    def backfill_starts_at(self, tz=DEFAULT_TIMEZONE, dry_run=False) -> dict:
+        """
+        Set starts_at and timezone on the events stored before they existed,
+        from their date and time strings.
+        :param tz: The timezone the date and time of those events are in
+        :param dry_run: Only count the events that would be updated
+        :return: The number of events updated or to update and the invalid ones skipped
+        """
+        query = {"starts_at": {"$exists": False}}
+        if dry_run:
+            return {
+                "updated": 0,
+                "to_update": self.database.events.count_documents(query),
+            }
+
+        stats = {"updated": 0, "invalid": 0}
+        cursor = self.database.events.find(
+            query, {"date": 1, "time": 1, "timezone": 1}
+        ).batch_size(self.batch_size)
+        requests = []
+        for event in cursor:
+            event_timezone = event.get("timezone") or tz
+            try:
+                starts_at = to_starts_at(
+                    event.get("date"), event.get("time"), event_timezone
+                )
+            except (TypeError, ValueError):
+                self.logger.warning(f"Invalid date or time on event {event['_id']}")
+                stats["invalid"] += 1
+                continue
+            requests.append(
+                UpdateOne(
+                    {"_id": event["_id"]},
+                    {"$set": {"starts_at": starts_at, "timezone": event_timezone}},
+                )
+            )
+            if len(requests) >= self.batch_size:
+                stats["updated"] += self._write(requests)
+                requests = []
+        if requests:
+            stats["updated"] += self._write(requests)
+        return stats
+
+    def backfill_participant_count(self, dry_run=False) -> dict:
+        """
+        Set participant_count on the events stored before it existed
+        :param dry_run: Only count the events that would be updated
+        :return: The number of events updated or to update
+        """
+        query = {"participant_count": {"$exists": False}}
+        if dry_run:
+            return {
+                "updated": 0,
+                "to_update": self.database.events.count_documents(query),
+            }
+        result = self.database.events.update_many(
+            query,
+            [
+                {
+                    "$set": {
+                        "participant_count": {
+                            "$size": {"$ifNull": ["$participants", []]}
+                        }
+                    }
+                }
+            ],
+        )
+        return {"updated": result.modified_count}
+
+    def _write(self, requests) -> int:
+        return self.database.events.bulk_write(requests, ordered=False).modified_count
+
+
+def set_participants(participants, changed) -> list[dict]:
+    """
+    The pipeline update that sets the participants of an event and counts them,
+    so the count of events stored before participant_count is right as well.
+    An event whose participants don't change is left as it is.
+    :param participants: An expression of the new participants
+    :param changed: An expression, whether the participants change
+    :return: The update pipeline
+    """
+    return [
+        {
+            "$set": {
+                "participants": {"$cond": [changed, participants, "$participants"]},
+                "updated_at": {"$cond": [changed, "$$NOW", "$updated_at"]},
+                "written_by": {
+                    "$cond": [changed, {"$literal": INSTANCE_ID}, "$written_by"]
+                },
+            }
+        },
+        {"$set": {"participant_count": {"$size": {"$ifNull": ["$participants", []]}}}},
+    ]
+
+
+def is_participant(author) -> dict:
+    """
+    The expression whether a user participates in an event
+    """
+    return {"$in": [{"$literal": author}, {"$ifNull": ["$participants", []]}]}
+
+
+class EventMongoDAL(MongoDAL):
+    def __init__(self, team_id, timezone=None):
+        """
+        :param team_id: The id of the team
+        :param timezone: The timezone of the team, defaults to DEFAULT_TIMEZONE
+        """
         self.logger = logging.getLogger()
         self.logger.setLevel(logging.INFO)
-        self.mongodb = MongoClient(db_connection_string)
-        self.database = self.mongodb.events
         self.team_id = team_id
+        self.timezone = timezone or DEFAULT_TIMEZONE
 
     def get_formatted_date(self, date) -> str:
         return self.team_id + "|" + date
@@ -44,84 +914,262 @@ class EventMongoDAL:
             )
         )
         try:
-            id = self.database.events.insert_one(event.to_dict()).inserted_id
+            id = self.database.events.insert_one(
+                {
+                    **event.to_document(),
+                    "updated_at": datetime.now(timezone.utc),
+                    "written_by": INSTANCE_ID,
+                }
+            ).inserted_id
+            identity_map = current_identity_map()
+            if identity_map is not None:
+                identity_map.inserted(replace(event, _id=id))
             return str(id)
         except Exception as e:
             self.logger.error(e)
             raise e
 
-    def list_events(self) -> list[Event]:
+    @staticmethod
+    def page_cursor(event: Event) -> str:
+        """
+        Get the cursor to pass as after to list the events following the given one
+        """
+        return f"{event.starts_at.isoformat()}|{event._id}"
+
+    def list_events(
+        self,
+        start_date=None,
+        end_date=None,
+        limit=None,
+        after=None,
+        projection=None,
+        viewer=None,
+    ) -> list[Event]:
+        """
+        List the events of the team, sorted by their start
+        :param start_date: The first date to include, defaults to today
+        :param end_date: Optional last date to include
+        :param limit: Optional maximum number of events to return
+        :param after: Optional cursor from page_cursor to continue from
+        :param projection: Optional projection, the fields needed to build an Event are always included
+        :param viewer: Optional id of a user to list the events for. The participants are
+            left out except for a preview, joined tells whether the viewer participates.
+            Replaces the projection.
+        :return: A list of events
+        """
+        start, _ = day_bounds(
+            start_date or today_in(self.timezone),
+            self.timezone,
+        )
+        end = day_bounds(end_date, self.timezone)[1] if end_date is not None else None
+        query = {"team_id": self.team_id, "starts_at": {"$gte": start}}
+        if end is not None:
+            query["starts_at"]["$lt"] = end
+        if after is not None:
+            starts_at, id = after.split("|")
+            starts_at = datetime.fromisoformat(starts_at)
+            query["$or"] = [
+                {"starts_at": {"$gt": starts_at}},
+                {"starts_at": starts_at, "_id": {"$gt": ObjectId(id)}},
+            ]
+        # Full events of the first page are kept for the rest of the interaction
+        identity_map = None
+        if viewer is not None:
+            projection = self.summary_projection(viewer)
+        elif after is None and not projection:
+            identity_map = current_identity_map()
+        key = ("list_events", self.team_id, start, end, limit)
+        if identity_map is not None:
+            events = identity_map.get_list(key)
+            if events is not None:
+                return events
+        if viewer is None and projection is not None and any(projection.values()):
+            projection = {
+                **projection,
+                **{field: 1 for field in EVENT_REQUIRED_FIELDS},
+            }
         try:
-            # Fetch all events for the team, sorted by date and time
-            events = self.database.events.find({"team_id": self.team_id}).sort(
-                [("date", 1), ("time", 1)]
+            events = self.database.events.find(query, projection).sort(
+                [("starts_at", 1), ("_id", 1)]
             )
+            if limit is not None:
+                events = events.limit(limit)
             # Convert the cursor to a list of Event objects
-            events = [Event(**event) for event in events]
-            return list(events)
+            events = [Event.from_document(event) for event in events]
+            if identity_map is not None:
+                events = identity_map.add_list(
+                    key,
+                    events,
+                    limit,
+                    lambda event: event.team_id == self.team_id
+                    and event.starts_at >= start
+                    and (end is None or event.starts_at < end),
+                )
+            return events
         except Exception as e:
             self.logger.error(e)
             return []
 
+    @staticmethod
+    def summary_projection(viewer) -> dict:
+        """
+        The projection of list_events for a viewer. Counting and the membership
+        check run in MongoDB, only the first participants are returned.
+        """
+        participants = {"$ifNull": ["$participants", []]}
+        return {
+            **{field: 1 for field in SUMMARY_FIELDS},
+            "participants": {"$slice": [participants, PARTICIPANT_PREVIEW_SIZE]},
+            "participant_count": {
+                "$ifNull": ["$participant_count", {"$size": participants}]
+            },
+            "joined": {"$in": [viewer, participants]},
+        }
+
+    def list_participants(
+        self, id, page=0, page_size=PARTICIPANTS_PAGE_SIZE
+    ) -> tuple[list[str], int] | None:
+        """
+        Get a page of the participants of an event, in the order they joined
+        :param id: The id of the event
+        :param page: The number of the page, starting at 0
+        :param page_size: The number of participants on a page
+        :return: The participants on the page and the number of participants,
+            or None if the event doesn't exist
+        """
+        participants = {"$ifNull": ["$participants", []]}
+        response = self.database.events.find_one(
+            {"_id": ObjectId(id)},
+            {
+                "_id": 0,
+                "participants": {"$slice": [participants, page * page_size, page_size]},
+                "participant_count": {
+                    "$ifNull": ["$participant_count", {"$size": participants}]
+                },
+            },
+        )
+        if response is None:
+            self.logger.info(f"Event {id} not found")
+            return None
+        return response["participants"], response["participant_count"]
+
     def get_event(self, id) -> Event:
+        identity_map = current_identity_map()
+        if identity_map is not None and identity_map.get(id) is not None:
+            return identity_map.get(id)
         response = self.database.events.find_one({"_id": ObjectId(id)})
-        print(response)
         # Check if the event exists
         if response is None:
             self.logger.info(f"Event {id} not found")
             return None
         # Convert the event to an Event object
-        event = Event(**response)
+        event = Event.from_document(response)
+        if identity_map is not None:
+            event = identity_map.add(event)
         return event
 
-    def join_event(self, id, author) -> Event:
+    def join_event(self, id, author) -> tuple[Event | None, str | None]:
+        """
+        Add a user to the participants of an event
+        :return: The event with the fields of CHANGED_EVENT_PROJECTION and None,
+            or None and EVENT_NOT_FOUND, ALREADY_PARTICIPANT or WRITE_FAILED
+        """
         self.logger.info(
             f"Trying to join event {id} for user {author} in {self.team_id}"
         )
+        participant = is_participant(author)
         try:
+            # The event before the update tells why nothing changed
             response = self.database.events.find_one_and_update(
                 {"_id": ObjectId(id)},
-                {"$addToSet": {"participants": author}},
-                return_document=ReturnDocument.AFTER,
+                set_participants(
+                    {
+                        "$concatArrays": [
+                            {"$ifNull": ["$participants", []]},
+                            [{"$literal": author}],
+                        ]
+                    },
+                    {"$not": [participant]},
+                ),
+                projection={**CHANGED_EVENT_PROJECTION, "participant": participant},
             )
-            self.logger.debug(response)
-            # Convert the event to an Event object
-            event = Event(**response)
-            return event
         except Exception as e:
             self.logger.error(e)
-            return None
+            return None, WRITE_FAILED
+        if response is None:
+            return None, EVENT_NOT_FOUND
+        if response["participant"]:
+            return None, ALREADY_PARTICIPANT
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.joined(id, author)
+        return Event.from_document(response), None
 
-    def leave_event(self, id, author) -> Event:
+    def leave_event(self, id, author) -> tuple[Event | None, str | None]:
+        """
+        Remove a user from the participants of an event
+        :return: The event with the fields of CHANGED_EVENT_PROJECTION and None,
+            or None and EVENT_NOT_FOUND, NOT_PARTICIPANT or WRITE_FAILED
+        """
         self.logger.info(f"Trying to leave event {id} for user {author}")
+        participant = is_participant(author)
         try:
             response = self.database.events.find_one_and_update(
                 {"_id": ObjectId(id)},
-                {"$pull": {"participants": author}},
-                return_document=ReturnDocument.AFTER,
+                set_participants(
+                    {
+                        "$filter": {
+                            "input": "$participants",
+                            "cond": {"$ne": ["$$this", {"$literal": author}]},
+                        }
+                    },
+                    participant,
+                ),
+                projection={**CHANGED_EVENT_PROJECTION, "participant": participant},
             )
-            self.logger.debug(response)
-            event = Event(**response)
-            return event
         except Exception as e:
             self.logger.error(e)
-            return None
+            return None, WRITE_FAILED
+        if response is None:
+            return None, EVENT_NOT_FOUND
+        if not response["participant"]:
+            return None, NOT_PARTICIPANT
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.left(id, author)
+        return Event.from_document(response), None
 
-    def delete_event(self, id, author) -> Event:
+    def delete_event(self, id, author) -> tuple[Event | None, str | None]:
+        """
+        Delete an event created by the given user
+        :return: The deleted event with the fields of CHANGED_EVENT_PROJECTION and None,
+            or None and EVENT_NOT_FOUND, NOT_EVENT_AUTHOR or WRITE_FAILED
+        """
         self.logger.info(f"Trying to delete event {id} for user {author}")
         try:
-            existing_event = self.database.events.find_one({"_id": ObjectId(id)})
-
-            response = self.database.events.delete_one(
-                {"_id": ObjectId(id), "author": author}
+            # Marked before the delete, the change stream may report it first
+            local_deletes.set(str(id), True)
+            response = self.database.events.find_one_and_delete(
+                {"_id": ObjectId(id), "author": author},
+                projection=CHANGED_EVENT_PROJECTION,
+            )
+            if response is not None:
+                identity_map = current_identity_map()
+                if identity_map is not None:
+                    identity_map.deleted(id)
+                return Event.from_document(response), None
+            local_deletes.invalidate(str(id))
+            # Only a failed delete looks up why, from the author of the event
+            document = self.database.events.find_one(
+                {"_id": ObjectId(id)}, {"_id": 0, "author": 1}
             )
-            if response.deleted_count == 0:
-                self.logger.warning(
-                    f"User {author} is not the author of the event {id}"
-                )
-                return None
-            self.logger.info(response)
-            return Event(**existing_event)
         except Exception as e:
             self.logger.error(e)
-            return None
+            return None, WRITE_FAILED
+        if document is None:
+            self.logger.info(f"Event {id} not found")
+            return None, EVENT_NOT_FOUND
+        if document.get("author") != author:
+            self.logger.warning(f"User {author} is not the author of the event {id}")
+            return None, NOT_EVENT_AUTHOR
+        return None, WRITE_FAILED
@@ -1,27 +1,306 @@
+import asyncio
 import logging
 import os
+import random
+import threading
+import time
 
 from dotenv import load_dotenv
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
 
-from lib.api.mongodb import OauthMongoDAL
+from lib.api.mongodb import ChannelMongoDAL, OauthMongoDAL
+from lib.utils.cache import TTLCache
+from lib.utils.metrics import metrics
+from lib.utils.rate_limit import TokenBucket
 
 load_dotenv()
 
+channel_cache = TTLCache(
+    maxsize=int(os.getenv("CHANNEL_CACHE_SIZE", 1024)),
+    ttl=int(os.getenv("CHANNEL_CACHE_TTL_SECONDS", 3600)),
+    name="channels",
+)
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# Slack's rate limit tier of the methods the app calls, other methods count as tier 3
+# https://api.slack.com/apis/rate-limits
+METHOD_TIERS = {
+    "auth.test": 4,
+    "chat.postEphemeral": 4,
+    "chat.postMessage": 4,
+    "chat.update": 3,
+    "conversations.list": 2,
+    "views.open": 4,
+    "views.publish": 4,
+    "views.update": 4,
+}
+TIER_REQUESTS_PER_MINUTE = {1: 1, 2: 20, 3: 50, 4: 100}
+# Methods that can safely be sent again when the outcome of a call is unknown
+IDEMPOTENT_METHODS = {
+    "auth.test",
+    "conversations.list",
+    "views.publish",
+    "views.update",
+    "chat.update",
+}
+# The buckets of the teams that called a method in the last hour, a bucket
+# idle that long is full again and can be rebuilt
+_buckets = TTLCache(
+    maxsize=int(os.getenv("SLACK_RATE_LIMIT_BUCKETS", 10000)),
+    ttl=3600,
+    name="slack_buckets",
+)
+_buckets_lock = threading.Lock()
+
+
+def method_bucket(team_id, api_method) -> TokenBucket:
+    """
+    Get the token bucket limiting the calls of a team to an API method
+    """
+    key = (team_id, api_method)
+    bucket = _buckets.peek(key)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.peek(key)
+            if bucket is None:
+                per_minute = TIER_REQUESTS_PER_MINUTE[METHOD_TIERS.get(api_method, 3)]
+                bucket = TokenBucket(rate=per_minute / 60, capacity=per_minute / 10)
+                _buckets.set(key, bucket)
+    return bucket
+
+
+class RateLimits:
+    """
+    The retry settings shared by RateLimitedWebClient and AsyncRateLimitedWebClient
+    """
+
+    def __init__(self, *args, team_id=None, max_retries=None, backoff=1.0, **kwargs):
+        """
+        :param team_id: The team the calls are made for, scopes the rate limits.
+        :param max_retries: How often a call is retried, defaults to SLACK_MAX_RETRIES or 3.
+        :param backoff: The base delay in seconds between retries of failed calls.
+        """
+        super().__init__(*args, **kwargs)
+        self.team_id = team_id
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else int(os.getenv("SLACK_MAX_RETRIES", 3))
+        )
+        self.backoff = backoff
+
+    def _can_retry(self, api_method, attempt) -> bool:
+        return api_method in IDEMPOTENT_METHODS and attempt < self.max_retries
+
+    def _retry_delay(self, attempt) -> float:
+        return random.uniform(0, self.backoff * 2**attempt)
+
+
+class RateLimitedWebClient(RateLimits, WebClient):
+    """
+    A WebClient that paces its calls with a token bucket per team and method,
+    waits out the Retry-After of rate limited calls and retries idempotent
+    calls that failed on the network or on Slack's side with a jittered backoff.
+    """
+
+    def api_call(self, api_method, **kwargs):
+        bucket = method_bucket(self.team_id, api_method)
+        attempt = 0
+        while True:
+            waited = bucket.acquire()
+            metrics.inc("slack_api_queue_wait_seconds_sum", waited, method=api_method)
+            metrics.inc("slack_api_queue_wait_seconds_count", method=api_method)
+            try:
+                return super().api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                status = e.response.status_code
+                if status == 429:
+                    # Rate limited calls are not processed and always safe to resend
+                    metrics.inc("slack_api_rate_limited_total", method=api_method)
+                    retry_after = float(e.response.headers.get("Retry-After", 1))
+                    bucket.pause(retry_after)
+                    if attempt >= self.max_retries:
+                        raise
+                elif status < 500 or not self._can_retry(api_method, attempt):
+                    raise
+                else:
+                    self._wait_before_retry(attempt)
+            except OSError:
+                if not self._can_retry(api_method, attempt):
+                    raise
+                self._wait_before_retry(attempt)
+            attempt += 1
+            metrics.inc("slack_api_retries_total", method=api_method)
+
+    def _wait_before_retry(self, attempt):
+        time.sleep(self._retry_delay(attempt))
+
+
+class AsyncRateLimitedWebClient(RateLimits, AsyncWebClient):
+    """
+    The AsyncWebClient of the AsyncApp, paced and retried like
+    RateLimitedWebClient and sharing its buckets, without blocking the event loop.
+    """
+
+    async def api_call(self, api_method, **kwargs):
+        bucket = method_bucket(self.team_id, api_method)
+        attempt = 0
+        while True:
+            waited = bucket.reserve()
+            if waited > 0:
+                await asyncio.sleep(waited)
+            metrics.inc("slack_api_queue_wait_seconds_sum", waited, method=api_method)
+            metrics.inc("slack_api_queue_wait_seconds_count", method=api_method)
+            try:
+                return await super().api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                status = e.response.status_code
+                if status == 429:
+                    metrics.inc("slack_api_rate_limited_total", method=api_method)
+                    retry_after = float(e.response.headers.get("Retry-After", 1))
+                    bucket.pause(retry_after)
+                    if attempt >= self.max_retries:
+                        raise
+                elif status < 500 or not self._can_retry(api_method, attempt):
+                    raise
+                else:
+                    await asyncio.sleep(self._retry_delay(attempt))
+            except OSError:
+                if not self._can_retry(api_method, attempt):
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+            attempt += 1
+            metrics.inc("slack_api_retries_total", method=api_method)
+
+
+class ChannelDirectory:
+    """
+    Resolves channel names to ids for a team. The full channel list is fetched
+    page by page once and kept in a TTL cache, optionally persisted in MongoDB
+    so new processes don't have to page through conversations.list again.
+    """
+
+    def __init__(self, client: WebClient, team_id, channel_dal=None):
+        self.logger = logging.getLogger(__name__)
+        self.client = client
+        self.team_id = team_id
+        if channel_dal is None and os.getenv("CHANNEL_DIRECTORY_PERSIST") == "true":
+            channel_dal = ChannelMongoDAL()
+        self.channel_dal = channel_dal
+
+    def get_channel_id(self, name):
+        """
+        Get the id of a channel by its name.
+        :param name: The name of the channel
+        :return: The id of the channel or None if it doesn't exist
+        """
+        channels = channel_cache.get(self.team_id)
+        if channels is None and self.channel_dal is not None:
+            channels = self.channel_dal.get_channels(self.team_id, channel_cache.ttl)
+            if channels is not None:
+                channel_cache.set(self.team_id, channels)
+        if channels is None:
+            channels = self.refresh()
+        return channels.get(name)
+
+    def refresh(self) -> dict:
+        """
+        Fetch all channels of the team, following the pagination cursor.
+        :return: A dictionary of channel name to channel id
+        """
+        channels = {}
+        cursor = None
+        while True:
+            response = self.client.conversations_list(
+                exclude_archived=True, limit=1000, cursor=cursor
+            )
+            for channel in response.get("channels", []):
+                channels[channel["name"]] = channel["id"]
+            cursor = response.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                break
+
+        self.logger.info(f"Loaded {len(channels)} channels for team {self.team_id}")
+        channel_cache.set(self.team_id, channels)
+        if self.channel_dal is not None:
+            self.channel_dal.save_channels(self.team_id, channels)
+        return channels
+
+    def refresh_in_background(self):
+        """
+        Refresh the channel directory on a background thread, unless a
+        refresh for the team is already running.
+        """
+        with _refreshing_lock:
+            if self.team_id in _refreshing:
+                return
+            _refreshing.add(self.team_id)
+
+        def run():
+            try:
+                self.refresh()
+            except SlackApiError as e:
+                self.logger.error(
+                    f"Error refreshing channel list: {e.response['error']}"
+                )
+            finally:
+                with _refreshing_lock:
+                    _refreshing.discard(self.team_id)
+
+        threading.Thread(target=run, daemon=True).start()
+
 
 class Slack:
-    def __init__(self, team_id=None):
+    def __init__(self, team_id=None, oauth_dal=None, client_factory=None):
+        """
+        :param team_id: The id of the team
+        :param oauth_dal: The workspace lookup for the bot token of the team, created if not given
+        :param client_factory: Builds the client of a team from its id and token, e.g. ServiceContainer.web_client
+        """
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.INFO)
 
-        self.oauth = OauthMongoDAL()
-        if team_id is None:
-            self.api_key = os.getenv("SLACK_BOT_TOKEN")
-        else:
-            self.api_key = os.getenv("SLACK_BOT_TOKEN")
+        self.team_id = team_id
+        self.oauth = oauth_dal if oauth_dal is not None else OauthMongoDAL()
+        self.client_factory = client_factory
+        self._client = None
+        self._channels = None
+
+    @property
+    def api_key(self) -> str | None:
+        """
+        The bot token of the team from its installation, SLACK_BOT_TOKEN if it isn't installed
+        """
+        if self.team_id is not None:
+            workspace = self.oauth.get_workspace(self.team_id)
+            if workspace is not None:
+                return workspace["bot_token"]
+        return os.getenv("SLACK_BOT_TOKEN")
+
+    @property
+    def client(self) -> WebClient:
+        """
+        The client of the team, rebuilt when the team was installed again with a new token
+        """
+        token = self.api_key
+        if self.client_factory is not None:
+            return self.client_factory(self.team_id, token)
+        if self._client is None or self._client.token != token:
+            self._client = RateLimitedWebClient(token=token, team_id=self.team_id)
+        return self._client
 
-        self.client = WebClient(token=self.api_key)
+    @property
+    def channels(self) -> ChannelDirectory:
+        """
+        The channel directory of the team, using the client of the team
+        """
+        client = self.client
+        if self._channels is None or self._channels.client is not client:
+            self._channels = ChannelDirectory(client, self.team_id)
+        return self._channels
 
     @staticmethod
     def private_slack_text(text):
@@ -32,17 +311,12 @@ class Slack:
         Fetch the channel ID for the channel name specified in the environment variable.
         """
         try:
-            response = self.client.conversations_list()
-            channels = response.get("channels", [])
-
-            for channel in channels:
-                if channel["name"] == os.getenv("SLACK_CHANNEL_NAME"):
-                    return channel["id"]
-
-            self.logger.warning(
-                "Channel not found: %s", os.getenv("SLACK_CHANNEL_NAME")
-            )
-            return None
+            channel_id = self.channels.get_channel_id(os.getenv("SLACK_CHANNEL_NAME"))
+            if channel_id is None:
+                self.logger.warning(
+                    "Channel not found: %s", os.getenv("SLACK_CHANNEL_NAME")
+                )
+            return channel_id
         except SlackApiError as e:
             self.logger.error(f"Error fetching channel list: {e.response['error']}")
             raise
@@ -0,0 +1,130 @@
+"""
+The storage the event handlers and services work with. MongoDB is used in
+production, the in-memory engine runs tests and benchmarks without a database.
+Select one with STORAGE_BACKEND, mongodb (default) or memory.
+"""
+
+import os
+from typing import Protocol
+
+from lib.api.memory import MemoryStorage
+from lib.api.mongodb import EventMongoDAL, OauthMongoDAL, PlaceCacheMongoDAL
+from lib.models.event import Event
+
+
+class EventStore(Protocol):
+    """
+    The events of one team, implemented by EventMongoDAL and MemoryEventDAL
+    """
+
+    team_id: str
+    timezone: str
+
+    @staticmethod
+    def page_cursor(event: Event) -> str: ...
+
+    def insert_event(self, event: Event) -> str: ...
+
+    def list_events(
+        self,
+        start_date=None,
+        end_date=None,
+        limit=None,
+        after=None,
+        projection=None,
+        viewer=None,
+    ) -> list[Event]: ...
+
+    def list_participants(
+        self, id, page=0, page_size=None
+    ) -> tuple[list[str], int] | None: ...
+
+    def get_event(self, id) -> Event | None: ...
+
+    def join_event(self, id, author) -> tuple[Event | None, str | None]: ...
+
+    def leave_event(self, id, author) -> tuple[Event | None, str | None]: ...
+
+    def delete_event(self, id, author) -> tuple[Event | None, str | None]: ...
+
+
+class WorkspaceStore(Protocol):
+    """
+    The workspace installations, implemented by OauthMongoDAL and MemoryOauthDAL
+    """
+
+    def get_workspace(self, team_id, enterprise_id=None) -> dict | None: ...
+
+
+class PlaceStore(Protocol):
+    """
+    The persisted place details, implemented by PlaceCacheMongoDAL
+    """
+
+    def get_place(self, place_id) -> dict | None: ...
+
+    def save_place(self, place_id, data: bytes): ...
+
+
+class Storage(Protocol):
+    name: str
+
+    def event_dal(self, team_id, timezone=None) -> EventStore: ...
+
+    def oauth_dal(self) -> WorkspaceStore: ...
+
+    def place_dal(self) -> PlaceStore | None: ...
+
+
+class MongoStorage:
+    """
+    The MongoDB storage, the DALs share the client of the process
+    """
+
+    name = "mongodb"
+
+    def __init__(self, database=None):
+        """
+        :param database: Optional database to use instead of the events database
+        """
+        self.database = database
+
+    def event_dal(self, team_id, timezone=None) -> EventMongoDAL:
+        event_dal = EventMongoDAL(team_id, timezone)
+        if self.database is not None:
+            event_dal.database = self.database
+        return event_dal
+
+    def oauth_dal(self) -> OauthMongoDAL:
+        oauth_dal = OauthMongoDAL()
+        if self.database is not None:
+            oauth_dal.database = self.database
+        return oauth_dal
+
+    def place_dal(self) -> PlaceCacheMongoDAL | None:
+        if os.getenv("PLACES_CACHE_PERSIST") == "false":
+            return None
+        place_dal = PlaceCacheMongoDAL()
+        if self.database is not None:
+            place_dal.database = self.database
+        return place_dal
+
+
+STORAGE_BACKENDS = {
+    MongoStorage.name: MongoStorage,
+    MemoryStorage.name: MemoryStorage,
+}
+
+
+def get_storage(backend=None) -> Storage:
+    """
+    Create the storage of the given backend
+    :param backend: mongodb or memory, defaults to STORAGE_BACKEND or mongodb
+    :return: The storage
+    """
+    backend = backend or os.getenv("STORAGE_BACKEND", MongoStorage.name)
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(
+            f"Unknown STORAGE_BACKEND {backend}, use one of {', '.join(STORAGE_BACKENDS)}"
+        )
+    return STORAGE_BACKENDS[backend]()
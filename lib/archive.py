@@ -0,0 +1,70 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from lib.api.mongodb import EventBatchMongoDAL
+
+
+class EventArchiver:
+    """
+    Moves the events that are older than the retention to the events_archive
+    collection, so the events collection only holds the recent and upcoming
+    events. Runs are idempotent, several instances may archive at the same time.
+    """
+
+    def __init__(self, event_batch_dal=None, retention_days=None):
+        """
+        Initialize an EventArchiver.
+
+        :param event_batch_dal: The EventBatchMongoDAL, created if not given.
+        :param retention_days: How many days past events are kept, defaults to EVENT_RETENTION_DAYS or 30.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.event_batch_dal = event_batch_dal or EventBatchMongoDAL()
+        self.retention_days = (
+            retention_days
+            if retention_days is not None
+            else int(os.getenv("EVENT_RETENTION_DAYS", 30))
+        )
+
+    def cutoff(self, now=None) -> datetime:
+        """
+        The events starting before the cutoff are archived
+        """
+        now = now or datetime.now(timezone.utc)
+        return now - timedelta(days=self.retention_days)
+
+    def run_once(self, dry_run=False) -> dict:
+        """
+        Archive the events dated before the cutoff
+        :param dry_run: Only count the events that would be archived
+        :return: The stats of the run
+        """
+        start = time.perf_counter()
+        cutoff = self.cutoff()
+        stats = self.event_batch_dal.archive_before(cutoff, dry_run=dry_run)
+        stats.update(
+            cutoff=cutoff.isoformat(), seconds=round(time.perf_counter() - start, 3)
+        )
+        self.logger.info(f"Archived events: {stats}")
+        return stats
+
+    def start_in_background(self, interval=24 * 3600) -> threading.Event:
+        """
+        Archive every interval seconds on a daemon thread
+        :return: An event that stops the archiver when set
+        """
+        stop = threading.Event()
+
+        def run():
+            while not stop.is_set():
+                try:
+                    self.run_once()
+                except Exception:
+                    self.logger.exception("Archiving events failed")
+                stop.wait(interval)
+
+        threading.Thread(target=run, name="archive", daemon=True).start()
+        return stop
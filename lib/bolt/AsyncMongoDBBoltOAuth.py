@@ -0,0 +1,94 @@
+import asyncio
+from typing import Optional
+
+from slack_bolt.oauth.internals import Installation
+from slack_sdk.oauth.installation_store.async_installation_store import (
+    AsyncInstallationStore,
+)
+from slack_sdk.oauth.installation_store.models.bot import Bot
+from slack_sdk.oauth.state_store.async_state_store import AsyncOAuthStateStore
+
+from lib.bolt.MongoDBBoltOAuth import MongoInstallationStore
+from lib.bolt.MongoDBBoltOAuthStateStore import MongoDBOAuthStateStore
+
+
+class AsyncMongoInstallationStore(AsyncInstallationStore):
+    """
+    Exposes MongoInstallationStore to the AsyncApp. Installations are rare, so
+    the sync store is run on a thread rather than duplicated on the async driver.
+    """
+
+    def __init__(self):
+        self.store = MongoInstallationStore()
+
+    async def async_save(self, installation: Installation):
+        await asyncio.to_thread(self.store.save, installation)
+
+    async def async_find_installation(
+        self,
+        *,
+        enterprise_id: Optional[str],
+        team_id: Optional[str],
+        user_id: Optional[str] = None,
+        is_enterprise_install: Optional[bool] = False,
+    ) -> Optional[Installation]:
+        return await asyncio.to_thread(
+            self.store.find_installation,
+            enterprise_id=enterprise_id,
+            team_id=team_id,
+            user_id=user_id,
+            is_enterprise_install=is_enterprise_install,
+        )
+
+    async def async_find_bot(
+        self,
+        *,
+        enterprise_id: Optional[str],
+        team_id: Optional[str],
+        is_enterprise_install: Optional[bool] = False,
+    ) -> Optional[Bot]:
+        return await asyncio.to_thread(
+            self.store.find_bot,
+            enterprise_id=enterprise_id,
+            team_id=team_id,
+            is_enterprise_install=is_enterprise_install,
+        )
+
+    async def async_delete_bot(
+        self,
+        *,
+        enterprise_id: Optional[str],
+        team_id: Optional[str],
+    ) -> None:
+        await asyncio.to_thread(
+            self.store.delete_bot, enterprise_id=enterprise_id, team_id=team_id
+        )
+
+    async def async_delete_installation(
+        self,
+        *,
+        enterprise_id: Optional[str],
+        team_id: Optional[str],
+        user_id: Optional[str] = None,
+    ) -> None:
+        await asyncio.to_thread(
+            self.store.delete_installation,
+            enterprise_id=enterprise_id,
+            team_id=team_id,
+            user_id=user_id,
+        )
+
+
+class AsyncMongoDBOAuthStateStore(AsyncOAuthStateStore):
+    """
+    Exposes MongoDBOAuthStateStore to the AsyncApp.
+    """
+
+    def __init__(self, expiration_seconds: int):
+        self.store = MongoDBOAuthStateStore(expiration_seconds=expiration_seconds)
+
+    async def async_issue(self, *args, **kwargs) -> str:
+        return await asyncio.to_thread(self.store.issue, *args, **kwargs)
+
+    async def async_consume(self, state: str) -> bool:
+        return await asyncio.to_thread(self.store.consume, state)
@@ -1,17 +1,48 @@
 from typing import Optional
 
 from slack_bolt.oauth.internals import Installation
+from slack_sdk import WebClient
 from slack_sdk.oauth.installation_store import InstallationStore
 from slack_sdk.oauth.installation_store.models.bot import Bot
 
 from lib.api.mongodb import OauthMongoDAL
 
+# Stored next to the installation, and not known to the Slack SDK models
+CUSTOM_FIELDS = ("timezone",)
+
+
+def from_document(model, document):
+    """
+    Build an Installation or Bot from its document, with the custom fields as custom values
+    :param model: Installation or Bot
+    :param document: The document in MongoDB
+    :return: The installation or bot
+    """
+    del document["_id"]
+    custom_values = {
+        field: document.pop(field) for field in CUSTOM_FIELDS if field in document
+    }
+    return model(**document, custom_values=custom_values)
+
 
 class MongoInstallationStore(InstallationStore):
     def __init__(self):
-        self.db = OauthMongoDAL().database
+        self.oauth_dal = OauthMongoDAL()
+
+    @property
+    def db(self):
+        # Looked up on every use, see MongoDAL
+        return self.oauth_dal.database
+
+    @db.setter
+    def db(self, database):
+        self.oauth_dal.database = database
 
     def save(self, installation: Installation):
+        if installation.get_custom_value("timezone") is None:
+            timezone = self.installer_timezone(installation)
+            if timezone is not None:
+                installation.set_custom_value("timezone", timezone)
         self.db.slack_installations.update_one(
             {
                 "enterprise_id": installation.enterprise_id,
@@ -28,6 +59,26 @@ class MongoInstallationStore(InstallationStore):
             {"$set": installation.to_bot().to_dict()},
             upsert=True,
         )
+        OauthMongoDAL.invalidate_workspace(
+            installation.enterprise_id, installation.team_id
+        )
+
+    def installer_timezone(self, installation: Installation) -> str | None:
+        """
+        Get the timezone of the user that installed the app, used as the timezone of the team
+        :param installation: The new installation
+        :return: The name of the timezone, None if it can't be looked up
+        """
+        try:
+            response = WebClient(token=installation.bot_token).users_info(
+                user=installation.user_id
+            )
+            return response["user"].get("tz")
+        except Exception as e:
+            self.logger.warning(
+                f"Could not look up the timezone of team {installation.team_id}: {e}"
+            )
+            return None
 
     def find_installation(
         self,
@@ -42,25 +93,21 @@ class MongoInstallationStore(InstallationStore):
                 {"enterprise_id": enterprise_id, "user_id": user_id}
             )
             if result:
-                del result["_id"]
-                return Installation(**result)
+                return from_document(Installation, result)
             result = self.db.slack_installations.find_one(
                 {"enterprise_id": enterprise_id}
             )
             if result:
-                del result["_id"]
-                return Installation(**result)
+                return from_document(Installation, result)
             return None
         result = self.db.slack_installations.find_one(
             {"team_id": team_id, "user_id": user_id}
         )
         if result:
-            del result["_id"]
-            return Installation(**result)
+            return from_document(Installation, result)
         result = self.db.slack_installations.find_one({"team_id": team_id})
         if result:
-            del result["_id"]
-            return Installation(**result)
+            return from_document(Installation, result)
         return None
 
     def find_bot(
@@ -74,13 +121,11 @@ class MongoInstallationStore(InstallationStore):
         if is_enterprise_install:
             result = self.db.slack_bots.find_one({"enterprise_id": enterprise_id})
             if result:
-                del result["_id"]
-                return Bot(**result)
+                return from_document(Bot, result)
             return None
         result = self.db.slack_bots.find_one({"team_id": team_id})
         if result:
-            del result["_id"]
-            return Bot(**result)
+            return from_document(Bot, result)
         return None
 
     def delete_bot(
@@ -93,6 +138,7 @@ class MongoInstallationStore(InstallationStore):
         self.db.slack_bots.delete_one(
             {"enterprise_id": enterprise_id, "team_id": team_id}
         )
+        OauthMongoDAL.invalidate_workspace(enterprise_id, team_id)
 
     def delete_installation(
         self,
@@ -114,3 +160,4 @@ class MongoInstallationStore(InstallationStore):
             self.db.slack_installations.delete_one(
                 {"enterprise_id": enterprise_id, "team_id": team_id}
             )
+        OauthMongoDAL.invalidate_workspace(enterprise_id, team_id)
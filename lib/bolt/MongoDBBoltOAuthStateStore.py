@@ -1,7 +1,6 @@
-import time
+from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 
-from pymongo import ASCENDING
 from slack_sdk.oauth.state_store import OAuthStateStore
 
 from lib.api.mongodb import OauthMongoDAL
@@ -9,20 +8,22 @@ from lib.api.mongodb import OauthMongoDAL
 
 class MongoDBOAuthStateStore(OAuthStateStore):
     def __init__(self, expiration_seconds: int):
-        self.db = OauthMongoDAL().database
-        self.collection = self.db["oauth_states"]
+        self.oauth_dal = OauthMongoDAL()
+        # The TTL index removing expired states is part of the index registry
         self.expiration_seconds = expiration_seconds
 
-        # Ensure TTL index exists
-        self.collection.create_index(
-            [("created_at", ASCENDING)],
-            expireAfterSeconds=self.expiration_seconds,
-        )
+    @property
+    def collection(self):
+        # Looked up on every use, see MongoDAL
+        return self.oauth_dal.database["oauth_states"]
 
     def issue(self, *args, **kwargs) -> str:
         state = str(uuid4())
         try:
-            self.collection.insert_one({"state": state, "created_at": time.time()})
+            # A BSON date, the TTL index doesn't expire other types
+            self.collection.insert_one(
+                {"state": state, "created_at": datetime.now(timezone.utc)}
+            )
             return state
         except Exception as e:
             raise e
@@ -32,8 +33,11 @@ class MongoDBOAuthStateStore(OAuthStateStore):
             result = self.collection.find_one_and_delete({"state": state})
             if result:
                 created_at = result["created_at"]
-                expiration = created_at + self.expiration_seconds
-                still_valid = time.time() < expiration
+                if isinstance(created_at, (int, float)):
+                    # States issued before created_at was stored as a date
+                    created_at = datetime.fromtimestamp(created_at, timezone.utc)
+                expiration = created_at + timedelta(seconds=self.expiration_seconds)
+                still_valid = datetime.now(timezone.utc) < expiration
                 return still_valid
             else:
                 return False
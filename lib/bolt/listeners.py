@@ -0,0 +1,57 @@
+"""
+The listener logic shared by the Flask (bolt.py) and ASGI (bolt_async.py) apps.
+"""
+
+from lib.api.identity_map import request_scope
+from lib.services import ServiceContainer
+from lib.utils.helpers import validate_token
+
+# Subcommands that open a modal. Slack's trigger_id expires three seconds after
+# the request, so they must not wait in the background queue.
+TRIGGER_COMMANDS = {"create"}
+
+
+def uses_trigger(command) -> bool:
+    """
+    Whether a slash command opens a modal and has to be handled on the request thread
+    """
+    return (command.get("text") or "").split(" ")[0] in TRIGGER_COMMANDS
+
+
+def handle_command(services: ServiceContainer, command, respond, say, client):
+    token = command.get("token", None)
+    type = command.get("type", None)
+    ssl_check = command.get("ssl_check", None)
+    challenge = command.get("challenge", None)
+    text = command.get("text", None)
+
+    if not validate_token(token):
+        return respond("Unauthorized")
+
+    if type is not None and type == "block_actions":
+        event_handler = services.event_handler(
+            command.get("user").get("team_id"), client, say, respond
+        )
+        with request_scope():
+            return event_handler.handle_interactive_event(command)
+    if challenge is not None:
+        return {"challenge": challenge}
+    if ssl_check is not None:
+        return {"ssl_check": ssl_check}
+    if text is not None:
+        event_handler = services.event_handler(
+            command.get("team_id"), client, say, respond
+        )
+        with request_scope():
+            return event_handler.parse_command(text, command)
+
+
+def create_event_from_view(services: ServiceContainer, body, client, say, respond):
+    event_handler = services.event_handler(
+        body.get("team").get("id"), client, say, respond
+    )
+    with request_scope():
+        event_handler.create_event_response(body)
+        if body.get("view", {}).get("id"):
+            user_id = body.get("user").get("id")
+            event_handler.update_events_view(user_id)
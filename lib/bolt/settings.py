@@ -0,0 +1,25 @@
+"""
+The OAuth settings shared by the Flask (bolt.py) and ASGI (bolt_async.py) apps.
+"""
+
+BOT_SCOPES = [
+    "channels:history",
+    "channels:join",
+    "chat:write",
+    "chat:write.customize",
+    "chat:write.public",
+    "commands",
+    "groups:history",
+    "im:history",
+    "im:read",
+    "im:write",
+    "im:write.topic",
+    "incoming-webhook",
+    "mpim:history",
+    "mpim:read",
+    "mpim:write",
+    "mpim:write.topic",
+    "channels:read",
+    "users:read",
+]
+USER_SCOPES = ["channels:write.invites"]
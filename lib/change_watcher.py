@@ -0,0 +1,212 @@
+import logging
+import os
+import threading
+import time
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from lib.api.mongodb import INSTANCE_ID, ChangeMongoDAL, local_deletes
+from lib.utils.invalidation import invalidation_bus
+from lib.utils.metrics import metrics
+
+# The collections whose documents are cached in memory
+WATCHED_COLLECTIONS = ("events", "slack_installations", "slack_bots")
+DOCUMENT_OPERATIONS = {"insert", "update", "replace", "delete"}
+# Change streams need a replica set, a standalone mongod answers with this code
+NOT_A_REPLICA_SET = 40573
+# The resume token is no longer in the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+class ChangeWatcher:
+    """
+    Publishes the changes of the cached collections to the invalidation bus,
+    so the caches of every app instance learn about the writes of the others.
+    Follows a MongoDB change stream whose resume token is persisted, so a
+    restarted instance continues where it stopped. Without a replica set the
+    collections are polled instead.
+    """
+
+    def __init__(
+        self,
+        bus=None,
+        change_dal=None,
+        mode=None,
+        poll_interval=None,
+        name="caches",
+        timer=time.monotonic,
+    ):
+        """
+        Initialize a ChangeWatcher.
+
+        :param bus: The InvalidationBus to publish to, defaults to the shared one.
+        :param change_dal: The ChangeMongoDAL, created if not given.
+        :param mode: stream, poll or auto to poll when change streams aren't supported, defaults to CHANGE_WATCH_MODE or auto.
+        :param poll_interval: Seconds between polls, defaults to CHANGE_POLL_INTERVAL_SECONDS or 10.
+        :param name: The name the resume token is stored under.
+        :param timer: The clock used to throttle saving the resume token.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.bus = bus or invalidation_bus
+        self.change_dal = change_dal or ChangeMongoDAL()
+        self.mode = mode or os.getenv("CHANGE_WATCH_MODE", "auto")
+        self.poll_interval = poll_interval or int(
+            os.getenv("CHANGE_POLL_INTERVAL_SECONDS", 10)
+        )
+        self.name = name
+        self.timer = timer
+        self.token_save_interval = 5
+
+    @staticmethod
+    def message(change) -> dict:
+        """
+        Turn a change stream event into an invalidation message. The team of
+        a deleted document is taken from its pre-image, and is unknown
+        without one.
+        """
+        document = (
+            change.get("fullDocument") or change.get("fullDocumentBeforeChange") or {}
+        )
+        return {
+            "collection": change["ns"]["coll"],
+            "operation": change["operationType"],
+            "team_id": document.get("team_id"),
+            "enterprise_id": document.get("enterprise_id"),
+        }
+
+    @staticmethod
+    def is_local(change) -> bool:
+        """
+        Whether an event was changed by this process, which already updated
+        its caches and home tabs after the write
+        """
+        if change["ns"]["coll"] != "events":
+            return False
+        if change["operationType"] == "delete":
+            document_id = str(change.get("documentKey", {}).get("_id"))
+            return local_deletes.peek(document_id) is not None
+        document = change.get("fullDocument") or {}
+        return document.get("written_by") == INSTANCE_ID
+
+    def watch(self, stop):
+        """
+        Publish the changes of the change stream until stop is set
+        """
+        token = self.change_dal.load_token(self.name)
+        saved, saved_at = token, self.timer()
+        invalidated = False
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}}]
+        with self.change_dal.database.watch(
+            pipeline,
+            full_document="updateLookup",
+            full_document_before_change="whenAvailable",
+            resume_after=token,
+            max_await_time_ms=1000,
+        ) as stream:
+            self.logger.info("Watching changes of the cached collections")
+            try:
+                while not stop.is_set() and stream.alive:
+                    change = stream.try_next()
+                    if change is not None:
+                        if change["operationType"] in DOCUMENT_OPERATIONS:
+                            if not self.is_local(change):
+                                self.bus.publish(self.message(change))
+                        else:
+                            # Dropped or renamed collections end the stream
+                            self.bus.invalidate_all()
+                            if change["operationType"] == "invalidate":
+                                # An invalidated stream can't be resumed
+                                self.change_dal.save_token(self.name, None)
+                                invalidated = True
+                                return
+                        metrics.inc("change_stream_events_total")
+                    token = stream.resume_token
+                    if token != saved and self.timer() - saved_at >= (
+                        self.token_save_interval
+                    ):
+                        self.change_dal.save_token(self.name, token)
+                        saved, saved_at = token, self.timer()
+            finally:
+                token = stream.resume_token
+                if not invalidated and token is not None and token != saved:
+                    self.change_dal.save_token(self.name, token)
+
+    def poll_once(self, previous=None) -> dict:
+        """
+        Compare the fingerprints of the watched collections with the previous
+        ones and publish the workspaces that changed
+        :param previous: The fingerprints returned by the previous call
+        :return: The current fingerprints
+        """
+        current = {
+            collection: self.change_dal.fingerprints(collection)
+            for collection in WATCHED_COLLECTIONS
+        }
+        if previous is None:
+            return current
+        for collection in WATCHED_COLLECTIONS:
+            before, after = previous[collection], current[collection]
+            for enterprise_id, team_id in before.keys() | after.keys():
+                if before.get((enterprise_id, team_id)) != after.get(
+                    (enterprise_id, team_id)
+                ):
+                    self.bus.publish(
+                        {
+                            "collection": collection,
+                            "operation": "poll",
+                            "team_id": team_id,
+                            "enterprise_id": enterprise_id,
+                        }
+                    )
+        return current
+
+    def poll(self, stop):
+        """
+        Poll for changes every poll_interval seconds until stop is set
+        """
+        self.logger.info("Polling the cached collections for changes")
+        fingerprints = None
+        while not stop.is_set():
+            try:
+                fingerprints = self.poll_once(fingerprints)
+            except PyMongoError:
+                self.logger.exception("Polling for changes failed")
+            stop.wait(self.poll_interval)
+
+    def run_forever(self, stop=None):
+        """
+        Watch for changes until stop is set, resuming the change stream after errors
+        :param stop: Optional threading.Event to stop the watcher
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            if self.mode == "poll":
+                return self.poll(stop)
+            try:
+                self.watch(stop)
+            except OperationFailure as e:
+                if e.code == NOT_A_REPLICA_SET and self.mode == "auto":
+                    self.logger.warning("Change streams need a replica set, polling")
+                    self.mode = "poll"
+                    continue
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    self.logger.warning("Missed changes, dropping all cached data")
+                    self.change_dal.save_token(self.name, None)
+                    self.bus.invalidate_all()
+                    continue
+                self.logger.exception("Watching changes failed")
+            except PyMongoError:
+                self.logger.exception("Watching changes failed")
+            metrics.inc("change_stream_restarts_total")
+            stop.wait(5)
+
+    def start_in_background(self) -> threading.Event:
+        """
+        Run the watcher on a daemon thread
+        :return: An event that stops the watcher when set
+        """
+        stop = threading.Event()
+        threading.Thread(
+            target=self.run_forever, args=(stop,), name="change-watcher", daemon=True
+        ).start()
+        return stop
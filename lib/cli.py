@@ -0,0 +1,101 @@
+"""
+Maintenance commands for the app.
+
+Run with: python -m lib.cli <command>
+"""
+
+import argparse
+import json
+import logging
+
+from lib.api.mongodb import EventBatchMongoDAL, ensure_indexes, index_report
+from lib.archive import EventArchiver
+from lib.reminders import ReminderScheduler
+from lib.services import ServiceContainer
+
+
+def indexes(args):
+    if args.action == "ensure":
+        result = ensure_indexes()
+    else:
+        result = index_report()
+    print(json.dumps(result, indent=2))
+
+
+def remind(args):
+    scheduler = ReminderScheduler(ServiceContainer())
+    if args.forever:
+        scheduler.run_forever(interval=args.interval)
+    else:
+        print(json.dumps(scheduler.run_once(dry_run=args.dry_run), indent=2))
+
+
+def archive(args):
+    archiver = EventArchiver(retention_days=args.retention_days)
+    print(json.dumps(archiver.run_once(dry_run=args.dry_run), indent=2))
+
+
+def backfill(args):
+    dal = EventBatchMongoDAL()
+    result = {
+        "starts_at": dal.backfill_starts_at(
+            **({"tz": args.timezone} if args.timezone else {}), dry_run=args.dry_run
+        ),
+        "participant_count": dal.backfill_participant_count(dry_run=args.dry_run),
+    }
+    print(json.dumps(result, indent=2))
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="python -m lib.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    indexes_parser = commands.add_parser(
+        "indexes", help="Create or inspect the MongoDB indexes"
+    )
+    indexes_parser.add_argument("action", choices=["ensure", "report"])
+    indexes_parser.set_defaults(func=indexes)
+
+    remind_parser = commands.add_parser(
+        "remind", help="Remind the teams of the events of today"
+    )
+    remind_parser.add_argument(
+        "--dry-run", action="store_true", help="Only print what would be posted"
+    )
+    remind_parser.add_argument(
+        "--forever", action="store_true", help="Keep checking for due teams"
+    )
+    remind_parser.add_argument("--interval", type=int, default=60)
+    remind_parser.set_defaults(func=remind)
+
+    archive_parser = commands.add_parser(
+        "archive", help="Move past events to the events_archive collection"
+    )
+    archive_parser.add_argument(
+        "--dry-run", action="store_true", help="Only count the events to archive"
+    )
+    archive_parser.add_argument(
+        "--retention-days", type=int, help="Defaults to EVENT_RETENTION_DAYS or 30"
+    )
+    archive_parser.set_defaults(func=archive)
+
+    backfill_parser = commands.add_parser(
+        "backfill",
+        help="Set starts_at and participant_count on events stored without them",
+    )
+    backfill_parser.add_argument(
+        "--dry-run", action="store_true", help="Only count the events to update"
+    )
+    backfill_parser.add_argument(
+        "--timezone",
+        help="The timezone of the stored dates, defaults to DEFAULT_TIMEZONE",
+    )
+    backfill_parser.set_defaults(func=backfill)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
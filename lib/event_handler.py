@@ -1,16 +1,28 @@
 # coding=utf-8
 import logging
-from datetime import datetime
+import os
 
 from lib.api.google_places import GooglePlaces
-from lib.api.mongodb import EventMongoDAL
+from lib.api.identity_map import apply_change, current_identity_map
+from lib.api.mongodb import (
+    ALREADY_PARTICIPANT,
+    EVENT_NOT_FOUND,
+    NOT_EVENT_AUTHOR,
+    NOT_PARTICIPANT,
+    PARTICIPANTS_PAGE_SIZE,
+    EventMongoDAL,
+)
 from lib.api.slack import Slack
 from lib.models.event import Event
 from lib.models.event_place import EventPlace
-from lib.utils.date_utils import get_date
+from lib.utils.cache import TTLCache
+from lib.utils.date_utils import get_date, today_in
 from lib.utils.helpers import extract_values, get_valid_commands
+from lib.utils.invalidation import invalidation_bus
 from lib.utils.slack_helpers import (
     build_create_dialog,
+    build_participants_view,
+    print_event_body,
     print_event_create,
     print_event_created,
     print_event_list,
@@ -19,6 +31,35 @@ from lib.utils.slack_helpers import (
     show_events_view,
 )
 
+# Keeps the event list within Slack's block limits for messages and the home tab,
+# the events that follow are paged in with the More events button
+EVENT_LIST_LIMIT = 10
+
+# The upcoming events of each team with the blocks that look the same for every user
+event_list_cache = TTLCache(
+    maxsize=int(os.getenv("EVENT_LIST_CACHE_SIZE", 1024)),
+    ttl=int(os.getenv("EVENT_LIST_CACHE_TTL_SECONDS", 300)),
+    name="event_list",
+)
+
+
+def invalidate_event_list(team_id):
+    """
+    Drop the cached event list of a team, call whenever its events change
+    :param team_id: The id of the team
+    """
+    event_list_cache.invalidate_where(lambda key, _: key[0] == team_id)
+
+
+def _events_changed(message):
+    if message["team_id"] is None:
+        event_list_cache.clear()
+    else:
+        invalidate_event_list(message["team_id"])
+
+
+invalidation_bus.subscribe(("events",), _events_changed)
+
 
 class EventHandler:
     def __init__(
@@ -29,11 +70,14 @@ class EventHandler:
         respond_func=None,
         current_view=None,
         event_dal=None,
+        slack=None,
+        google_places=None,
+        home_tab=None,
     ):
         self.logger = logging.getLogger()
         self.logger.setLevel(logging.INFO)
 
-        self.slack = Slack(team_id)
+        self.slack = slack if slack is not None else Slack(team_id)
         self.bolt_client = bolt_client
         self.current_view_id = current_view
         self.say = say_func
@@ -41,10 +85,11 @@ class EventHandler:
         if team_id is None:
             self.logger.error("No team id specified")
         self.team_id = team_id
-        self.event_dal = (
-            event_dal or EventMongoDAL(team_id) if event_dal is None else event_dal
+        self.event_dal = event_dal if event_dal is not None else EventMongoDAL(team_id)
+        self.google_places = (
+            google_places if google_places is not None else GooglePlaces()
         )
-        self.google_places = GooglePlaces()
+        self.home_tab = home_tab
 
     def parse_command(self, command, event):
         """
@@ -78,6 +123,11 @@ class EventHandler:
             action = payload.get("actions")[0]
             user = payload.get("user").get("id")
             channel_id = payload.get("container").get("channel_id")
+            if action.get("action_id") == "show_participants":
+                # Only opens or pages the modal, the events didn't change
+                return self.show_participants(action.get("value"), payload)
+            if action.get("action_id") == "more_events":
+                return self.more_events(action.get("value"), payload)
             if action.get("action_id") == "suggest_place":
                 self.suggest_event(action.get("value"), payload)
             elif action.get("action_id") == "join_event":
@@ -92,6 +142,7 @@ class EventHandler:
         update_view = self.show_events_view(payload.get("user").get("id"))
 
         if "view_id" in payload.get("container"):
+            self.viewed_home_tab(payload.get("user").get("id"))
             self.logger.info(
                 "Updating view with ID: {view_id}".format(
                     view_id=payload.get("container").get("view_id")
@@ -122,6 +173,7 @@ class EventHandler:
         :return: None
         """
         if user_id:
+            self.viewed_home_tab(user_id)
             event_view = self.show_events_view(user_id)
             self.bolt_client.views_publish(user_id=user_id, view=event_view)
 
@@ -132,8 +184,18 @@ class EventHandler:
         :return: A slack message containing the upcoming events
         """
         self.logger.info(command, event)
-        results = self.event_dal.list_events()
-        events = print_event_list(results, event.get("user_id"))
+        cached = event_list_cache.get(self._event_list_key())
+        if cached is not None:
+            results, bodies = cached
+        else:
+            # The list is for one user, so there is no need to load every participant
+            results = self.event_dal.list_events(
+                limit=EVENT_LIST_LIMIT, viewer=event.get("user_id")
+            )
+            bodies = None
+        events = print_event_list(
+            results, event.get("user_id"), bodies, self._next_page(results)
+        )
         self.logger.info("Found events: {events}".format(events=events))
         if results and len(results) > 0:
             self.respond(events.to_dict_respond())
@@ -148,7 +210,10 @@ class EventHandler:
         """
         self.logger.info(command, event)
         trigger_id = event.get("trigger_id")
-        self.bolt_client.views_open(trigger_id=trigger_id, view=build_create_dialog())
+        self.bolt_client.views_open(
+            trigger_id=trigger_id,
+            view=build_create_dialog(google_places=self.google_places),
+        )
         return self.respond("Please follow the instructions in the dialog!")
 
     def join_event(self, author, id, channel_id):
@@ -160,17 +225,23 @@ class EventHandler:
         :return: None
         """
         if id is not None:
-            if self.event_dal.join_event(id, author):
+            _, error = self.event_dal.join_event(id, author)
+            if error is None:
+                self.events_changed()
                 self.send_epemeral_message(
                     "*Great!* You've joined the event!", author, channel_id
                 )
                 self.logger.info("*Great!* You've joined the event!")
                 return True
+            if error == EVENT_NOT_FOUND:
+                err_msg = "*Sorry!* I couldn't find the event to join."
+            elif error == ALREADY_PARTICIPANT:
+                err_msg = "*Oops!* You are already participating in that event."
             else:
-                err_msg = "*Oops!* I couldn't join you to that event. Maybe you are already participating?"
-                self.send_epemeral_message(err_msg, author, channel_id)
-                self.logger.error(err_msg)
-                return None, err_msg
+                err_msg = "*Oops!* I couldn't join you to that event."
+            self.send_epemeral_message(err_msg, author, channel_id)
+            self.logger.error(err_msg)
+            return None, err_msg
 
     def leave_event(self, id, author, channel_id):
         """
@@ -181,7 +252,9 @@ class EventHandler:
         :return: None
         """
         if id is not None:
-            if self.event_dal.leave_event(id, author):
+            _, error = self.event_dal.leave_event(id, author)
+            if error is None:
+                self.events_changed()
                 self.send_epemeral_message(
                     "*Done!* You are now removed from the event!",
                     author,
@@ -189,14 +262,42 @@ class EventHandler:
                 )
                 self.logger.info("*Done!* You are now removed from the event!")
                 return True
-            else:
+            if error == EVENT_NOT_FOUND:
+                err_msg = "*Sorry!* I couldn't find the event to leave."
+            elif error == NOT_PARTICIPANT:
                 err_msg = "*Oops!* Are you really joined to that event?"
-                self.send_epemeral_message(err_msg, author, channel_id)
-                self.logger.error(err_msg)
-                return None, err_msg
+            else:
+                err_msg = "*Oops!* I couldn't remove you from that event."
+            self.send_epemeral_message(err_msg, author, channel_id)
+            self.logger.error(err_msg)
+            return None, err_msg
 
         return "Couldn't find any event on that day."
 
+    def show_participants(self, value, payload):
+        """
+        Show a page of the participants of an event in the participants modal.
+        The modal is opened by the listener, the trigger_id of the payload
+        expires before the participants are looked up.
+        :param value: The id of the event and the number of the page, separated by |
+        :param payload: The payload of the block action, its view is the participants modal
+        :return: None
+        """
+        id, page = value.split("|")
+        page = int(page)
+        result = self.event_dal.list_participants(id, page, PARTICIPANTS_PAGE_SIZE)
+        if result is None:
+            return self.send_epemeral_message(
+                "*Sorry!* I couldn't find that event.",
+                payload.get("user").get("id"),
+                payload.get("container").get("channel_id"),
+            )
+        participants, count = result
+        view = build_participants_view(
+            id, participants, count, page, PARTICIPANTS_PAGE_SIZE
+        )
+        self.bolt_client.views_update(view_id=payload["view"]["id"], view=view)
+
     def delete_event(self, id, author, channel_id):
         """
         Deletes an event from the database
@@ -206,9 +307,8 @@ class EventHandler:
         :return: None
         """
         if id is not None:
-            # Fetch the event details before deleting
-            event = self.event_dal.get_event(id)
-            if not event:
+            event, error = self.event_dal.delete_event(id, author)
+            if error == EVENT_NOT_FOUND:
                 self.send_epemeral_message(
                     "*Sorry!* I couldn't find the event to delete.",
                     author,
@@ -216,7 +316,7 @@ class EventHandler:
                 )
                 return None, "Event not found."
 
-            if event["Author"] != author:
+            if error == NOT_EVENT_AUTHOR:
                 self.send_epemeral_message(
                     "*Sorry!* You can only delete events you created.",
                     author,
@@ -224,20 +324,7 @@ class EventHandler:
                 )
                 return None, "Unauthorized to delete the event."
 
-            # Proceed to delete the event
-            if self.event_dal.delete_event(id, author):
-                event_details = f"*{event['Location']['name']}* on *{event['Date'].split("|")[1]}* at *{event['Time']}*"
-                self.say(
-                    text=f"The event has been cancelled: {event_details}",
-                    channel=self.slack.get_channel_id(),
-                )
-                self.send_epemeral_message(
-                    f"*Gotcha!* Event deleted: {event_details}",
-                    author,
-                    channel_id,
-                )
-                return True
-            else:
+            if event is None:
                 self.send_epemeral_message(
                     "*Sorry!* I was unable to delete the event.",
                     author,
@@ -245,6 +332,21 @@ class EventHandler:
                 )
                 return None, "Failed to delete the event."
 
+            self.events_changed()
+            event_details = (
+                f"*{event.location.name()}* on *{event.date}* at *{event.time}*"
+            )
+            self.say(
+                text=f"The event has been cancelled: {event_details}",
+                channel=self.slack.get_channel_id(),
+            )
+            self.send_epemeral_message(
+                f"*Gotcha!* Event deleted: {event_details}",
+                author,
+                channel_id,
+            )
+            return True
+
         return "Couldn't find any event on that day."
 
     def suggest_event(self, command, event):
@@ -280,20 +382,20 @@ class EventHandler:
 
         self.respond(return_value)
 
-    def todays_event(self):
+    def todays_event(self, events=None, channel_id=None):
         """
-        Runs automatically on a cloudwatch schedule each day to look for any events today
-        :return: A message in the slack channel notifying anyone of an upcoming event
+        Announces the events of today in the channel, run daily by the ReminderScheduler
+        :param events: The events of today, looked up if not given
+        :param channel_id: The id of the channel, SLACK_CHANNEL_NAME is looked up if not given
+        :return: None, failing to post an event raises
         """
-        event = self.event_dal.get_event(datetime.today().strftime("%Y-%m-%d"))
-
-        if event is not None:
-            event = print_event_today(event)
+        if events is None:
+            today = today_in(self.event_dal.timezone)
+            events = self.event_dal.list_events(start_date=today, end_date=today)
 
-            try:
-                self.say(text=event)
-            except Exception as e:
-                self.logger.error(e)
+        channel_id = channel_id or self.slack.get_channel_id()
+        for event in events:
+            self.say(text=print_event_today(event), channel=channel_id)
 
     def create_event_from_input(
         self, date, place_id, time, author, channel_id, description=None
@@ -317,10 +419,12 @@ class EventHandler:
             time=time,
             location=self.google_places.format_place(place),
             author=author,
+            timezone=self.event_dal.timezone,
         )
         try:
             id = self.event_dal.insert_event(event)
             event._id = id
+            self.events_changed()
             self.logger.info("Created a new event")
 
             message = print_event_created(event)
@@ -373,6 +477,110 @@ class EventHandler:
         :param user_id: The ID of the user to show the events view to.
         """
         self.logger.info(f"Showing events view for user: {user_id}")
-        results = self.event_dal.list_events()
+        results, bodies = self.upcoming_events()
+
+        return show_events_view(user_id, results, bodies, self._next_page(results))
+
+    def more_events(self, after, payload):
+        """
+        Show the next page of upcoming events, in the home tab or as a reply to the event list
+        :param after: The cursor of the last event shown, the first page is shown if not given
+        :param payload: The payload of the block action
+        :return: None
+        """
+        user = payload.get("user").get("id")
+        if after:
+            events = self.event_dal.list_events(
+                limit=EVENT_LIST_LIMIT, after=after, viewer=user
+            )
+            bodies = None
+        else:
+            events, bodies = self.upcoming_events()
+
+        view_id = payload.get("container").get("view_id")
+        if view_id is not None:
+            self.bolt_client.views_update(
+                view_id=view_id,
+                view=show_events_view(
+                    user, events, bodies, self._next_page(events), first_page=not after
+                ),
+            )
+        elif events:
+            self.respond(
+                print_event_list(
+                    events, user, bodies, self._next_page(events)
+                ).to_dict_respond()
+            )
+        else:
+            self.respond("There are no more upcoming events.")
 
-        return show_events_view(user_id, results)
+    def _next_page(self, events):
+        # A full page may be followed by more events
+        if len(events) < EVENT_LIST_LIMIT:
+            return None
+        return self.event_dal.page_cursor(events[-1])
+
+    def upcoming_events(self) -> tuple[list[Event], list[list[dict]]]:
+        """
+        Get the upcoming events of the team with their rendered body blocks,
+        only the action blocks are left to render per user.
+        :return: The events and the body blocks of each event
+        """
+        key = self._event_list_key()
+        cached = event_list_cache.get(key)
+        if cached is None:
+            events = self.event_dal.list_events(limit=EVENT_LIST_LIMIT)
+            cached = (events, [print_event_body(event) for event in events])
+            event_list_cache.set(key, cached)
+        return cached
+
+    def events_changed(self):
+        """
+        Called after an event of the team is inserted, joined, left or deleted.
+        Within a request_scope the cached event list is patched with the
+        changes of the interaction, otherwise it is dropped.
+        """
+        identity_map = current_identity_map()
+        changes = identity_map.take_changes() if identity_map is not None else []
+        if not changes or not self._patch_event_list(changes):
+            invalidate_event_list(self.team_id)
+        if self.home_tab is not None and self.bolt_client is not None:
+            self.home_tab.changed(self.team_id, self.bolt_client, self.show_events_view)
+
+    def _event_list_key(self):
+        # The day of the team, the same list_events starts from
+        return (self.team_id, today_in(self.event_dal.timezone))
+
+    def _patch_event_list(self, changes) -> bool:
+        """
+        Apply changes to the cached event list, rendering only the changed events
+        :return: False if the list isn't cached or can't be patched
+        """
+        key = self._event_list_key()
+        cached = event_list_cache.peek(key)
+        if cached is None:
+            return False
+        events, bodies = cached
+        patched = events
+        for change in changes:
+            patched = apply_change(
+                patched,
+                change,
+                EVENT_LIST_LIMIT,
+                lambda event: event.team_id == self.team_id and event.date >= key[1],
+            )
+            if patched is None:
+                return False
+        rendered = {id(event): body for event, body in zip(events, bodies)}
+        bodies = [
+            rendered[id(event)] if id(event) in rendered else print_event_body(event)
+            for event in patched
+        ]
+        return event_list_cache.replace(key, cached, (patched, bodies))
+
+    def viewed_home_tab(self, user_id):
+        """
+        Called when a user opens or uses the home tab, so it is refreshed on changes
+        """
+        if self.home_tab is not None:
+            self.home_tab.seen(self.team_id, user_id)
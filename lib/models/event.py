@@ -1,60 +1,163 @@
+import calendar
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any
+from zoneinfo import ZoneInfo
+
 from lib.models.event_place import EventPlace
+from lib.utils.date_utils import DEFAULT_TIMEZONE, to_starts_at
+
+# Event fields by the keys they are stored under, including the capitalized
+# keys of events created by earlier versions of the app
+DOCUMENT_FIELDS = {
+    "_id": "_id",
+    "team_id": "team_id",
+    "date": "date",
+    "Date": "date",
+    "time": "time",
+    "Time": "time",
+    "location": "location",
+    "Location": "location",
+    "description": "description",
+    "Description": "description",
+    "participants": "participants",
+    "Participants": "participants",
+    "author": "author",
+    "Author": "author",
+    "starts_at": "starts_at",
+    "timezone": "timezone",
+    "participant_count": "participant_count",
+    "joined": "joined",
+}
+
+# The participants listed with an event, the others are paged through
+# with EventMongoDAL.list_participants
+PARTICIPANT_PREVIEW_SIZE = 10
 
 
+@dataclass(slots=True)
 class Event:
     """
     A class to represent an Event in the application.
+
+    :param date: The date of the event.
+    :param time: The time of the event.
+    :param location: The location of the event, kept as a snapshot of the place.
+    :param description: Optional description of the event.
+    :param participants: Optional list of participants.
+    :param author: Optional author of the event.
+    :param starts_at: The start of the event in UTC, derived from date and time if not given.
+    :param timezone: The timezone of the team, defaults to DEFAULT_TIMEZONE.
+    :param participant_count: The number of participants, counted from participants if not given.
+    :param joined: Whether the viewer the event was listed for participates, see EventMongoDAL.list_events.
     """
 
-    def __init__(
-        self,
-        _id,
-        team_id,
-        date,
-        time,
-        location,
-        description=None,
-        participants=None,
-        author=None,
-    ):
-        """
-        Initialize an Event object.
-
-        :param date: The date of the event.
-        :param time: The time of the event.
-        :param location: The location of the event.
-        :param description: Optional description of the event.
-        :param participants: Optional list of participants.
-        :param author: Optional author of the event.
-        """
-        self._id = _id
-        self.team_id = team_id
-        self.date = date
-        self.time = time
-        self.location: EventPlace = location
-        self.participants = participants if participants is not None else []
-        self.author = author
-        self.description = description
+    _id: Any
+    team_id: str
+    date: str
+    time: str | None
+    location: EventPlace | None
+    description: str | None = None
+    participants: list[str] | None = None
+    author: str | None = None
+    starts_at: datetime | None = None
+    timezone: str | None = None
+    participant_count: int | None = None
+    joined: bool | None = None
 
-    def __str__(self) -> str:
+    def __post_init__(self):
+        if self.participants is None:
+            self.participants = []
+        if self.participant_count is None:
+            self.participant_count = len(self.participants)
+        if isinstance(self.location, EventPlace):
+            self.location = self.location.snapshot()
+        elif self.location is not None:
+            self.location = EventPlace.from_document(self.location)
+        self.timezone = self.timezone or DEFAULT_TIMEZONE
+        if self.starts_at is None and self.date:
+            self.starts_at = to_starts_at(self.date, self.time, self.timezone)
+        elif self.starts_at is not None and self.starts_at.tzinfo is None:
+            self.starts_at = self.starts_at.replace(tzinfo=UTC)
+
+    @classmethod
+    def from_document(cls, document: dict) -> "Event":
         """
-        Return a string representation of the Event.
+        Create an Event from a document of the events collection. Unknown
+        fields are ignored, fields left out by a projection are None.
+
+        :param document: The document as returned by MongoDB.
+        :return: An Event object.
         """
-        return f"Event(id={self._id}, date={self.date}, time={self.time}, location={self.location}, description={self.description}, participants={self.participants}, author={self.author})"
+        fields = {
+            DOCUMENT_FIELDS[key]: value
+            for key, value in document.items()
+            if key in DOCUMENT_FIELDS
+        }
+        fields.setdefault("_id", None)
+        fields.setdefault("team_id", None)
+        fields.setdefault("date", None)
+        fields.setdefault("time", None)
+        fields.setdefault("location", None)
+        return cls(**fields)
 
-    def to_dict(self) -> dict:
+    def to_document(self) -> dict:
         """
-        Convert the Event object to a dictionary.
+        Convert the Event to a document for the events collection, the
+        _id is left out until the event has been inserted.
         """
-        return {
+        document = {
+            "team_id": self.team_id,
             "date": self.date,
             "time": self.time,
-            "team_id": self.team_id,
-            "location": self.location,
+            "location": (
+                self.location.to_document() if self.location is not None else None
+            ),
             "description": self.description,
             "participants": self.participants,
             "author": self.author,
+            "starts_at": self.starts_at,
+            "timezone": self.timezone,
+            "participant_count": self.participant_count,
         }
+        if self._id is not None:
+            document["_id"] = self._id
+        return document
+
+    def is_participant(self, user) -> bool:
+        """
+        Whether a user participates in the event. Events listed for a viewer
+        only hold a preview of the participants and answer from joined.
+        """
+        if self.joined is not None:
+            return self.joined
+        return user in self.participants
+
+    def local_start(self) -> datetime:
+        """
+        The start of the event in the timezone of the team
+        """
+        return self.starts_at.astimezone(ZoneInfo(self.timezone))
+
+    def weekday(self) -> str:
+        """
+        The name of the weekday the event is on, in the timezone of the team
+        """
+        return calendar.day_name[self.local_start().weekday()]
+
+    def __str__(self) -> str:
+        """
+        Return a string representation of the Event.
+        """
+        return f"Event(id={self._id}, date={self.date}, time={self.time}, location={self.location}, description={self.description}, participants={self.participants}, author={self.author})"
+
+    def to_dict(self) -> dict:
+        """
+        Convert the Event object to a dictionary.
+        """
+        document = self.to_document()
+        document.pop("_id", None)
+        return document
 
     @classmethod
     def from_dict(cls, data) -> "Event":
@@ -73,4 +176,7 @@ class Event:
             description=data.get("description"),
             participants=data.get("participants"),
             author=data.get("author"),
+            starts_at=data.get("starts_at"),
+            timezone=data.get("timezone"),
+            participant_count=data.get("participant_count"),
         )
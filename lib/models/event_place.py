@@ -3,37 +3,142 @@
 
 from google.maps.places_v1.types import Place
 
+# Bump when the fields of the place snapshot stored on events change
+PLACE_SNAPSHOT_VERSION = 1
+PLACE_SNAPSHOT_FIELDS = (
+    "name",
+    "address",
+    "rating",
+    "types",
+    "place_id",
+    "website_uri",
+    "google_maps_url",
+)
+
 
 class EventPlace:
-    def __init__(self, place: Place):
-        self.gMapsPlace: Place = place
+    """
+    The place of an event. Wraps either a Place from Google Places or the
+    place snapshot stored on an event. Events only hold snapshots, so
+    rendering them never goes through the protobuf accessors of a Place.
+    """
+
+    __slots__ = ("_place", "_document")
+
+    def __init__(self, place: Place = None, document: dict = None):
+        self._place = place
+        self._document = document
+
+    @classmethod
+    def from_document(cls, document) -> "EventPlace":
+        """
+        Wrap a place snapshot as stored on an event, upgrading snapshots of
+        earlier versions
+        """
+        if isinstance(document, str):
+            # Early events only stored the name of the place
+            document = {"name": document}
+        if document.get("version") != PLACE_SNAPSHOT_VERSION:
+            document = {
+                "version": PLACE_SNAPSHOT_VERSION,
+                **{field: document.get(field) for field in PLACE_SNAPSHOT_FIELDS},
+                # Unrated places used to be stored with a rating of 0
+                "rating": document.get("rating") or None,
+            }
+        return cls(document=document)
+
+    def to_document(self) -> dict:
+        """
+        Get the place snapshot to store on an event
+        """
+        if self._document is None:
+            place = self._place
+            self._document = {
+                "version": PLACE_SNAPSHOT_VERSION,
+                "name": place.display_name.text,
+                "address": place.formatted_address,
+                "rating": place.rating if "rating" in place else None,
+                "types": list(place.types),
+                "place_id": place.id,
+                "website_uri": place.website_uri,
+                "google_maps_url": place.google_maps_uri,
+            }
+        return self._document
+
+    def snapshot(self) -> "EventPlace":
+        """
+        Get an EventPlace that only holds the snapshot of the place
+        """
+        if self._place is None:
+            return self
+        return EventPlace(document=self.to_document())
+
+    @property
+    def gMapsPlace(self) -> Place:
+        if self._place is None:
+            document = self._document
+            self._place = Place(
+                id=document.get("place_id"),
+                display_name={"text": document.get("name")},
+                formatted_address=document.get("address"),
+                rating=document.get("rating"),
+                types=document.get("types") or [],
+                website_uri=document.get("website_uri"),
+                google_maps_uri=document.get("google_maps_url"),
+            )
+        return self._place
 
     def name(self):
-        return self.gMapsPlace.display_name.text
+        if self._document is not None:
+            return self._document.get("name")
+        return self._place.display_name.text
 
     def rating(self):
-        if "rating" in self.gMapsPlace:
-            return self.gMapsPlace.rating
+        if self._document is not None:
+            return self._document.get("rating") or "Not rated"
+        if "rating" in self._place:
+            return self._place.rating
         return "Not rated"
 
     def isOpen(self):
-        return True if self.gMapsPlace.current_opening_hours.open_now else False
+        if self._place is None:
+            # Opening hours aren't stored on events
+            return None
+        return True if self._place.current_opening_hours.open_now else False
 
     def opening_hours(self):
-        if self.gMapsPlace.current_opening_hours:
-            return ", ".join(self.gMapsPlace.current_opening_hours.weekday_descriptions)
-        elif self.gMapsPlace.regular_opening_hours:
-            return ", ".join(self.gMapsPlace.regular_opening_hours.weekday_descriptions)
+        if self._place is None:
+            return None
+        if self._place.current_opening_hours:
+            return ", ".join(self._place.current_opening_hours.weekday_descriptions)
+        elif self._place.regular_opening_hours:
+            return ", ".join(self._place.regular_opening_hours.weekday_descriptions)
         return None
 
     def address(self):
-        return self.gMapsPlace.formatted_address
+        if self._document is not None:
+            return self._document.get("address")
+        return self._place.formatted_address
+
+    def types(self) -> list[str]:
+        if self._document is not None:
+            return self._document.get("types") or []
+        return list(self._place.types)
+
+    def place_id(self):
+        if self._document is not None:
+            return self._document.get("place_id")
+        return self._place.id
 
     def url(self):
-        return self.gMapsPlace.website_uri
+        if self._document is not None:
+            return self._document.get("website_uri")
+        return self._place.website_uri
 
     def directions_url(self):
-        return self.gMapsPlace.google_maps_uri
+        if self._document is not None:
+            return self._document.get("google_maps_url")
+        return self._place.google_maps_uri
 
     def format_field(self, title, text):
         return {"title": title, "value": text, "short": 1}
@@ -48,6 +153,9 @@ class EventPlace:
     def image_url(self):
         return self.gMapsPlace.icon_mask_base_uri
 
+    def __repr__(self) -> str:
+        return f"EventPlace({self.name()!r})"
+
     def format_block(self):
         block = [
             {
@@ -70,7 +178,7 @@ class EventPlace:
                     {"type": "mrkdwn", "text": f"*Rating*\n{self.rating()}"},
                     {
                         "type": "mrkdwn",
-                        "text": f"<{self.gMapsPlace.website_uri}|Website>",
+                        "text": f"<{self.url()}|Website>",
                     },
                 ],
             },
@@ -85,7 +193,7 @@ class EventPlace:
                             "text": "Create event",
                             "emoji": True,
                         },
-                        "value": self.gMapsPlace.id,
+                        "value": self.place_id(),
                         "action_id": "create_event_suggest",
                     }
                 ],
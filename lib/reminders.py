@@ -0,0 +1,219 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from lib.api.mongodb import EventBatchMongoDAL, ReminderMongoDAL
+from lib.api.slack import ChannelDirectory
+from lib.utils.date_utils import DEFAULT_TIMEZONE, day_bounds
+from lib.utils.metrics import metrics
+
+LOCK_NAME = "reminders"
+
+
+class ReminderScheduler:
+    """
+    Reminds every installed team of the events of the day, once a day at
+    REMINDER_HOUR in the timezone of the team, the one stored at install that
+    its events are listed in too. A lock in MongoDB makes sure
+    only one app instance runs the reminders at a time, and a marker per team
+    and day that a reminder is never posted twice. A reminder of which nothing
+    could be posted is retried on the next run.
+    """
+
+    def __init__(
+        self,
+        services,
+        reminder_dal=None,
+        event_batch_dal=None,
+        hour=None,
+        default_timezone=None,
+        concurrency=None,
+        lock_seconds=None,
+    ):
+        """
+        Initialize a ReminderScheduler.
+
+        :param services: The ServiceContainer used to build the EventHandler of each team.
+        :param reminder_dal: The ReminderMongoDAL, created if not given.
+        :param event_batch_dal: The EventBatchMongoDAL, created if not given.
+        :param hour: The local hour after which teams are reminded, defaults to REMINDER_HOUR or 9.
+        :param default_timezone: The timezone of teams without one, defaults to REMINDER_TIMEZONE or DEFAULT_TIMEZONE.
+        :param concurrency: How many teams are reminded in parallel, defaults to REMINDER_CONCURRENCY or 8.
+        :param lock_seconds: How long a run may hold the lock, defaults to REMINDER_LOCK_SECONDS or 300.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.services = services
+        self.reminder_dal = reminder_dal or ReminderMongoDAL()
+        self.event_batch_dal = event_batch_dal or EventBatchMongoDAL()
+        self.hour = hour if hour is not None else int(os.getenv("REMINDER_HOUR", 9))
+        self.default_timezone = default_timezone or os.getenv(
+            "REMINDER_TIMEZONE", DEFAULT_TIMEZONE
+        )
+        self.concurrency = concurrency or int(os.getenv("REMINDER_CONCURRENCY", 8))
+        self.lock_seconds = lock_seconds or int(os.getenv("REMINDER_LOCK_SECONDS", 300))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def due(self, bots, now) -> dict[str, str]:
+        """
+        Get the teams for which it is past the reminder hour
+        :param bots: The bot installations from ReminderMongoDAL.bots
+        :param now: The current time, timezone aware
+        :return: A dictionary of team id to the date of the events to remind of
+        """
+        dates = {}
+        for bot in bots:
+            local = now.astimezone(ZoneInfo(self.team_timezone(bot)))
+            if local.hour >= self.hour:
+                # The day is that of the event list of the team, see event_timezone
+                event_timezone = ZoneInfo(self.event_timezone(bot["team_id"]))
+                dates[bot["team_id"]] = now.astimezone(event_timezone).strftime(
+                    "%Y-%m-%d"
+                )
+        return dates
+
+    def event_timezone(self, team_id) -> str:
+        """
+        Get the timezone the events of a team are stored and listed in
+        """
+        return self.services.event_dal(team_id).timezone
+
+    def team_timezone(self, bot) -> str:
+        """
+        Get the timezone of a team, the default one if it isn't set or unknown
+        """
+        try:
+            return str(ZoneInfo(bot.get("timezone") or self.default_timezone))
+        except (KeyError, ValueError):
+            self.logger.warning(f"Unknown timezone for team {bot['team_id']}")
+            return self.default_timezone
+
+    def run_once(self, now=None, dry_run=False) -> dict[str, int]:
+        """
+        Remind the teams that are due and haven't been reminded today
+        :param now: The current time, defaults to now
+        :param dry_run: Only report what would be posted
+        :return: A dictionary of team id to the number of events reminded of
+        """
+        now = now or datetime.now(timezone.utc)
+        if not dry_run and not self.reminder_dal.acquire_lock(
+            LOCK_NAME, self.owner, self.lock_seconds
+        ):
+            self.logger.info("Reminders are run by another instance")
+            return {}
+
+        try:
+            bots = {bot["team_id"]: bot for bot in self.reminder_dal.bots()}
+            dates = self.due(bots.values(), now)
+            for team_id in self.reminder_dal.sent(dates):
+                del dates[team_id]
+            events = self.todays_events(dates)
+            if dry_run:
+                return {team_id: len(events.get(team_id, [])) for team_id in dates}
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                reminded = pool.map(
+                    lambda team_id: self._remind_team(
+                        bots[team_id], dates[team_id], events.get(team_id, [])
+                    ),
+                    dates,
+                )
+                return {
+                    team_id: count
+                    for team_id, count in zip(dates, reminded)
+                    if count is not None
+                }
+        finally:
+            if not dry_run:
+                self.reminder_dal.release_lock(LOCK_NAME, self.owner)
+
+    def todays_events(self, dates) -> dict[str, list]:
+        """
+        Get the events of the due teams in one query
+        :param dates: A dictionary of team id to the date of the events to remind of
+        :return: A dictionary of team id to the events of the team on its date
+        """
+        if not dates:
+            return {}
+        # Teams in different timezones start and end their day at different moments
+        days = {
+            team_id: day_bounds(date, self.event_timezone(team_id))
+            for team_id, date in dates.items()
+        }
+        events = self.event_batch_dal.events_between(
+            min(start for start, _ in days.values()),
+            max(end for _, end in days.values()),
+            teams=dates,
+        )
+        return {
+            team_id: [
+                event
+                for event in team_events
+                if days[team_id][0] <= event.starts_at < days[team_id][1]
+            ]
+            for team_id, team_events in events
+        }
+
+    def _remind_team(self, bot, date, events) -> int | None:
+        team_id = bot["team_id"]
+        if not self.reminder_dal.mark_sent(team_id, date):
+            return None
+        if not events:
+            return 0
+        posted = 0
+        try:
+            client = self.services.web_client(team_id, bot["bot_token"])
+            # The channel is looked up with the bot token of the team
+            channel_name = os.getenv("SLACK_CHANNEL_NAME")
+            channel_id = ChannelDirectory(client, team_id).get_channel_id(channel_name)
+            if channel_id is None:
+                raise LookupError(f"Channel {channel_name} not found")
+            event_handler = self.services.event_handler(
+                team_id, bolt_client=client, say_func=client.chat_postMessage
+            )
+            for event in events:
+                event_handler.todays_event([event], channel_id=channel_id)
+                posted += 1
+        except Exception:
+            self.logger.exception(f"Failed to remind team {team_id}")
+            metrics.inc("reminders_failed_total")
+            # Retried on the next run if nothing was posted, events that were
+            # posted aren't posted again
+            if posted == 0:
+                self.reminder_dal.unmark_sent(team_id, date)
+        metrics.inc("reminders_sent_total", posted)
+        return posted
+
+    def run_forever(self, interval=60, stop=None):
+        """
+        Check for due teams every interval seconds until stop is set
+        :param interval: The number of seconds between checks
+        :param stop: Optional threading.Event to stop the loop
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                reminded = self.run_once()
+                if reminded:
+                    self.logger.info(f"Reminded teams: {reminded}")
+            except Exception:
+                self.logger.exception("Reminder run failed")
+            stop.wait(interval)
+
+    def start_in_background(self, interval=60) -> threading.Event:
+        """
+        Run the scheduler on a daemon thread
+        :return: An event that stops the scheduler when set
+        """
+        stop = threading.Event()
+        threading.Thread(
+            target=self.run_forever,
+            args=(interval, stop),
+            name="reminders",
+            daemon=True,
+        ).start()
+        return stop
@@ -0,0 +1,174 @@
+import threading
+from zoneinfo import ZoneInfo
+
+from lib.api.google_places import GooglePlaces, PlaceDetailsCache
+from lib.api.slack import AsyncRateLimitedWebClient, RateLimitedWebClient, Slack
+from lib.api.storage import EventStore, Storage, get_storage
+from lib.event_handler import EventHandler
+from lib.utils.date_utils import DEFAULT_TIMEZONE
+from lib.utils.home_tab import HomeTabPublisher
+
+
+class ServiceContainer:
+    """
+    Holds the long-lived dependencies of the app so they are built once per
+    process and shared between all Slack interactions.
+    """
+
+    def __init__(self, google_places=None, home_tab=None, storage=None):
+        self._lock = threading.Lock()
+        self._google_places = google_places
+        self.home_tab = home_tab if home_tab is not None else HomeTabPublisher()
+        self.storage: Storage = storage if storage is not None else get_storage()
+        self._slack = {}
+        self._event_dals = {}
+        self._web_clients = {}
+        self._async_web_clients = {}
+
+    @property
+    def google_places(self) -> GooglePlaces:
+        """
+        The shared Google Places client, created on first use. Place details are
+        persisted to the storage, if it keeps them.
+        """
+        if self._google_places is None:
+            with self._lock:
+                if self._google_places is None:
+                    place_dal = self.storage.place_dal()
+                    self._google_places = GooglePlaces(
+                        details_cache=PlaceDetailsCache(
+                            place_dal=place_dal, persist=place_dal is not None
+                        )
+                    )
+        return self._google_places
+
+    def slack(self, team_id) -> Slack:
+        """
+        Get the Slack wrapper for a team, authenticated with the bot token of the team.
+        :param team_id: The id of the team
+        :return: The Slack wrapper for the team
+        """
+        return self._get_or_create(
+            self._slack,
+            team_id,
+            lambda team_id: Slack(
+                team_id,
+                oauth_dal=self.storage.oauth_dal(),
+                client_factory=self.web_client,
+            ),
+        )
+
+    def web_client(self, team_id, token) -> RateLimitedWebClient:
+        """
+        Get the Slack client of a team, shared by all its requests.
+        :param team_id: The id of the team
+        :param token: The bot token of the team, a new client is built when it changed
+        :return: The client of the team
+        """
+        return self._client(self._web_clients, team_id, token, RateLimitedWebClient)
+
+    def async_web_client(self, team_id, token) -> AsyncRateLimitedWebClient:
+        """
+        Get the async Slack client of a team, shared by all its requests.
+        :param team_id: The id of the team
+        :param token: The bot token of the team, a new client is built when it changed
+        :return: The async client of the team
+        """
+        return self._client(
+            self._async_web_clients, team_id, token, AsyncRateLimitedWebClient
+        )
+
+    def event_dal(self, team_id) -> EventStore:
+        """
+        Get the event DAL for a team from the configured storage, in the timezone of the team.
+        :param team_id: The id of the team
+        :return: The event DAL for the team
+        """
+        return self._get_or_create(
+            self._event_dals,
+            team_id,
+            lambda team_id: self.storage.event_dal(
+                team_id, self.team_timezone(team_id)
+            ),
+        )
+
+    def team_timezone(self, team_id) -> str:
+        """
+        Get the timezone stored with the installation of a team.
+        :param team_id: The id of the team
+        :return: The timezone of the team, DEFAULT_TIMEZONE if it isn't set or unknown
+        """
+        workspace = self.storage.oauth_dal().get_workspace(team_id)
+        timezone = workspace.get("timezone") if workspace is not None else None
+        try:
+            return str(ZoneInfo(timezone or DEFAULT_TIMEZONE))
+        except (KeyError, ValueError):
+            return DEFAULT_TIMEZONE
+
+    def event_handler(
+        self,
+        team_id,
+        bolt_client=None,
+        say_func=None,
+        respond_func=None,
+        current_view=None,
+    ) -> EventHandler:
+        """
+        Build a team scoped EventHandler on top of the shared dependencies.
+        :param team_id: The id of the team
+        :param bolt_client: The Bolt client of the current request
+        :param say_func: The Bolt say function of the current request
+        :param respond_func: The Bolt respond function of the current request
+        :param current_view: The id of the current view, if any
+        :return: An EventHandler for the team
+        """
+        return EventHandler(
+            team_id,
+            bolt_client=bolt_client,
+            say_func=say_func,
+            respond_func=respond_func,
+            current_view=current_view,
+            event_dal=self.event_dal(team_id),
+            slack=self.slack(team_id),
+            google_places=self.google_places,
+            home_tab=self.home_tab,
+        )
+
+    def refresh_home_tabs(self, message):
+        """
+        Refresh the home tabs this process keeps up to date after the events
+        of a team were changed, possibly by another instance. Subscribed to
+        the invalidation bus for the events collection.
+        :param message: The invalidation message of the change
+        """
+        team_id = message["team_id"]
+        if team_id is None or not self.home_tab.viewers(team_id):
+            return
+        workspace = self.storage.oauth_dal().get_workspace(
+            team_id, message["enterprise_id"]
+        )
+        if workspace is None:
+            return
+        client = self.web_client(team_id, workspace["bot_token"])
+        event_handler = self.event_handler(team_id, client)
+        self.home_tab.changed(team_id, client, event_handler.show_events_view)
+
+    def _client(self, registry, team_id, token, factory):
+        client = registry.get(team_id)
+        if client is None or client.token != token:
+            with self._lock:
+                client = registry.get(team_id)
+                if client is None or client.token != token:
+                    client = factory(token=token, team_id=team_id)
+                    registry[team_id] = client
+        return client
+
+    def _get_or_create(self, registry, team_id, factory):
+        instance = registry.get(team_id)
+        if instance is None:
+            with self._lock:
+                instance = registry.get(team_id)
+                if instance is None:
+                    instance = factory(team_id)
+                    registry[team_id] = instance
+        return instance
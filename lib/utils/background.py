@@ -0,0 +1,114 @@
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+
+from lib.utils.metrics import metrics
+
+
+class BackgroundExecutor:
+    """
+    Runs the work that follows an ack() on a bounded queue served by worker
+    threads, so Slack gets its acknowledgement right away. When the queue is
+    full the work runs on the calling thread instead of being dropped.
+    """
+
+    def __init__(self, workers=None, queue_size=None, inline=None):
+        """
+        Initialize a BackgroundExecutor.
+
+        :param workers: The number of worker threads, defaults to BACKGROUND_WORKERS or 4.
+        :param queue_size: The maximum number of queued tasks, defaults to BACKGROUND_QUEUE_SIZE or 100.
+        :param inline: Run all work on the calling thread, defaults to BACKGROUND_MODE=inline.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.workers = workers or int(os.getenv("BACKGROUND_WORKERS", 4))
+        self.queue = queue.Queue(
+            maxsize=queue_size or int(os.getenv("BACKGROUND_QUEUE_SIZE", 100))
+        )
+        self.inline = (
+            os.getenv("BACKGROUND_MODE") == "inline" if inline is None else inline
+        )
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._accepting = True
+        metrics.register_gauge("background_queue_depth", self.queue.qsize)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) in the background.
+        The context variables of the caller are passed on to the task.
+        """
+        if self.inline or not self._accepting:
+            self._run(contextvars.copy_context(), func, args, kwargs, time.monotonic())
+            return
+
+        self._start()
+        item = (contextvars.copy_context(), func, args, kwargs, time.monotonic())
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.logger.warning("Background queue is full, running task inline")
+            metrics.inc("background_tasks_rejected_total")
+            self._run(*item)
+
+    def shutdown(self, timeout=None):
+        """
+        Stop accepting new work and wait for the queued work to finish.
+        :param timeout: The maximum number of seconds to wait per worker
+        """
+        with self._lock:
+            self._accepting = False
+            threads = self._threads if self._pid == os.getpid() else []
+            for _ in threads:
+                self.queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+        self.logger.info("Background executor drained")
+
+    def _start(self):
+        # Workers are started lazily, and again after a fork, since threads
+        # don't survive into the forked gunicorn workers
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._threads = [
+                threading.Thread(target=self._work, name=f"background-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self._run(*item)
+            finally:
+                self.queue.task_done()
+
+    def _run(self, context, func, args, kwargs, queued_at):
+        started_at = time.monotonic()
+        metrics.inc("background_task_wait_seconds_sum", started_at - queued_at)
+        metrics.inc("background_task_wait_seconds_count")
+        try:
+            context.run(func, *args, **kwargs)
+            metrics.inc("background_tasks_completed_total")
+        except Exception:
+            self.logger.exception(
+                f"Background task {getattr(func, '__name__', func)} failed"
+            )
+            metrics.inc("background_tasks_failed_total")
+        finally:
+            metrics.inc(
+                "background_task_duration_seconds_sum", time.monotonic() - started_at
+            )
+            metrics.inc("background_task_duration_seconds_count")
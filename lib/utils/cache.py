@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
+from lib.utils.metrics import metrics
+
+
+class TTLCache:
+    """
+    A thread-safe LRU cache where every entry expires after a time to live.
+    Hits, misses and evictions are counted on the instance and, when the cache
+    is named, exported to the metrics registry.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, name=None, timer=time.monotonic):
+        """
+        Initialize a TTLCache.
+
+        :param maxsize: The maximum number of entries before the least recently used is evicted.
+        :param ttl: The default time to live of an entry in seconds.
+        :param name: Optional name used as label for the exported metrics.
+        :param timer: The clock used to expire entries.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get a value from the cache.
+
+        :param key: The key to look up.
+        :param default: The value returned when the key is missing or expired.
+        :return: The cached value or the default.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self.timer():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self._record("cache_hits_total")
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            self._record("cache_misses_total")
+            return default
+
+    def peek(self, key, default=None):
+        """
+        Get a value from the cache without counting a hit or miss or
+        refreshing its position in the LRU order.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self.timer():
+                return entry[0]
+            return default
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value in the cache.
+
+        :param key: The key to store the value under.
+        :param value: The value to store.
+        :param ttl: Optional time to live overriding the default.
+        """
+        expires_at = self.timer() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+                self._record("cache_evictions_total")
+
+    def replace(self, key, old, new) -> bool:
+        """
+        Replace the value of an entry if it is still the given one, keeping
+        its expiry, so a concurrent invalidation or refresh is never overwritten.
+
+        :param key: The key of the entry.
+        :param old: The value the new one was derived from.
+        :param new: The value to store instead.
+        :return: True if the value was replaced.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not old or entry[1] <= self.timer():
+                return False
+            self._entries[key] = (new, entry[1])
+            return True
+
+    def invalidate(self, key):
+        """
+        Remove a key from the cache.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """
+        Remove all entries for which predicate(key, value) is true.
+        """
+        with self._lock:
+            for key in [k for k, v in self._entries.items() if predicate(k, v[0])]:
+                del self._entries[key]
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] > self.timer()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _record(self, metric):
+        if self.name:
+            metrics.inc(metric, cache=self.name)
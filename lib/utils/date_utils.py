@@ -1,9 +1,14 @@
 import calendar
+import os
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 
 import parsedatetime as pdt
 
+# The timezone of teams that haven't got one
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Europe/Stockholm")
+
 
 def is_day_formatted_as_date(day: str) -> bool:
     try:
@@ -38,3 +43,37 @@ def get_date(date: str) -> str:
     if datetime.today() >= natural_date:
         return None
     return natural_date.strftime("%Y-%m-%d")
+
+
+def to_starts_at(date: str, time_of_day: str | None, tz: str) -> datetime:
+    """
+    Convert a local date and time of a team to a UTC datetime
+    :param date: The date as %Y-%m-%d
+    :param time_of_day: The time as %H:%M, midnight if not given
+    :param tz: The timezone of the team
+    :return: The moment in UTC
+    """
+    local = datetime.strptime(f"{date} {time_of_day or '00:00'}", "%Y-%m-%d %H:%M")
+    return local.replace(tzinfo=ZoneInfo(tz)).astimezone(timezone.utc)
+
+
+def today_in(tz: str) -> str:
+    """
+    Get the current date of a team, the day its event list and reminders are for
+    :param tz: The timezone of the team
+    :return: The date as %Y-%m-%d
+    """
+    return datetime.now(ZoneInfo(tz)).strftime("%Y-%m-%d")
+
+
+def day_bounds(date: str, tz: str) -> tuple[datetime, datetime]:
+    """
+    Get the start of a local day and of the day after, in UTC
+    :param date: The date as %Y-%m-%d
+    :param tz: The timezone of the team
+    :return: The start and the exclusive end of the day
+    """
+    start = datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=ZoneInfo(tz))
+    return start.astimezone(timezone.utc), (start + timedelta(days=1)).astimezone(
+        timezone.utc
+    )
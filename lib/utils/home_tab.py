@@ -0,0 +1,181 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from slack_sdk.errors import SlackApiError
+
+from lib.utils.metrics import metrics
+
+
+class HomeTabPublisher:
+    """
+    Keeps the home tabs of the recent viewers of a team up to date. Changes to
+    the events of a team within a short window are coalesced into a single
+    views_publish per viewer, paced per team to stay within the rate limit of
+    views.publish. The publishing runs on one background thread.
+    """
+
+    def __init__(
+        self,
+        window=None,
+        viewer_ttl=None,
+        max_viewers=None,
+        rate_per_minute=None,
+        timer=time.monotonic,
+    ):
+        """
+        Initialize a HomeTabPublisher.
+
+        :param window: Seconds to wait for more changes before publishing, defaults to HOME_FANOUT_WINDOW_SECONDS or 2.
+        :param viewer_ttl: Seconds a user counts as a viewer after opening the home tab, defaults to HOME_VIEWER_TTL_SECONDS or 3600.
+        :param max_viewers: The maximum number of viewers tracked per team, defaults to HOME_MAX_VIEWERS or 500.
+        :param rate_per_minute: The maximum number of publishes per team and minute, defaults to HOME_FANOUT_RATE_PER_MINUTE or 100.
+        :param timer: The clock used for the window and the pacing.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.window = (
+            window
+            if window is not None
+            else float(os.getenv("HOME_FANOUT_WINDOW_SECONDS", 2))
+        )
+        self.viewer_ttl = viewer_ttl or int(os.getenv("HOME_VIEWER_TTL_SECONDS", 3600))
+        self.max_viewers = max_viewers or int(os.getenv("HOME_MAX_VIEWERS", 500))
+        self.interval = 60 / (
+            rate_per_minute or int(os.getenv("HOME_FANOUT_RATE_PER_MINUTE", 100))
+        )
+        self.timer = timer
+        self._viewers = {}
+        # Teams with changes waiting for their window to pass
+        self._pending = {}
+        # Fan-outs in progress as (ready_at, seq, team_id, client, render, users)
+        self._active = []
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._pid = None
+        metrics.register_gauge("home_tab_viewers", self.viewer_count)
+
+    def seen(self, team_id, user_id):
+        """
+        Record that a user has the home tab of a team open.
+        """
+        if not team_id or not user_id:
+            return
+        with self._condition:
+            viewers = self._viewers.setdefault(team_id, OrderedDict())
+            viewers[user_id] = self.timer()
+            viewers.move_to_end(user_id)
+            while len(viewers) > self.max_viewers:
+                viewers.popitem(last=False)
+
+    def viewers(self, team_id) -> list[str]:
+        """
+        Get the users that opened the home tab of a team recently.
+        """
+        cutoff = self.timer() - self.viewer_ttl
+        with self._condition:
+            viewers = self._viewers.get(team_id, OrderedDict())
+            while viewers and next(iter(viewers.values())) < cutoff:
+                viewers.popitem(last=False)
+            return list(viewers)
+
+    def viewer_count(self) -> int:
+        return sum(len(viewers) for viewers in self._viewers.values())
+
+    def changed(self, team_id, client, render):
+        """
+        Schedule a refresh of the home tabs of a team after its events changed.
+        :param team_id: The id of the team
+        :param client: A WebClient with the bot token of the team
+        :param render: A function returning the home tab view of a user id
+        """
+        with self._condition:
+            due = self._pending.get(team_id, (self.timer() + self.window,))[0]
+            self._pending[team_id] = (due, client, render)
+            self._condition.notify()
+        self._start()
+
+    def flush(self):
+        """
+        Publish all pending and in progress fan-outs right away, on the calling thread.
+        """
+        with self._condition:
+            pending, self._pending = self._pending, {}
+            active, self._active = self._active, []
+        for team_id, (_, client, render) in pending.items():
+            active.append((0, 0, team_id, client, render, deque(self.viewers(team_id))))
+        for _, _, team_id, client, render, users in active:
+            for user_id in users:
+                self._publish(team_id, client, render, user_id)
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._condition:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._work, name="home-tab", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                now = self.timer()
+                for team_id, (due, client, render) in list(self._pending.items()):
+                    if due <= now:
+                        del self._pending[team_id]
+                        users = deque(self.viewers(team_id))
+                        running = next(
+                            (entry for entry in self._active if entry[2] == team_id),
+                            None,
+                        )
+                        if running is not None:
+                            # Keep one paced fan-out per team, the users still
+                            # queued will get the latest view anyway
+                            running[5].extend(u for u in users if u not in running[5])
+                        elif users:
+                            heapq.heappush(
+                                self._active,
+                                (now, next(self._seq), team_id, client, render, users),
+                            )
+                if not self._active or self._active[0][0] > now:
+                    deadlines = [due for due, _, _ in self._pending.values()]
+                    if self._active:
+                        deadlines.append(self._active[0][0])
+                    self._condition.wait(min(deadlines) - now if deadlines else None)
+                    continue
+                _, _, team_id, client, render, users = heapq.heappop(self._active)
+
+            user_id = users.popleft()
+            retry_after = self._publish(team_id, client, render, user_id)
+            if retry_after:
+                users.appendleft(user_id)
+            if users:
+                with self._condition:
+                    ready_at = self.timer() + (retry_after or self.interval)
+                    heapq.heappush(
+                        self._active,
+                        (ready_at, next(self._seq), team_id, client, render, users),
+                    )
+
+    def _publish(self, team_id, client, render, user_id) -> float | None:
+        """
+        Publish the home tab of one user
+        :return: The seconds to wait before retrying if Slack rate limited the call
+        """
+        try:
+            client.views_publish(user_id=user_id, view=render(user_id))
+            metrics.inc("home_tab_publishes_total")
+        except SlackApiError as e:
+            if e.response.status_code == 429:
+                metrics.inc("home_tab_publishes_rate_limited_total")
+                return float(e.response.headers.get("Retry-After", 1))
+            self.logger.error(f"Failed to publish home tab of {user_id}: {e}")
+            metrics.inc("home_tab_publish_failures_total")
+        except Exception:
+            self.logger.exception(f"Failed to publish home tab of {user_id}")
+            metrics.inc("home_tab_publish_failures_total")
+        return None
@@ -0,0 +1,72 @@
+import logging
+import threading
+from collections import defaultdict
+
+from lib.utils.metrics import metrics
+
+
+class InvalidationBus:
+    """
+    Delivers messages about changed documents to the in-process caches
+    holding them. A message is a dictionary with the collection, the
+    operation and the team_id and enterprise_id of the changed document,
+    which are None when unknown. A message without a collection asks every
+    subscriber to drop everything it holds.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._subscribers = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, collections, callback):
+        """
+        Call callback(message) for every change of the given collections
+        """
+        with self._lock:
+            for collection in collections:
+                self._subscribers[collection].append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            for callbacks in self._subscribers.values():
+                if callback in callbacks:
+                    callbacks.remove(callback)
+
+    def publish(self, message):
+        """
+        Deliver a message to the subscribers of its collection, a failing
+        subscriber doesn't keep the message from the others
+        """
+        collection = message.get("collection")
+        with self._lock:
+            if collection is None:
+                callbacks = {
+                    callback: None
+                    for callbacks in self._subscribers.values()
+                    for callback in callbacks
+                }
+            else:
+                callbacks = dict.fromkeys(self._subscribers.get(collection, []))
+        metrics.inc("cache_invalidations_total", collection=collection or "all")
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception:
+                self.logger.exception(f"Invalidation subscriber failed on {message}")
+
+    def invalidate_all(self):
+        """
+        Ask every subscriber to drop everything, e.g. when changes may have been missed
+        """
+        self.publish(
+            {
+                "collection": None,
+                "operation": "invalidate",
+                "team_id": None,
+                "enterprise_id": None,
+            }
+        )
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,106 @@
+import threading
+
+
+class Metrics:
+    """
+    A small in-process registry of counters and gauges that can be rendered
+    in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._types = {}
+        self._callbacks = {}
+
+    @staticmethod
+    def _key(name, labels) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increment a counter by the given value.
+
+        :param name: The metric name.
+        :param value: The amount to add.
+        :param labels: Optional labels for the metric.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._types.setdefault(name, "counter")
+            self._values[key] = self._values.get(key, 0) + value
+
+    def add(self, name, value, **labels):
+        """
+        Add the given (possibly negative) value to a gauge.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._types[name] = "gauge"
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        Set a gauge to the given value.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._types[name] = "gauge"
+            self._values[key] = value
+
+    def register_gauge(self, name, callback):
+        """
+        Register a gauge whose value is read from a callback at render time.
+
+        :param name: The metric name.
+        :param callback: A callable returning the current value.
+        """
+        with self._lock:
+            self._types[name] = "gauge"
+            self._callbacks[name] = callback
+
+    def get(self, name, **labels):
+        """
+        Get the current value of a metric, 0 if it was never recorded.
+        """
+        with self._lock:
+            if name in self._callbacks and not labels:
+                return self._callbacks[name]()
+            return self._values.get(self._key(name, labels), 0)
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            values = dict(self._values)
+            types = dict(self._types)
+            callbacks = dict(self._callbacks)
+
+        for name, callback in callbacks.items():
+            values[(name, ())] = callback()
+
+        lines = []
+        for name in sorted(types):
+            lines.append(f"# TYPE {name} {types[name]}")
+            for (metric, labels), value in sorted(values.items()):
+                if metric != name:
+                    continue
+                if labels:
+                    label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"{name}{{{label_text}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """
+        Remove all recorded values, mainly useful in tests.
+        """
+        with self._lock:
+            self._values.clear()
+            self._types.clear()
+            self._callbacks.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,59 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket. Callers reserve a token and sleep until it is
+    available, so waiting callers are served in the order they arrived.
+    """
+
+    def __init__(self, rate, capacity=None, timer=time.monotonic, sleep=time.sleep):
+        """
+        Initialize a TokenBucket.
+
+        :param rate: The number of tokens added per second.
+        :param capacity: The maximum number of tokens, i.e. the allowed burst, defaults to one second of tokens.
+        :param timer: The clock used to refill the bucket.
+        :param sleep: The function used to wait for a token.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.timer = timer
+        self.sleep = sleep
+        self.tokens = self.capacity
+        self.paused_until = 0
+        self._updated_at = timer()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take a token, waiting until one is available.
+        :return: The number of seconds waited
+        """
+        wait = self.reserve()
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def reserve(self) -> float:
+        """
+        Take a token without waiting for it, for callers that wait on their own,
+        e.g. with asyncio.sleep.
+        :return: The number of seconds to wait before the token may be used
+        """
+        with self._lock:
+            now = self.timer()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self.tokens -= 1
+            return max(self.paused_until - now, -self.tokens / self.rate, 0)
+
+    def pause(self, seconds):
+        """
+        Hold back all callers for the given number of seconds, e.g. after a Retry-After.
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, self.timer() + seconds)
@@ -1,104 +1,243 @@
-import calendar
-from datetime import datetime
-
 from lib.api.google_places import GooglePlaces
-from lib.models.event import Event
+from lib.models.event import PARTICIPANT_PREVIEW_SIZE, Event
 from lib.models.slack_message import SlackMessage
-from lib.utils.date_utils import parse_date_to_weekday
 
 
-def print_event_list(events: list[Event], user) -> SlackMessage:
-    event_list = SlackMessage(text="Upcoming events", blocks=[])
+def print_event_body(event: Event) -> list[dict]:
+    """
+    Render the blocks of an event that look the same for every user
+    :param event: The event to render
+    :return: The header, details and participants blocks of the event
+    """
+    place = event.location
+    body = SlackMessage(text=None, blocks=[])
+
+    # Header block for the event
+    body.add_block(
+        {
+            "type": "header",
+            "text": {
+                "type": "plain_text",
+                "text": f"Event on {event.weekday()}",
+                "emoji": True,
+            },
+        }
+    )
+
+    # Fields block for additional details
+    body.add_section_block(
+        text=f"*{place.name()}*",
+        fields=[
+            f"*Rating:*\n{place.rating()}",
+            f"*Address:*\n{place.address()}",
+            f"*Directions:*\n<{place.directions_url()}|Google Maps>",
+            f"*Place types:*\n{', '.join(place.types())}",
+        ],
+    )
+
+    # Participants block, large events only list the first participants
+    if event.participant_count:
+        shown = event.participants[:PARTICIPANT_PREVIEW_SIZE]
+        participants_text = "\n".join([f"<@{participant}>" for participant in shown])
+        if event.participant_count > len(shown):
+            participants_text += f"\n_and {event.participant_count - len(shown)} more_"
+        body.add_section_block(text=f"*Participants:*\n{participants_text}")
+    else:
+        body.add_section_block(
+            text="*Participants:*\nNo one is participating in this event, *yet...*"
+        )
+
+    return body.blocks
 
-    for event in events:
-        place = event.location
-        event_id = str(event._id)
-        weekday = datetime.strptime(event.date, "%Y-%m-%d").weekday()
 
-        # Header block for the event
-        event_list.add_block(
+def print_event_actions(event: Event, user) -> list[dict]:
+    """
+    Render the buttons of an event for a user
+    :param event: The event to render
+    :param user: The id of the user the buttons are for
+    :return: The join, leave and delete buttons available to the user
+    """
+    event_id = str(event._id)
+    joined = event.is_participant(user)
+    actions = []
+    if event.participant_count and not joined:
+        actions.append(
             {
-                "type": "header",
+                "type": "button",
+                "action_id": "join_event",
                 "text": {
                     "type": "plain_text",
-                    "text": f"Event on {calendar.day_name[weekday]}",
+                    "text": "Join event",
                     "emoji": True,
                 },
+                "style": "primary",
+                "value": event_id,
             }
         )
 
-        # Fields block for additional details
-        event_list.add_section_block(
-            text=f"*{event.location.name()}*",
-            fields=[
-                f"*Rating:*\n{place.rating}",
-                f"*Address:*\n{place.address}",
-                f"*Directions:*\n<{place.gMapsPlace.google_maps_uri}|Google Maps>",
-                f"*Place types:*\n{', '.join(place.gMapsPlace.types)}",
-            ],
+    if event.participant_count and joined:
+        actions.append(
+            {
+                "type": "button",
+                "action_id": "leave_event",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Leave event",
+                    "emoji": True,
+                },
+                "value": event_id,
+            }
         )
 
-        # Participants block
-        if event.participants:
-            participants_text = "\n".join(
-                [f"<@{participant}>" for participant in event.participants]
-            )
-            event_list.add_section_block(text=f"*Participants:*\n{participants_text}")
-        else:
-            event_list.add_section_block(
-                text="*Participants:*\nNo one is participating in this event, *yet...*"
-            )
-
-        # Actions block for buttons
-        actions = []
-        if event.participants and user not in event.participants:
-            actions.append(
-                {
-                    "type": "button",
-                    "action_id": "join_event",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "Join event",
-                        "emoji": True,
-                    },
-                    "style": "primary",
-                    "value": event_id,
-                }
-            )
+    if event.participant_count > PARTICIPANT_PREVIEW_SIZE:
+        actions.append(
+            {
+                "type": "button",
+                "action_id": "show_participants",
+                "text": {
+                    "type": "plain_text",
+                    "text": "All participants",
+                    "emoji": True,
+                },
+                "value": f"{event_id}|0",
+            }
+        )
 
-        if event.participants and user in event.participants:
-            actions.append(
+    if user == event.author:
+        actions.append(
+            {
+                "type": "button",
+                "action_id": "delete_event",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Delete event",
+                    "emoji": True,
+                },
+                "style": "danger",
+                "value": event_id,
+            }
+        )
+
+    return actions
+
+
+def print_event_list(
+    events: list[Event], user, bodies=None, after=None
+) -> SlackMessage:
+    """
+    Render a list of events for a user
+    :param events: The events to render
+    :param user: The id of the user the list is for
+    :param bodies: Optional blocks from print_event_body for each event, rendered if not given
+    :param after: The cursor of the last event if more follow, adds a More events button
+    :return: The event list message
+    """
+    event_list = SlackMessage(text="Upcoming events", blocks=[])
+    if bodies is None:
+        bodies = [print_event_body(event) for event in events]
+
+    for event, body in zip(events, bodies):
+        event_list.blocks.extend(body)
+        event_list.add_action_block(print_event_actions(event, user))
+        event_list.add_divider_block()
+
+    if after is not None:
+        event_list.add_action_block(
+            [
                 {
                     "type": "button",
-                    "action_id": "leave_event",
+                    "action_id": "more_events",
                     "text": {
                         "type": "plain_text",
-                        "text": "Leave event",
+                        "text": "More events",
                         "emoji": True,
                     },
-                    "value": event_id,
+                    "value": after,
                 }
-            )
+            ]
+        )
 
-        if user == event.author:
-            actions.append(
+    return event_list
+
+
+def build_participants_loading_view() -> dict:
+    """
+    Build the participants modal shown while the participants are looked up
+    :return: A dictionary representing the Slack modal
+    """
+    return {
+        "type": "modal",
+        "callback_id": "participants_view",
+        "title": {"type": "plain_text", "text": "Participants"},
+        "close": {"type": "plain_text", "text": "Close"},
+        "blocks": [
+            {
+                "type": "section",
+                "text": {"type": "mrkdwn", "text": "Loading the participants..."},
+            }
+        ],
+    }
+
+
+def build_participants_view(event_id, participants, count, page, page_size) -> dict:
+    """
+    Build the modal listing a page of the participants of an event
+    :param event_id: The id of the event
+    :param participants: The participants on the page
+    :param count: The number of participants of the event
+    :param page: The number of the page, starting at 0
+    :param page_size: The number of participants on a page
+    :return: A dictionary representing the Slack modal
+    """
+    first = page * page_size
+    text = "\n".join([f"<@{participant}>" for participant in participants])
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": text or "No one is participating in this event, *yet...*",
+            },
+        },
+        {
+            "type": "context",
+            "elements": [
                 {
-                    "type": "button",
-                    "action_id": "delete_event",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "Delete event",
-                        "emoji": True,
-                    },
-                    "style": "danger",
-                    "value": event_id,
+                    "type": "mrkdwn",
+                    "text": f"{min(first + 1, count)}-{first + len(participants)} of {count} participants",
                 }
-            )
-
-        event_list.add_action_block(actions)
-        event_list.add_divider_block()
+            ],
+        },
+    ]
+    buttons = []
+    if page > 0:
+        buttons.append(
+            {
+                "type": "button",
+                "action_id": "show_participants",
+                "text": {"type": "plain_text", "text": "Previous", "emoji": True},
+                "value": f"{event_id}|{page - 1}",
+            }
+        )
+    if first + len(participants) < count:
+        buttons.append(
+            {
+                "type": "button",
+                "action_id": "show_participants",
+                "text": {"type": "plain_text", "text": "Next", "emoji": True},
+                "value": f"{event_id}|{page + 1}",
+            }
+        )
+    if buttons:
+        blocks.append({"type": "actions", "elements": buttons})
 
-    return event_list
+    return {
+        "type": "modal",
+        "callback_id": "participants_view",
+        "title": {"type": "plain_text", "text": "Participants"},
+        "close": {"type": "plain_text", "text": "Close"},
+        "blocks": blocks,
+    }
 
 
 def print_event_create() -> SlackMessage:
@@ -133,7 +272,9 @@ def print_event_today(event: Event) -> str:
     if event is None:
         return None
     if len(event.participants) > 0:
-        return_message = f"*Reminder * Today there's an event planned! \n*{parse_date_to_weekday(event.date)}*"
+        return_message = (
+            f"*Reminder * Today there's an event planned! \n*{event.weekday()}*"
+        )
         if event.time:
             return_message += f" at *{event.time}*"
         if event.location:
@@ -155,7 +296,7 @@ def print_event_created(event: Event) -> SlackMessage:
 
     # Add header section
     slack_message.add_section_block(
-        text=f"*A new event was created!*\n\n*{event.location.name()}*\n{parse_date_to_weekday(event.date)} {event.date} at {event.time}\nStarted by: <@{event.author}>"
+        text=f"*A new event was created!*\n\n*{event.location.name()}*\n{event.weekday()} {event.date} at {event.time}\nStarted by: <@{event.author}>"
     )
 
     # Add description section
@@ -205,7 +346,7 @@ def print_event_created(event: Event) -> SlackMessage:
     return slack_message
 
 
-def build_create_dialog(value=None):
+def build_create_dialog(value=None, google_places=None):
     place_picker = {
         "type": "input",
         "block_id": "suggest_place",
@@ -285,7 +426,7 @@ def build_create_dialog(value=None):
     }
 
     if value is not None:
-        places = GooglePlaces()
+        places = google_places if google_places is not None else GooglePlaces()
         place = places.get_place_information(value)
         text_block = {
             "type": "section",
@@ -303,11 +444,14 @@ def print_possible_commands() -> str:
     return """Possible commands are:\nlist\ncreate\nsuggest <place>"""
 
 
-def show_events_view(user_id, events):
+def show_events_view(user_id, events, bodies=None, after=None, first_page=True):
     """
     Show the events view in the Slack app home tab.
     :param user_id: The ID of the user to show the events view to.
     :param events: A list of events to display.
+    :param bodies: Optional blocks from print_event_body for each event.
+    :param after: The cursor of the last event if more follow, see print_event_list.
+    :param first_page: False to add a button back to the first page of events.
     :return: A dictionary representing the Slack home tab view.
     """
     base_view = {
@@ -348,7 +492,34 @@ def show_events_view(user_id, events):
     }
 
     # Append the list of events
-    event_blocks = print_event_list(events, user_id).blocks
+    if not first_page and not events:
+        base_view["blocks"].append(
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "There are no more upcoming events.",
+                },
+            }
+        )
+    event_blocks = print_event_list(events, user_id, bodies, after).blocks
     base_view["blocks"] += event_blocks
+    if not first_page:
+        base_view["blocks"].append(
+            {
+                "type": "actions",
+                "elements": [
+                    {
+                        "type": "button",
+                        "action_id": "more_events",
+                        "text": {
+                            "type": "plain_text",
+                            "text": "Back to the first events",
+                            "emoji": True,
+                        },
+                    }
+                ],
+            }
+        )
 
     return base_view
@@ -0,0 +1,18 @@
+import pytest
+
+from lib import event_handler
+from lib.api import google_places, mongodb, slack
+
+
+@pytest.fixture(autouse=True)
+def reset_mongo_client():
+    # The shared client is cached per process, make sure every test gets
+    # a client created from its own (possibly patched) MongoClient
+    mongodb.close_mongo_client()
+    mongodb.workspace_cache.clear()
+    slack.channel_cache.clear()
+    slack._buckets.clear()
+    google_places.suggestion_cache.clear()
+    event_handler.event_list_cache.clear()
+    yield
+    mongodb.close_mongo_client()
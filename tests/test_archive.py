@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from lib.archive import EventArchiver
+
+
+def test_cutoff_respects_retention():
+    archiver = EventArchiver(event_batch_dal=MagicMock(), retention_days=30)
+    now = datetime(2024, 3, 31, 12, tzinfo=timezone.utc)
+    assert archiver.cutoff(now) == datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+
+
+def test_run_once_reports_stats():
+    event_batch_dal = MagicMock()
+    event_batch_dal.archive_before.return_value = {"archived": 3, "batches": 1}
+    archiver = EventArchiver(event_batch_dal=event_batch_dal, retention_days=0)
+
+    stats = archiver.run_once(dry_run=True)
+
+    assert stats["archived"] == 3
+    cutoff = event_batch_dal.archive_before.call_args.args[0]
+    assert stats["cutoff"] == cutoff.isoformat()
+    assert event_batch_dal.archive_before.call_args.kwargs == {"dry_run": True}
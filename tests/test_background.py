@@ -0,0 +1,74 @@
+import contextvars
+import threading
+
+from lib.utils.background import BackgroundExecutor
+from lib.utils.metrics import metrics
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def test_inline_mode_runs_on_calling_thread():
+    executor = BackgroundExecutor(inline=True)
+    threads = []
+    executor.submit(lambda: threads.append(threading.current_thread()))
+    assert threads == [threading.current_thread()]
+
+
+def test_tasks_run_on_worker_threads_and_drain():
+    executor = BackgroundExecutor(workers=2, queue_size=10, inline=False)
+    results = []
+    for i in range(5):
+        executor.submit(results.append, i)
+    executor.shutdown(timeout=2)
+    assert sorted(results) == [0, 1, 2, 3, 4]
+
+
+def test_context_is_passed_to_task():
+    executor = BackgroundExecutor(workers=1, queue_size=10, inline=False)
+    results = []
+    request_id.set("req-1")
+    executor.submit(lambda: results.append(request_id.get()))
+    executor.shutdown(timeout=2)
+    assert results == ["req-1"]
+
+
+def test_failures_are_counted():
+    metrics.reset()
+    executor = BackgroundExecutor(workers=1, queue_size=10, inline=False)
+
+    def fail():
+        raise ValueError("boom")
+
+    executor.submit(fail)
+    executor.shutdown(timeout=2)
+    assert metrics.get("background_tasks_failed_total") == 1
+
+
+def test_full_queue_runs_inline():
+    metrics.reset()
+    executor = BackgroundExecutor(workers=1, queue_size=1, inline=False)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(timeout=2)
+
+    executor.submit(block)
+    started.wait(timeout=2)
+    executor.submit(lambda: None)  # fills the queue
+    results = []
+    executor.submit(results.append, threading.current_thread())
+    release.set()
+    executor.shutdown(timeout=2)
+
+    assert results == [threading.current_thread()]
+    assert metrics.get("background_tasks_rejected_total") == 1
+
+
+def test_work_after_shutdown_runs_inline():
+    executor = BackgroundExecutor(workers=1, queue_size=10, inline=False)
+    executor.shutdown(timeout=2)
+    results = []
+    executor.submit(results.append, 1)
+    assert results == [1]
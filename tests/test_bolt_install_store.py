@@ -13,7 +13,16 @@ def mock_mongo_client():
 
 
 @pytest.fixture
-def installation_store(mock_mongo_client):
+def mock_web_client():
+    with patch("lib.bolt.MongoDBBoltOAuth.WebClient") as mock_client:
+        mock_client.return_value.users_info.return_value = {
+            "user": {"id": "U123", "tz": "America/New_York"}
+        }
+        yield mock_client
+
+
+@pytest.fixture
+def installation_store(mock_mongo_client, mock_web_client):
     mock_db = mock_mongo_client.return_value
     return MongoInstallationStore()
 
@@ -35,6 +44,36 @@ def test_save_installation(installation_store):
     installation_store.db.slack_bots.update_one.assert_called_once()
 
 
+def test_save_installation_stores_the_installer_timezone(
+    installation_store, mock_web_client
+):
+    installation = Installation(
+        team_id="T123", user_id="U123", bot_token="xoxb-123", bot_id="B123"
+    )
+    installation_store.save(installation)
+
+    mock_web_client.return_value.users_info.assert_called_once_with(user="U123")
+    for collection in ("slack_installations", "slack_bots"):
+        update = getattr(installation_store.db, collection).update_one.call_args
+        assert update.args[1]["$set"]["timezone"] == "America/New_York"
+
+
+def test_find_installation_with_a_timezone(installation_store):
+    installation_store.db.slack_installations.find_one = MagicMock(
+        return_value={
+            "_id": "123",
+            "team_id": "T123",
+            "user_id": "U123",
+            "bot_token": "xoxb-123",
+            "timezone": "America/New_York",
+        }
+    )
+    result = installation_store.find_installation(
+        team_id="T123", user_id="U123", enterprise_id=None
+    )
+    assert result.get_custom_value("timezone") == "America/New_York"
+
+
 def test_find_installation(installation_store):
     installation_store.db.slack_installations.find_one = MagicMock(
         return_value={
@@ -1,4 +1,4 @@
-import time
+from datetime import datetime, timedelta, timezone
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -23,11 +23,14 @@ def test_issue_state(state_store):
     state = state_store.issue()
     assert state is not None
     state_store.collection.insert_one.assert_called_once()
+    # The TTL index on created_at only expires dates
+    document = state_store.collection.insert_one.call_args.args[0]
+    assert isinstance(document["created_at"], datetime)
 
 
 def test_consume_valid_state(state_store):
     state_store.collection.find_one_and_delete = MagicMock(
-        return_value={"state": "test_state", "created_at": time.time()}
+        return_value={"state": "test_state", "created_at": datetime.now(timezone.utc)}
     )
     result = state_store.consume("test_state")
     assert result is True
@@ -43,3 +46,13 @@ def test_consume_invalid_state(state_store):
     state_store.collection.find_one_and_delete.assert_called_once_with(
         {"state": "invalid_state"}
     )
+
+
+def test_consume_expired_state(state_store):
+    state_store.collection.find_one_and_delete = MagicMock(
+        return_value={
+            "state": "test_state",
+            "created_at": datetime.now(timezone.utc) - timedelta(seconds=601),
+        }
+    )
+    assert state_store.consume("test_state") is False
@@ -0,0 +1,77 @@
+from lib.utils.cache import TTLCache
+from lib.utils.metrics import metrics
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_and_set():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    assert cache.get("missing") is None
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_entries_expire():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=10, ttl=60, timer=timer)
+    cache.set("key", "value")
+    cache.set("short", "value", ttl=5)
+    timer.now = 10
+    assert cache.get("key") == "value"
+    assert cache.get("short") is None
+    timer.now = 61
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.evictions == 1
+
+
+def test_invalidate_where():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set(("E1", "T1"), 1)
+    cache.set(("E1", "T2"), 2)
+    cache.invalidate_where(lambda key, _: key[1] == "T1")
+    assert ("E1", "T1") not in cache
+    assert ("E1", "T2") in cache
+
+
+def test_named_cache_exports_metrics():
+    metrics.reset()
+    cache = TTLCache(maxsize=10, ttl=60, name="test")
+    cache.set("key", "value")
+    cache.get("key")
+    cache.get("missing")
+    assert metrics.get("cache_hits_total", cache="test") == 1
+    assert metrics.get("cache_misses_total", cache="test") == 1
+
+
+def test_replace_keeps_expiry_and_skips_changed_entries():
+    now = [0]
+    cache = TTLCache(ttl=10, timer=lambda: now[0])
+    old = ["a"]
+    cache.set("key", old)
+    now[0] = 5
+
+    assert cache.replace("key", old, ["b"]) is True
+    assert cache.replace("key", old, ["c"]) is False
+    assert cache.get("key") == ["b"]
+    now[0] = 10
+    assert cache.get("key") is None
@@ -0,0 +1,290 @@
+import itertools
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from lib import event_handler
+from lib.api import mongodb
+from lib.api.memory import MemoryStorage
+from lib.change_watcher import (
+    CHANGE_STREAM_HISTORY_LOST,
+    NOT_A_REPLICA_SET,
+    ChangeWatcher,
+)
+from lib.services import ServiceContainer
+from lib.utils.invalidation import InvalidationBus, invalidation_bus
+
+
+class FakeStream:
+    def __init__(self, changes, stop):
+        self.changes = list(changes)
+        self.stop = stop
+        self.resume_token = None
+        self.alive = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def try_next(self):
+        if not self.changes:
+            self.stop.set()
+            return None
+        change = self.changes.pop(0)
+        self.resume_token = {"_data": change.pop("token")}
+        return change
+
+
+def change(
+    operation, collection="events", document=None, token="1", before=None, id="E1"
+):
+    return {
+        "operationType": operation,
+        "ns": {"db": "events", "coll": collection},
+        "documentKey": {"_id": id},
+        "fullDocument": document,
+        "fullDocumentBeforeChange": before,
+        "token": token,
+    }
+
+
+@pytest.fixture
+def bus():
+    bus = InvalidationBus()
+    bus.messages = []
+    bus.subscribe(("events", "slack_installations", "slack_bots"), bus.messages.append)
+    return bus
+
+
+@pytest.fixture
+def change_dal():
+    change_dal = MagicMock()
+    change_dal.load_token.return_value = None
+    return change_dal
+
+
+def watch(watcher, changes):
+    stop = threading.Event()
+    stream = FakeStream(changes, stop)
+    watcher.change_dal.database.watch.return_value = stream
+    watcher.watch(stop)
+    return stream
+
+
+def test_bus_delivers_to_subscribers_of_the_collection():
+    bus = InvalidationBus()
+    events, bots = [], []
+    bus.subscribe(("events",), events.append)
+    bus.subscribe(("slack_bots",), bots.append)
+    bus.subscribe(("events",), MagicMock(side_effect=Exception("broken")))
+
+    bus.publish({"collection": "events", "team_id": "T1"})
+    bus.invalidate_all()
+
+    assert [message["team_id"] for message in events] == ["T1", None]
+    assert [message["collection"] for message in bots] == [None]
+
+
+def test_watch_publishes_changes_and_saves_the_token(bus, change_dal):
+    watcher = ChangeWatcher(bus=bus, change_dal=change_dal, mode="stream")
+    watch(
+        watcher,
+        [
+            change("insert", document={"team_id": "T1"}, token="1"),
+            change("delete", "slack_bots", token="2"),
+        ],
+    )
+
+    assert bus.messages == [
+        {
+            "collection": "events",
+            "operation": "insert",
+            "team_id": "T1",
+            "enterprise_id": None,
+        },
+        {
+            "collection": "slack_bots",
+            "operation": "delete",
+            "team_id": None,
+            "enterprise_id": None,
+        },
+    ]
+    change_dal.save_token.assert_called_once_with("caches", {"_data": "2"})
+
+
+def test_watch_takes_the_team_of_deleted_events_from_the_pre_image(bus, change_dal):
+    watcher = ChangeWatcher(bus=bus, change_dal=change_dal, mode="stream")
+    watch(watcher, [change("delete", before={"team_id": "T1"})])
+
+    assert [(m["operation"], m["team_id"]) for m in bus.messages] == [("delete", "T1")]
+    watch_options = change_dal.database.watch.call_args.kwargs
+    assert watch_options["full_document_before_change"] == "whenAvailable"
+
+
+def test_watch_skips_the_writes_of_this_process(bus, change_dal):
+    mongodb.local_deletes.set("E2", True)
+    watcher = ChangeWatcher(bus=bus, change_dal=change_dal, mode="stream")
+    watch(
+        watcher,
+        [
+            change("update", document={"team_id": "T1", "written_by": "other"}),
+            change(
+                "update",
+                document={"team_id": "T1", "written_by": mongodb.INSTANCE_ID},
+            ),
+            change("delete", before={"team_id": "T1"}, id="E2"),
+            change("delete", before={"team_id": "T1"}, id="E3"),
+        ],
+    )
+
+    assert [m["operation"] for m in bus.messages] == ["update", "delete"]
+
+
+def test_watch_resumes_after_the_saved_token(bus, change_dal):
+    change_dal.load_token.return_value = {"_data": "1"}
+    watcher = ChangeWatcher(bus=bus, change_dal=change_dal, mode="stream")
+    watch(watcher, [])
+
+    assert change_dal.database.watch.call_args.kwargs["resume_after"] == {"_data": "1"}
+    change_dal.save_token.assert_not_called()
+
+
+def test_watch_throttles_saving_the_token(bus, change_dal):
+    # Every reading of the clock is three seconds later
+    clock = itertools.count(step=3)
+    watcher = ChangeWatcher(
+        bus=bus, change_dal=change_dal, mode="stream", timer=lambda: next(clock)
+    )
+    watch(watcher, [change("update", token=str(i)) for i in range(3)])
+
+    assert [call.args[1] for call in change_dal.save_token.call_args_list] == [
+        {"_data": "1"},
+        {"_data": "2"},
+    ]
+
+
+def test_invalidated_stream_drops_everything(bus, change_dal):
+    watcher = ChangeWatcher(bus=bus, change_dal=change_dal, mode="stream")
+    watch(watcher, [change("drop"), change("invalidate", token="2")])
+
+    assert [message["collection"] for message in bus.messages] == [None, None]
+    change_dal.save_token.assert_called_once_with("caches", None)
+
+
+def test_poll_publishes_changed_workspaces(bus, change_dal):
+    change_dal.fingerprints.side_effect = lambda collection: {
+        "events": {(None, "T1"): (1, 1), (None, "T2"): (1, 1)},
+        "slack_installations": {},
+        "slack_bots": {(None, "T1"): (1, 1)},
+    }[collection]
+    watcher = ChangeWatcher(bus=bus, change_dal=change_dal, mode="poll")
+    fingerprints = watcher.poll_once()
+    assert bus.messages == []
+
+    change_dal.fingerprints.side_effect = lambda collection: {
+        "events": {(None, "T1"): (2, 2)},
+        "slack_installations": {},
+        "slack_bots": {(None, "T1"): (1, 1)},
+    }[collection]
+    watcher.poll_once(fingerprints)
+
+    assert sorted((m["collection"], m["team_id"]) for m in bus.messages) == [
+        ("events", "T1"),
+        ("events", "T2"),
+    ]
+
+
+def test_falls_back_to_polling_without_replica_set(bus, change_dal):
+    watcher = ChangeWatcher(bus=bus, change_dal=change_dal)
+    watcher.watch = MagicMock(
+        side_effect=OperationFailure("not a replica set", code=NOT_A_REPLICA_SET)
+    )
+    watcher.poll = MagicMock()
+
+    watcher.run_forever()
+
+    assert watcher.mode == "poll"
+    watcher.poll.assert_called_once()
+
+
+def test_lost_history_drops_everything(bus, change_dal):
+    watcher = ChangeWatcher(bus=bus, change_dal=change_dal, mode="stream")
+    failures = [OperationFailure("history lost", code=CHANGE_STREAM_HISTORY_LOST)]
+
+    def watch(stop):
+        if failures:
+            raise failures.pop()
+        stop.set()
+
+    watcher.watch = watch
+    watcher.run_forever()
+
+    change_dal.save_token.assert_called_once_with("caches", None)
+    assert [message["collection"] for message in bus.messages] == [None]
+
+
+def test_fingerprints_of_events():
+    with patch("lib.api.mongodb.MongoClient"):
+        dal = mongodb.ChangeMongoDAL()
+    dal.database = MagicMock()
+    dal.database["events"].aggregate.return_value = [
+        {"_id": {"team_id": "T1"}, "count": 2, "updated": 5}
+    ]
+
+    assert dal.fingerprints("events") == {(None, "T1"): (2, 5)}
+    pipeline = dal.database["events"].aggregate.call_args.args[0]
+    assert "starts_at" in pipeline[0]["$match"]
+
+
+def test_changes_invalidate_the_caches():
+    mongodb.workspace_cache.set((None, "T1"), {"bot_token": "xoxb-1"})
+    mongodb.workspace_cache.set((None, "T2"), {"bot_token": "xoxb-2"})
+    event_handler.event_list_cache.set(("T1", "2030-01-01"), ([], []))
+    event_handler.event_list_cache.set(("T2", "2030-01-01"), ([], []))
+
+    invalidation_bus.publish(
+        {
+            "collection": "slack_bots",
+            "operation": "update",
+            "team_id": "T1",
+            "enterprise_id": None,
+        }
+    )
+    invalidation_bus.publish(
+        {
+            "collection": "events",
+            "operation": "insert",
+            "team_id": "T2",
+            "enterprise_id": None,
+        }
+    )
+
+    assert (None, "T1") not in mongodb.workspace_cache
+    assert (None, "T2") in mongodb.workspace_cache
+    assert ("T1", "2030-01-01") in event_handler.event_list_cache
+    assert ("T2", "2030-01-01") not in event_handler.event_list_cache
+
+    invalidation_bus.invalidate_all()
+    assert len(mongodb.workspace_cache) == len(event_handler.event_list_cache) == 0
+
+
+def test_remote_changes_refresh_home_tabs():
+    home_tab = MagicMock()
+    home_tab.viewers.side_effect = lambda team_id: ["U1"] if team_id == "T1" else []
+    storage = MemoryStorage()
+    storage.save_installation({"team_id": "T1", "bot_token": "xoxb-1"})
+    services = ServiceContainer(
+        google_places=MagicMock(), home_tab=home_tab, storage=storage
+    )
+    message = {"collection": "events", "team_id": "T1", "enterprise_id": None}
+
+    with patch("lib.services.Slack"):
+        services.refresh_home_tabs(message)
+        services.refresh_home_tabs({**message, "team_id": "T2"})
+
+    home_tab.changed.assert_called_once()
+    assert home_tab.changed.call_args.args[0] == "T1"
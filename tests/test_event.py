@@ -0,0 +1,187 @@
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+from google.maps.places_v1.types import Place
+
+from lib.models.event import Event
+from lib.models.event_place import PLACE_SNAPSHOT_VERSION, EventPlace
+from lib.utils.slack_helpers import print_event_body
+
+
+@pytest.fixture
+def place_document():
+    return {
+        "version": PLACE_SNAPSHOT_VERSION,
+        "name": "Test Place",
+        "address": "123 Test St",
+        "rating": 4.5,
+        "types": ["restaurant", "bar"],
+        "place_id": "ChIJN1t_tDeuEmsRUsoyG83frY4",
+        "website_uri": "https://example.com",
+        "google_maps_url": "https://maps.google.com/?cid=1",
+    }
+
+
+@pytest.fixture
+def event_document(place_document):
+    return {
+        "_id": ObjectId("0123456789ab0123456789ab"),
+        "team_id": "T1",
+        "date": "2023-10-10",
+        "time": "18:00",
+        "location": place_document,
+        "description": "Test Description",
+        "participants": ["U1"],
+        "author": "U2",
+        "starts_at": datetime(2023, 10, 10, 16, tzinfo=timezone.utc),
+        "timezone": "Europe/Stockholm",
+        "participant_count": 1,
+    }
+
+
+def test_from_document_wraps_the_place(event_document):
+    event = Event.from_document(event_document)
+
+    assert event._id == event_document["_id"]
+    assert isinstance(event.location, EventPlace)
+    assert event.location.name() == "Test Place"
+    assert event.location.directions_url() == "https://maps.google.com/?cid=1"
+
+
+def test_from_document_maps_legacy_fields(place_document):
+    event = Event.from_document(
+        {
+            "_id": "1",
+            "team_id": "T1",
+            "Date": "2023-10-10",
+            "Time": "18:00",
+            "Location": place_document,
+            "Author": "U2",
+        }
+    )
+
+    assert (event.date, event.time, event.author) == ("2023-10-10", "18:00", "U2")
+    assert event.location.address() == "123 Test St"
+    assert event.participants == []
+
+
+def test_from_document_with_projection():
+    event = Event.from_document({"_id": "1", "team_id": "T1", "participants": []})
+
+    assert event.location is None
+    assert event.starts_at is None
+
+
+def test_to_document_round_trip(event_document):
+    document = Event.from_document(event_document).to_document()
+
+    assert document == event_document
+
+
+def test_to_document_leaves_out_missing_id(event_document):
+    event_document["_id"] = None
+
+    assert "_id" not in Event.from_document(event_document).to_document()
+
+
+def test_events_use_slots(event_document):
+    event = Event.from_document(event_document)
+
+    assert not hasattr(event, "__dict__")
+    assert not hasattr(event.location, "__dict__")
+
+
+def test_stored_place_is_converted_lazily(place_document):
+    place = EventPlace.from_document(place_document)
+    assert place._place is None
+
+    assert place.gMapsPlace.display_name.text == "Test Place"
+    assert place.gMapsPlace.types == ["restaurant", "bar"]
+
+
+def test_old_place_documents_are_upgraded():
+    place = EventPlace.from_document(
+        {
+            "name": "Test Place",
+            "address": "123 Test St",
+            "price_level": 2,
+            "rating": 0.0,
+            "types": ["bar"],
+            "place_id": "1",
+            "business_status": 1,
+            "google_maps_url": "https://maps.google.com/?cid=1",
+        }
+    )
+
+    assert place.to_document() == {
+        "version": PLACE_SNAPSHOT_VERSION,
+        "name": "Test Place",
+        "address": "123 Test St",
+        "rating": None,
+        "types": ["bar"],
+        "place_id": "1",
+        "website_uri": None,
+        "google_maps_url": "https://maps.google.com/?cid=1",
+    }
+    assert place.rating() == "Not rated"
+
+
+def test_place_name_only_documents_are_upgraded():
+    event = Event.from_document({"_id": "1", "team_id": "T1", "location": "Pub"})
+
+    assert event.location.name() == "Pub"
+    assert event.location.types() == []
+
+
+def test_events_keep_a_snapshot_of_places():
+    event = Event(
+        _id=None,
+        team_id="T1",
+        date="2023-10-10",
+        time="18:00",
+        location=EventPlace(
+            Place(
+                id="1",
+                display_name={"text": "Test Place"},
+                google_maps_uri="https://maps.google.com/?cid=1",
+            )
+        ),
+    )
+
+    assert event.location._place is None
+    assert event.location.name() == "Test Place"
+    assert event.location.directions_url() == "https://maps.google.com/?cid=1"
+    assert event.to_document()["location"]["rating"] is None
+
+
+def test_place_to_document():
+    place = EventPlace(
+        Place(
+            id="ChIJN1t_tDeuEmsRUsoyG83frY4",
+            display_name={"text": "Test Place"},
+            formatted_address="123 Test St",
+            rating=4.5,
+            types=["restaurant"],
+        )
+    )
+    document = place.to_document()
+
+    assert document["name"] == "Test Place"
+    assert document["place_id"] == "ChIJN1t_tDeuEmsRUsoyG83frY4"
+    assert document["types"] == ["restaurant"]
+
+
+def test_stored_place_without_rating(place_document):
+    del place_document["rating"]
+    place = EventPlace.from_document(place_document)
+
+    assert place.rating() == "Not rated"
+    assert place.format_open()["text"] == "Unknown"
+
+
+def test_print_event_body_of_stored_event(event_document):
+    blocks = print_event_body(Event.from_document(event_document))
+
+    assert blocks[1]["text"]["text"] == "*Test Place*"
+    assert "*Address:*\n123 Test St" in [field["text"] for field in blocks[1]["fields"]]
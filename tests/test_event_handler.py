@@ -1,12 +1,22 @@
+from dataclasses import replace
 from unittest.mock import MagicMock, patch
 
 import pytest
 from google.maps.places_v1.types import Place
 
-from lib.event_handler import EventHandler
+from lib.api.mongodb import (
+    ALREADY_PARTICIPANT,
+    EVENT_NOT_FOUND,
+    NOT_EVENT_AUTHOR,
+    NOT_PARTICIPANT,
+    WRITE_FAILED,
+    EventMongoDAL,
+)
+from lib.event_handler import EVENT_LIST_LIMIT, EventHandler
 from lib.models.event import Event
 from lib.models.event_place import EventPlace
 from lib.models.slack_message import SlackMessage
+from lib.utils.date_utils import DEFAULT_TIMEZONE
 from lib.utils.slack_helpers import print_possible_commands
 
 
@@ -15,6 +25,7 @@ from lib.utils.slack_helpers import print_possible_commands
 def event_handler(mock_event_mongo_dal):
     # Mock the MongoDB connection and prevent actual database calls
     mock_event_mongo_dal.return_value = MagicMock()
+    mock_event_mongo_dal.return_value.timezone = DEFAULT_TIMEZONE
 
     team_id = "test_team"
     bolt_client = MagicMock()
@@ -77,6 +88,74 @@ def test_list_event_with_results(event_handler, get_mock_event):
     event_handler.respond.assert_called_once()
 
 
+def test_list_event_lists_events_for_the_user_when_not_cached(
+    event_handler, get_mock_event
+):
+    event_handler.event_dal.list_events = MagicMock(return_value=[get_mock_event])
+
+    event_handler.list_event("list", {"user_id": "test_user"})
+    event_handler.show_events_view("test_user")
+    event_handler.list_event("list", {"user_id": "test_user"})
+
+    assert [
+        call.kwargs.get("viewer")
+        for call in event_handler.event_dal.list_events.call_args_list
+    ] == ["test_user", None]
+
+
+def test_full_event_list_offers_more_events(event_handler, get_mock_event):
+    events = [replace(get_mock_event, _id=i) for i in range(EVENT_LIST_LIMIT)]
+    event_handler.event_dal.list_events = MagicMock(return_value=events)
+    event_handler.event_dal.page_cursor = EventMongoDAL.page_cursor
+
+    event_handler.list_event("list", {"user_id": "test_user"})
+
+    more = event_handler.respond.call_args.args[0]["blocks"][-1]["elements"][0]
+    assert more["action_id"] == "more_events"
+    assert more["value"] == EventMongoDAL.page_cursor(events[-1])
+
+
+def test_more_events_pages_the_home_tab(event_handler, get_mock_event):
+    event_handler.event_dal.list_events = MagicMock(return_value=[get_mock_event])
+
+    event_handler.handle_interactive_event(
+        {
+            "type": "block_actions",
+            "user": {"id": "U1"},
+            "container": {"type": "view", "view_id": "V1"},
+            "actions": [{"action_id": "more_events", "value": "cursor"}],
+        }
+    )
+
+    assert event_handler.event_dal.list_events.call_args.kwargs == {
+        "limit": EVENT_LIST_LIMIT,
+        "after": "cursor",
+        "viewer": "U1",
+    }
+    update = event_handler.bolt_client.views_update.call_args.kwargs
+    assert update["view_id"] == "V1"
+    # The last page ends with the way back to the first events
+    back = update["view"]["blocks"][-1]["elements"][0]
+    assert back["action_id"] == "more_events"
+    assert "value" not in back
+
+
+def test_more_events_replies_when_none_are_left(event_handler):
+    event_handler.event_dal.list_events = MagicMock(return_value=[])
+
+    event_handler.handle_interactive_event(
+        {
+            "type": "block_actions",
+            "user": {"id": "U1"},
+            "container": {"type": "message", "channel_id": "C1"},
+            "actions": [{"action_id": "more_events", "value": "cursor"}],
+        }
+    )
+
+    event_handler.respond.assert_called_once_with("There are no more upcoming events.")
+    event_handler.bolt_client.views_update.assert_not_called()
+
+
 def test_list_event_no_results(event_handler):
     event_handler.event_dal.list_events = MagicMock(return_value=[])
     event_handler.respond = MagicMock()
@@ -98,7 +177,7 @@ def test_create_event(event_handler):
 
 
 def test_join_event_success(event_handler):
-    event_handler.event_dal.join_event = MagicMock(return_value=True)
+    event_handler.event_dal.join_event = MagicMock(return_value=(MagicMock(), None))
     event_handler.send_epemeral_message = MagicMock()
     result = event_handler.join_event("test_author", "test_id", "test_channel")
     assert result is True
@@ -107,23 +186,26 @@ def test_join_event_success(event_handler):
     )
 
 
-def test_join_event_failure(event_handler):
-    event_handler.event_dal.join_event = MagicMock(return_value=False)
+@pytest.mark.parametrize(
+    "error, message",
+    [
+        (EVENT_NOT_FOUND, "*Sorry!* I couldn't find the event to join."),
+        (ALREADY_PARTICIPANT, "*Oops!* You are already participating in that event."),
+        (WRITE_FAILED, "*Oops!* I couldn't join you to that event."),
+    ],
+)
+def test_join_event_failure(event_handler, error, message):
+    event_handler.event_dal.join_event = MagicMock(return_value=(None, error))
     event_handler.send_epemeral_message = MagicMock()
     result = event_handler.join_event("test_author", "test_id", "test_channel")
-    assert result == (
-        None,
-        "*Oops!* I couldn't join you to that event. Maybe you are already participating?",
-    )
+    assert result == (None, message)
     event_handler.send_epemeral_message.assert_called_once_with(
-        "*Oops!* I couldn't join you to that event. Maybe you are already participating?",
-        "test_author",
-        "test_channel",
+        message, "test_author", "test_channel"
     )
 
 
 def test_leave_event_success(event_handler):
-    event_handler.event_dal.leave_event = MagicMock(return_value=True)
+    event_handler.event_dal.leave_event = MagicMock(return_value=(MagicMock(), None))
     event_handler.send_epemeral_message = MagicMock()
     result = event_handler.leave_event("test_id", "test_author", "test_channel")
     assert result is True
@@ -134,15 +216,21 @@ def test_leave_event_success(event_handler):
     )
 
 
-def test_leave_event_failure(event_handler):
-    event_handler.event_dal.leave_event = MagicMock(return_value=False)
+@pytest.mark.parametrize(
+    "error, message",
+    [
+        (EVENT_NOT_FOUND, "*Sorry!* I couldn't find the event to leave."),
+        (NOT_PARTICIPANT, "*Oops!* Are you really joined to that event?"),
+        (WRITE_FAILED, "*Oops!* I couldn't remove you from that event."),
+    ],
+)
+def test_leave_event_failure(event_handler, error, message):
+    event_handler.event_dal.leave_event = MagicMock(return_value=(None, error))
     event_handler.send_epemeral_message = MagicMock()
     result = event_handler.leave_event("test_id", "test_author", "test_channel")
-    assert result == (None, "*Oops!* Are you really joined to that event?")
+    assert result == (None, message)
     event_handler.send_epemeral_message.assert_called_once_with(
-        "*Oops!* Are you really joined to that event?",
-        "test_author",
-        "test_channel",
+        message, "test_author", "test_channel"
     )
 
 
@@ -199,3 +287,144 @@ def test_create_event_from_input(event_handler):
         description="Test Event",
     )
     event_handler.say.assert_called_once()
+    event = event_handler.event_dal.insert_event.call_args.args[0]
+    assert event.timezone == event_handler.event_dal.timezone
+
+
+def test_events_view_renders_event_list_once_per_team(event_handler, get_mock_event):
+    event_handler.event_dal.list_events = MagicMock(return_value=[get_mock_event])
+
+    participant_view = event_handler.show_events_view("U12345")
+    author_view = event_handler.show_events_view("U67890")
+
+    event_handler.event_dal.list_events.assert_called_once()
+    actions = [
+        [element["action_id"] for element in block["elements"]]
+        for view in (participant_view, author_view)
+        for block in view["blocks"]
+        if block["type"] == "actions" and "block_id" not in block
+    ]
+    assert actions == [["leave_event"], ["join_event", "delete_event"]]
+
+
+def test_delete_event(event_handler, get_mock_event):
+    event_handler.event_dal.delete_event.return_value = (get_mock_event, None)
+    event_handler.slack = MagicMock()
+    event_handler.send_epemeral_message = MagicMock()
+
+    assert event_handler.delete_event("event_id", "U67890", "channel_id") is True
+
+    event_handler.event_dal.get_event.assert_not_called()
+    event_handler.say.assert_called_once()
+    assert "on *2023-10-10* at *18:00*" in (event_handler.say.call_args.kwargs["text"])
+
+
+@pytest.mark.parametrize(
+    "error, message",
+    [
+        (EVENT_NOT_FOUND, "Event not found."),
+        (NOT_EVENT_AUTHOR, "Unauthorized to delete the event."),
+        (WRITE_FAILED, "Failed to delete the event."),
+    ],
+)
+def test_delete_event_failure(event_handler, error, message):
+    event_handler.event_dal.delete_event.return_value = (None, error)
+    event_handler.send_epemeral_message = MagicMock()
+
+    assert event_handler.delete_event("event_id", "U1", "channel_id") == (
+        None,
+        message,
+    )
+    event_handler.say.assert_not_called()
+
+
+def test_join_event_invalidates_event_list(event_handler, get_mock_event):
+    event_handler.event_dal.list_events = MagicMock(return_value=[get_mock_event])
+    event_handler.event_dal.join_event = MagicMock(return_value=(get_mock_event, None))
+
+    event_handler.show_events_view("U12345")
+    event_handler.join_event("U11111", "event_id", "channel_id")
+    event_handler.show_events_view("U12345")
+
+    assert event_handler.event_dal.list_events.call_count == 2
+
+
+def test_join_event_refreshes_home_tabs(event_handler, get_mock_event):
+    event_handler.home_tab = MagicMock()
+    event_handler.event_dal.join_event = MagicMock(return_value=(get_mock_event, None))
+
+    event_handler.join_event("U11111", "event_id", "channel_id")
+
+    event_handler.home_tab.changed.assert_called_once_with(
+        "test_team", event_handler.bolt_client, event_handler.show_events_view
+    )
+
+
+def test_update_events_view_tracks_viewer(event_handler, get_mock_event):
+    event_handler.home_tab = MagicMock()
+    event_handler.event_dal.list_events = MagicMock(return_value=[get_mock_event])
+
+    event_handler.update_events_view("U12345")
+
+    event_handler.home_tab.seen.assert_called_once_with("test_team", "U12345")
+
+
+def test_todays_event_announces_events_of_today(event_handler, get_mock_event):
+    event_handler.event_dal.list_events = MagicMock(return_value=[get_mock_event])
+    event_handler.slack = MagicMock()
+    event_handler.slack.get_channel_id.return_value = "C1"
+
+    event_handler.todays_event()
+
+    assert event_handler.event_dal.list_events.call_args.kwargs["start_date"] == (
+        event_handler.event_dal.list_events.call_args.kwargs["end_date"]
+    )
+    event_handler.say.assert_called_once()
+    assert event_handler.say.call_args.kwargs["channel"] == "C1"
+
+
+def test_todays_event_raises_when_posting_fails(event_handler, get_mock_event):
+    event_handler.say = MagicMock(side_effect=Exception("not_in_channel"))
+
+    with pytest.raises(Exception, match="not_in_channel"):
+        event_handler.todays_event([get_mock_event], channel_id="C1")
+
+
+def test_show_participants_fills_in_the_opened_modal(event_handler):
+    event_handler.event_dal.list_participants.return_value = (["U1", "U2"], 60)
+
+    event_handler.handle_interactive_event(
+        {
+            "type": "block_actions",
+            "trigger_id": "trigger",
+            "user": {"id": "U1"},
+            "container": {"type": "message", "channel_id": "C1"},
+            "view": {"id": "V1", "callback_id": "participants_view"},
+            "actions": [{"action_id": "show_participants", "value": "E1|0"}],
+        }
+    )
+
+    event_handler.event_dal.list_participants.assert_called_once_with("E1", 0, 50)
+    update = event_handler.bolt_client.views_update.call_args.kwargs
+    assert update["view_id"] == "V1"
+    assert update["view"]["callback_id"] == "participants_view"
+    event_handler.bolt_client.views_open.assert_not_called()
+    event_handler.event_dal.list_events.assert_not_called()
+
+
+def test_show_participants_turns_the_page(event_handler):
+    event_handler.event_dal.list_participants.return_value = (["U51"], 51)
+
+    event_handler.handle_interactive_event(
+        {
+            "type": "block_actions",
+            "user": {"id": "U1"},
+            "container": {"type": "view", "view_id": "V1"},
+            "view": {"id": "V1", "callback_id": "participants_view"},
+            "actions": [{"action_id": "show_participants", "value": "E1|1"}],
+        }
+    )
+
+    event_handler.bolt_client.views_update.assert_called_once()
+    assert event_handler.bolt_client.views_update.call_args.kwargs["view_id"] == "V1"
+    event_handler.bolt_client.views_open.assert_not_called()
@@ -0,0 +1,198 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from google.maps.places_v1.types import Place
+
+from lib.api.google_places import (
+    AsyncGooglePlaces,
+    GooglePlaces,
+    PlaceDetailsCache,
+    detailsFieldMask,
+    normalize_query,
+    suggestion_cache,
+    suggestionFieldMask,
+)
+
+
+def make_place(id, name, address="Rådmansgatan 1, Stockholm"):
+    return Place(
+        id=id,
+        display_name={"text": name},
+        formatted_address=address,
+    )
+
+
+@pytest.fixture
+def google_places(monkeypatch):
+    monkeypatch.setenv("GOOGLE_PLACES_API_KEY", "test_key")
+    with patch("lib.api.google_places.places_v1.PlacesClient"):
+        places = GooglePlaces()
+    places.gMaps.search_text = MagicMock(
+        return_value=MagicMock(
+            places=[make_place(f"id{i}", f"The Pub {i}") for i in range(6)]
+            + [make_place("id9", "Wine Bar")]
+        )
+    )
+    return places
+
+
+def test_normalize_query():
+    assert normalize_query("  The   PUB ") == "the pub"
+
+
+def test_suggestions_are_cached_by_normalized_query(google_places):
+    first = google_places.get_place_suggestions("pub")
+    second = google_places.get_place_suggestions("Pub ")
+    assert first == second
+    assert len(first) == 7
+    google_places.gMaps.search_text.assert_called_once()
+
+
+def test_details_field_mask_covers_the_place_snapshot():
+    assert detailsFieldMask.split(",") == [
+        "displayName",
+        "formattedAddress",
+        "rating",
+        "types",
+        "id",
+        "websiteUri",
+        "googleMapsUri",
+    ]
+
+
+def test_suggestions_use_trimmed_field_mask(google_places):
+    google_places.get_place_suggestions("pub")
+    metadata = google_places.gMaps.search_text.call_args.kwargs["metadata"]
+    assert metadata == [("x-goog-fieldmask", suggestionFieldMask)]
+
+
+def test_refined_query_is_served_from_prefix(google_places):
+    google_places.get_place_suggestions("pub")
+    refined = google_places.get_place_suggestions("pub the")
+    assert len(refined) == 6
+    google_places.gMaps.search_text.assert_called_once()
+
+
+def test_refined_query_is_searched_once_the_prefix_expires(google_places):
+    google_places.get_place_suggestions("pub")
+    google_places.get_place_suggestions("pub the")
+    suggestion_cache.invalidate_where(lambda key, _: key[1] == "pub")
+
+    google_places.get_place_suggestions("pub the")
+
+    assert google_places.gMaps.search_text.call_count == 2
+
+
+def test_refined_query_with_few_matches_is_searched(google_places):
+    google_places.get_place_suggestions("pub")
+    google_places.get_place_suggestions("pub wine")
+    assert google_places.gMaps.search_text.call_count == 2
+
+
+def test_concurrent_queries_share_one_search(google_places):
+    started = threading.Event()
+    release = threading.Event()
+    response = google_places.gMaps.search_text.return_value
+
+    def slow_search(**kwargs):
+        started.set()
+        release.wait(timeout=2)
+        return response
+
+    google_places.gMaps.search_text.side_effect = slow_search
+    results = []
+    first = threading.Thread(
+        target=lambda: results.append(google_places.get_place_suggestions("pub"))
+    )
+    first.start()
+    started.wait(timeout=2)
+    second = threading.Thread(
+        target=lambda: results.append(google_places.get_place_suggestions("pub"))
+    )
+    second.start()
+    release.set()
+    first.join()
+    second.join()
+
+    assert len(results) == 2
+    assert results[0] == results[1]
+    google_places.gMaps.search_text.assert_called_once()
+
+
+@pytest.fixture
+def place_dal():
+    place_dal = MagicMock()
+    place_dal.get_place.return_value = None
+    return place_dal
+
+
+@pytest.fixture
+def details_places(google_places, place_dal):
+    google_places.details_cache = PlaceDetailsCache(place_dal=place_dal)
+    google_places.gMaps.get_place = MagicMock(return_value=make_place("id1", "The Pub"))
+    return google_places
+
+
+def test_place_details_are_cached_in_memory(details_places, place_dal):
+    first = details_places.get_place_information("id1")
+    second = details_places.get_place_information("id1")
+    assert first.display_name.text == second.display_name.text == "The Pub"
+    details_places.gMaps.get_place.assert_called_once()
+    place_dal.save_place.assert_called_once_with(
+        "id1", Place.serialize(make_place("id1", "The Pub"))
+    )
+    assert details_places.details_cache.hit_ratio() == 0.5
+
+
+def test_place_details_are_read_from_mongo(details_places, place_dal):
+    place_dal.get_place.return_value = {
+        "data": Place.serialize(make_place("id1", "Cached Pub")),
+        "fetched_at": datetime.now(timezone.utc),
+    }
+    place = details_places.get_place_information("id1")
+    assert place.display_name.text == "Cached Pub"
+    details_places.gMaps.get_place.assert_not_called()
+
+
+def test_stale_place_details_are_refetched(details_places, place_dal):
+    place_dal.get_place.return_value = {
+        "data": Place.serialize(make_place("id1", "Cached Pub")),
+        "fetched_at": datetime.now(timezone.utc) - timedelta(days=30),
+    }
+    place = details_places.get_place_information("id1")
+    assert place.display_name.text == "The Pub"
+
+
+def test_stale_place_details_are_served_on_error(details_places, place_dal):
+    place_dal.get_place.return_value = {
+        "data": Place.serialize(make_place("id1", "Cached Pub")),
+        "fetched_at": datetime.now(timezone.utc) - timedelta(days=30),
+    }
+    details_places.gMaps.get_place.side_effect = Exception("unavailable")
+    place = details_places.get_place_information("id1")
+    assert place.display_name.text == "Cached Pub"
+
+
+def test_async_suggestions_share_one_search(monkeypatch):
+    monkeypatch.setenv("GOOGLE_PLACES_API_KEY", "test_key")
+    with patch("lib.api.google_places.places_v1.PlacesAsyncClient"):
+        places = AsyncGooglePlaces()
+
+    async def search_text(**kwargs):
+        await asyncio.sleep(0.01)
+        return MagicMock(places=[make_place("id1", "The Pub")])
+
+    places.gMaps.search_text = MagicMock(side_effect=search_text)
+
+    async def run():
+        return await asyncio.gather(
+            *(places.get_place_suggestions("the pub") for _ in range(5))
+        )
+
+    results = asyncio.run(run())
+    assert all(result == results[0] for result in results)
+    assert results[0][0]["value"] == "id1"
+    places.gMaps.search_text.assert_called_once()
@@ -1,6 +1,6 @@
 # coding=utf-8
 
-from datetime import datetime
+from datetime import datetime, timezone
 
 import pytest
 from google.maps.places_v1.types import Place
@@ -9,11 +9,13 @@ from lib.models.event import Event
 from lib.models.event_place import EventPlace
 from lib.models.slack_message import SlackMessage
 from lib.utils.date_utils import (
+    day_bounds,
     get_date,
     get_day_number,
     get_next_weekday_as_date,
     is_day_formatted_as_date,
     parse_date_to_weekday,
+    to_starts_at,
 )
 from lib.utils.helpers import (
     extract_values,
@@ -24,6 +26,10 @@ from lib.utils.helpers import (
 )
 from lib.utils.slack_helpers import (
     build_create_dialog,
+    build_participants_loading_view,
+    build_participants_view,
+    print_event_actions,
+    print_event_body,
     print_event_create,
     print_event_created,
     print_event_list,
@@ -85,6 +91,36 @@ def test_parse_date_to_weekday():
     assert parse_date_to_weekday("2023-10-10") == "Tuesday"
 
 
+def test_to_starts_at_converts_local_time_to_utc():
+    assert to_starts_at("2023-10-10", "18:00", "Europe/Stockholm") == datetime(
+        2023, 10, 10, 16, tzinfo=timezone.utc
+    )
+    assert to_starts_at("2023-12-10", None, "Europe/Stockholm") == datetime(
+        2023, 12, 9, 23, tzinfo=timezone.utc
+    )
+
+
+def test_day_bounds_span_a_local_day():
+    # The day daylight saving time ends is 25 hours long
+    start, end = day_bounds("2023-10-29", "Europe/Stockholm")
+    assert start == datetime(2023, 10, 28, 22, tzinfo=timezone.utc)
+    assert end == datetime(2023, 10, 29, 23, tzinfo=timezone.utc)
+
+
+def test_event_derives_starts_at_and_weekday():
+    event = Event(
+        _id=None,
+        team_id="T1",
+        date="2023-10-10",
+        time="23:30",
+        location=None,
+        timezone="America/New_York",
+    )
+    assert event.starts_at == datetime(2023, 10, 11, 3, 30, tzinfo=timezone.utc)
+    assert event.weekday() == "Tuesday"
+    assert event.to_dict()["timezone"] == "America/New_York"
+
+
 def test_get_day_number():
     assert get_day_number("Tuesday") == 1
     assert get_day_number("Tue") == 1
@@ -103,6 +139,53 @@ def test_print_event_list(get_mock_event):
     assert isinstance(slack_message, SlackMessage)
 
 
+def test_print_event_list_offers_more_events(get_mock_event):
+    blocks = print_event_list([get_mock_event], "U1", after="cursor").blocks
+
+    assert blocks[-1]["elements"][0]["action_id"] == "more_events"
+    assert blocks[-1]["elements"][0]["value"] == "cursor"
+
+
+def test_print_event_body_lists_the_first_participants(get_mock_event):
+    get_mock_event.participants = [f"U{i}" for i in range(25)]
+    get_mock_event.participant_count = 25
+
+    participants = print_event_body(get_mock_event)[-1]["text"]["text"]
+
+    assert participants.count("<@") == 10
+    assert participants.endswith("_and 15 more_")
+
+
+def test_print_event_actions_for_viewer(get_mock_event):
+    summary = Event.from_document(
+        {
+            **get_mock_event.to_document(),
+            "_id": 1,
+            "participants": [],
+            "participant_count": 11,
+            "joined": True,
+        }
+    )
+
+    actions = [action["action_id"] for action in print_event_actions(summary, "U1")]
+
+    assert actions == ["leave_event", "show_participants"]
+
+
+def test_build_participants_view_pages():
+    first = build_participants_view("E1", ["U1", "U2"], 5, 0, 2)
+    last = build_participants_view("E1", ["U5"], 5, 2, 2)
+
+    assert first["callback_id"] == "participants_view"
+    assert [button["value"] for button in first["blocks"][-1]["elements"]] == ["E1|1"]
+    assert [button["value"] for button in last["blocks"][-1]["elements"]] == ["E1|1"]
+    assert last["blocks"][1]["elements"][0]["text"] == "5-5 of 5 participants"
+
+
+def test_build_participants_loading_view_is_the_participants_modal():
+    assert build_participants_loading_view()["callback_id"] == "participants_view"
+
+
 def test_print_event_create():
     slack_message = print_event_create()
     assert isinstance(slack_message, SlackMessage)
@@ -0,0 +1,78 @@
+import threading
+from unittest.mock import MagicMock
+
+from slack_sdk.errors import SlackApiError
+
+from lib.utils.home_tab import HomeTabPublisher
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def render(user_id):
+    return {"type": "home", "blocks": [], "private_metadata": user_id}
+
+
+def test_viewers_expire():
+    timer = FakeTimer()
+    publisher = HomeTabPublisher(viewer_ttl=60, timer=timer)
+    publisher.seen("T1", "U1")
+    timer.now = 30
+    publisher.seen("T1", "U2")
+    timer.now = 70
+
+    assert publisher.viewers("T1") == ["U2"]
+    assert publisher.viewers("T2") == []
+
+
+def test_viewers_are_bounded_per_team():
+    publisher = HomeTabPublisher(max_viewers=2)
+    for user_id in ("U1", "U2", "U3"):
+        publisher.seen("T1", user_id)
+
+    assert publisher.viewers("T1") == ["U2", "U3"]
+
+
+def test_changes_are_coalesced_into_one_publish_per_viewer():
+    publisher = HomeTabPublisher(window=60)
+    publisher.seen("T1", "U1")
+    publisher.seen("T1", "U2")
+    client = MagicMock()
+
+    for _ in range(3):
+        publisher.changed("T1", client, render)
+    publisher.flush()
+
+    assert client.views_publish.call_count == 2
+    assert {call.kwargs["user_id"] for call in client.views_publish.call_args_list} == {
+        "U1",
+        "U2",
+    }
+
+
+def test_changes_are_published_after_the_window():
+    publisher = HomeTabPublisher(window=0.01)
+    publisher.seen("T1", "U1")
+    published = threading.Event()
+    client = MagicMock()
+    client.views_publish.side_effect = lambda **kwargs: published.set()
+
+    publisher.changed("T1", client, render)
+
+    assert published.wait(timeout=2)
+    client.views_publish.assert_called_once_with(user_id="U1", view=render("U1"))
+
+
+def test_rate_limited_publish_returns_retry_after():
+    publisher = HomeTabPublisher()
+    client = MagicMock()
+    client.views_publish.side_effect = SlackApiError(
+        "ratelimited", MagicMock(status_code=429, headers={"Retry-After": "3"})
+    )
+
+    assert publisher._publish("T1", client, render, "U1") == 3.0
@@ -0,0 +1,199 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from bson import ObjectId
+
+from lib.api.identity_map import (
+    IdentityMap,
+    apply_change,
+    current_identity_map,
+    request_scope,
+)
+from lib.api.mongodb import EventMongoDAL
+from lib.event_handler import EventHandler
+from lib.models.event import Event
+from lib.utils.date_utils import DEFAULT_TIMEZONE
+
+
+def make_event(day, participants=(), _id=None):
+    return Event(
+        _id=_id or ObjectId(),
+        team_id="T1",
+        date=f"2030-01-{day:02d}",
+        time="18:00",
+        location={"name": f"Place {day}"},
+        participants=list(participants),
+        author="U1",
+    )
+
+
+@pytest.fixture
+def events():
+    return [make_event(1), make_event(2, ["U2"]), make_event(3)]
+
+
+@pytest.fixture
+def dal():
+    with patch("lib.api.mongodb.MongoClient"):
+        dal = EventMongoDAL("T1")
+        dal.database = MagicMock()
+        yield dal
+
+
+def test_apply_join_and_leave(events):
+    joined = apply_change(events, ("joined", str(events[0]._id), "U3"))
+    left = apply_change(joined, ("left", str(events[1]._id), "U2"))
+
+    assert left[0].participants == ["U3"]
+    assert left[1].participants == []
+    assert (left[0].participant_count, left[1].participant_count) == (1, 0)
+    # The original events are left untouched
+    assert events[0].participants == [] and events[1].participants == ["U2"]
+    assert left[2] is events[2]
+
+
+def test_apply_insert_in_order(events):
+    inserted = make_event(2)
+
+    patched = apply_change(events, ("inserted", str(inserted._id), inserted), limit=3)
+
+    assert patched == [events[0], events[1], inserted]
+
+
+def test_apply_insert_outside_of_query(events):
+    inserted = make_event(4)
+
+    assert apply_change(events, ("inserted", "", inserted), limit=3) == events
+    assert (
+        apply_change(events, ("inserted", "", inserted), include=lambda e: False)
+        == events
+    )
+
+
+def test_apply_delete(events):
+    deleted = ("deleted", str(events[1]._id), None)
+
+    assert apply_change(events, deleted) == [events[0], events[2]]
+    # A following event may take the place of the deleted one
+    assert apply_change(events, deleted, limit=3) is None
+
+
+def test_identity_map_keeps_lists_in_step(events):
+    identity_map = IdentityMap()
+    identity_map.add_list("key", events, limit=10)
+
+    identity_map.joined(events[0]._id, "U3")
+    identity_map.deleted(events[2]._id)
+
+    listed = identity_map.get_list("key")
+    assert [event._id for event in listed] == [events[0]._id, events[1]._id]
+    assert listed[0] is identity_map.get(events[0]._id)
+    assert listed[0].participants == ["U3"]
+    assert [kind for kind, _, _ in identity_map.take_changes()] == [
+        "joined",
+        "deleted",
+    ]
+    assert identity_map.take_changes() == []
+
+
+def test_request_scope():
+    assert current_identity_map() is None
+    with request_scope() as outer:
+        with request_scope() as inner:
+            assert inner is outer is current_identity_map()
+    assert current_identity_map() is None
+
+
+def test_dal_reads_once_per_scope(dal, events):
+    dal.database.events.find.return_value.sort.return_value = [
+        event.to_document() for event in events
+    ]
+    dal.database.events.find_one_and_update.return_value = {
+        "_id": events[0]._id,
+        "participant": False,
+    }
+
+    with request_scope():
+        first = dal.list_events(start_date="2030-01-01")
+        dal.join_event(str(events[0]._id), "U3")
+        second = dal.list_events(start_date="2030-01-01")
+        event = dal.get_event(str(events[1]._id))
+
+    dal.database.events.find.assert_called_once()
+    dal.database.events.find_one.assert_not_called()
+    assert second[0].participants == ["U3"]
+    assert first[0].participants == []
+    assert event is second[1]
+
+
+def test_dal_lists_inserted_events(dal, events):
+    dal.database.events.find.return_value.sort.return_value = [events[0].to_document()]
+    dal.database.events.insert_one.return_value.inserted_id = ObjectId()
+
+    with request_scope():
+        dal.list_events(start_date="2030-01-01")
+        dal.insert_event(make_event(5))
+        listed = dal.list_events(start_date="2030-01-01")
+
+    assert [event.date for event in listed] == ["2030-01-01", "2030-01-05"]
+
+
+def test_dal_without_scope_always_queries(dal):
+    dal.database.events.find.return_value.sort.return_value = []
+
+    dal.list_events(start_date="2030-01-01")
+    dal.list_events(start_date="2030-01-01")
+
+    assert dal.database.events.find.call_count == 2
+
+
+@pytest.fixture
+def event_handler(events):
+    event_dal = MagicMock()
+    event_dal.timezone = DEFAULT_TIMEZONE
+    event_dal.list_events.return_value = events
+    return EventHandler(
+        "T1",
+        bolt_client=MagicMock(),
+        say_func=MagicMock(),
+        respond_func=MagicMock(),
+        event_dal=event_dal,
+        slack=MagicMock(),
+        google_places=MagicMock(),
+    )
+
+
+def test_join_patches_cached_event_list(event_handler, events):
+    event_handler.show_events_view("U2")
+
+    with request_scope() as identity_map:
+        event_handler.event_dal.join_event.side_effect = (
+            lambda id, user: identity_map.joined(id, user) or (events[0], None)
+        )
+        event_handler.join_event("U3", str(events[0]._id), "C1")
+        view = event_handler.show_events_view("U3")
+
+    event_handler.event_dal.list_events.assert_called_once()
+    assert "<@U3>" in str(view)
+    cached, _ = event_handler.upcoming_events()
+    assert cached[0].participants == ["U3"]
+    assert cached[1] is events[1]
+
+
+def test_changes_that_cannot_be_patched_invalidate(event_handler, events):
+    event_handler.show_events_view("U2")
+    with patch("lib.event_handler.EVENT_LIST_LIMIT", 3):
+        with request_scope() as identity_map:
+            identity_map.deleted(events[0]._id)
+            event_handler.events_changed()
+        event_handler.show_events_view("U2")
+
+    assert event_handler.event_dal.list_events.call_count == 2
+
+
+def test_changes_outside_of_scope_invalidate(event_handler, events):
+    event_handler.show_events_view("U2")
+    event_handler.events_changed()
+    event_handler.show_events_view("U2")
+
+    assert event_handler.event_dal.list_events.call_count == 2
@@ -0,0 +1,8 @@
+from lib.bolt.listeners import uses_trigger
+
+
+def test_only_commands_opening_a_modal_use_the_trigger():
+    assert uses_trigger({"text": "create"})
+    assert not uses_trigger({"text": "list"})
+    assert not uses_trigger({"text": "suggest create"})
+    assert not uses_trigger({})
@@ -0,0 +1,122 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from lib.api import mongodb
+from lib.api.mongodb import EventMongoDAL, OauthMongoDAL, PoolMetricsListener
+from lib.bolt.MongoDBBoltOAuth import MongoInstallationStore
+from lib.bolt.MongoDBBoltOAuthStateStore import MongoDBOAuthStateStore
+from lib.utils.metrics import metrics
+
+
+@pytest.fixture
+def mock_mongo_client():
+    with patch("lib.api.mongodb.MongoClient") as mock_client:
+        yield mock_client
+
+
+def test_client_is_shared_and_created_on_first_use(mock_mongo_client):
+    first = EventMongoDAL("team_a")
+    second = EventMongoDAL("team_b")
+    oauth = OauthMongoDAL()
+    store = MongoInstallationStore()
+    MongoDBOAuthStateStore(expiration_seconds=600)
+    mock_mongo_client.assert_not_called()
+
+    assert first.database is second.database is oauth.database is store.db
+    mock_mongo_client.assert_called_once()
+
+
+def test_dals_follow_the_client_after_fork(mock_mongo_client):
+    mock_mongo_client.side_effect = [MagicMock(), MagicMock()]
+    dal = EventMongoDAL("team_a")
+    parent = dal.database
+    with patch("lib.api.mongodb.os.getpid", return_value=-1):
+        child = dal.database
+
+    assert parent is not child
+    assert mock_mongo_client.call_count == 2
+
+
+def test_client_is_recreated_after_fork(mock_mongo_client):
+    mock_mongo_client.side_effect = [MagicMock(), MagicMock()]
+    first = mongodb.get_mongo_client()
+    with patch("lib.api.mongodb.os.getpid", return_value=-1):
+        second = mongodb.get_mongo_client()
+
+    assert first is not second
+    assert mock_mongo_client.call_count == 2
+
+
+def test_pool_options_from_env(mock_mongo_client, monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "20")
+    monkeypatch.setenv("MONGO_MIN_POOL_SIZE", "2")
+    monkeypatch.setenv("MONGO_MAX_IDLE_TIME_MS", "60000")
+    mongodb.get_mongo_client()
+
+    kwargs = mock_mongo_client.call_args.kwargs
+    assert kwargs["maxPoolSize"] == 20
+    assert kwargs["minPoolSize"] == 2
+    assert kwargs["maxIdleTimeMS"] == 60000
+    assert isinstance(kwargs["event_listeners"][0], PoolMetricsListener)
+
+
+def test_pool_metrics_listener():
+    metrics.reset()
+    listener = PoolMetricsListener()
+    event = MagicMock(address=("localhost", 27017))
+    listener.connection_created(event)
+    listener.connection_checked_out(event)
+    listener.connection_checked_in(event)
+
+    assert metrics.get("mongo_pool_connections_open", address="localhost:27017") == 1
+    assert metrics.get("mongo_pool_connections_in_use", address="localhost:27017") == 0
+    assert metrics.get("mongo_pool_checkouts_total", address="localhost:27017") == 1
+    assert (
+        'mongo_pool_connections_open{address="localhost:27017"} 1' in metrics.render()
+    )
+
+
+def test_ensure_indexes_creates_registered_indexes():
+    database = MagicMock()
+    ensured = mongodb.ensure_indexes(database)
+
+    assert ensured.keys() == mongodb.INDEXES.keys()
+    assert "team_id_1_starts_at_1__id_1" in ensured["events"]
+    database["events"].create_indexes.assert_called()
+
+
+def test_ensure_indexes_updates_ttl_of_existing_index():
+    database = MagicMock()
+    collections = {name: MagicMock() for name in mongodb.INDEXES}
+    database.__getitem__.side_effect = collections.__getitem__
+    collections["places_cache"].create_indexes.side_effect = OperationFailure(
+        "IndexOptionsConflict", code=85
+    )
+    mongodb.ensure_indexes(database)
+
+    database.command.assert_any_call(
+        "collMod", "events", changeStreamPreAndPostImages={"enabled": True}
+    )
+    database.command.assert_called_with(
+        "collMod",
+        "places_cache",
+        index={
+            "keyPattern": {"fetched_at": 1},
+            "expireAfterSeconds": 30 * 24 * 3600,
+        },
+    )
+
+
+def test_index_report():
+    database = MagicMock()
+    database.__getitem__.return_value.aggregate.return_value = [
+        {"name": "_id_", "accesses": {"ops": 0}},
+        {"name": "team_id_1", "accesses": {"ops": 0}},
+        {"name": "enterprise_id_1", "accesses": {"ops": 10}},
+    ]
+    report = mongodb.index_report(database)
+
+    assert report["slack_bots"] == {"missing": [], "unused": ["team_id_1"]}
+    assert report["events"]["missing"] == ["team_id_1_starts_at_1__id_1"]
@@ -1,10 +1,24 @@
+from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch
+from zoneinfo import ZoneInfo
 
 import pytest
 from bson.objectid import ObjectId
 
-from lib.api.mongodb import EventMongoDAL
-from lib.models.event import Event
+from lib.api import mongodb
+from lib.api.mongodb import (
+    ALREADY_PARTICIPANT,
+    CHANGED_EVENT_PROJECTION,
+    EVENT_NOT_FOUND,
+    NOT_EVENT_AUTHOR,
+    NOT_PARTICIPANT,
+    EventBatchMongoDAL,
+    EventMongoDAL,
+    is_participant,
+    set_participants,
+)
+from lib.models.event import PARTICIPANT_PREVIEW_SIZE, Event
+from lib.utils.date_utils import day_bounds
 
 
 @pytest.fixture
@@ -33,7 +47,6 @@ def event_dal(mock_mongo_client):
     mock_db = mock_mongo_client.return_value.events
     mock_db.events = MagicMock()
     dal = EventMongoDAL(team_id="test_team")
-    dal.mongodb = mock_mongo_client.return_value
     dal.database = mock_db
     return dal
 
@@ -51,6 +64,8 @@ def test_insert_event(event_dal, get_mock_event):
 
     event_dal.database.events.insert_one.assert_called_once()
     assert result == str(mock_inserted_id)
+    document = event_dal.database.events.insert_one.call_args.args[0]
+    assert document["written_by"] == mongodb.INSTANCE_ID
 
 
 def test_list_events(event_dal):
@@ -91,12 +106,18 @@ def test_list_events(event_dal):
     mock_cursor.sort.return_value = mock_events
     event_dal.database.events.find = MagicMock(return_value=mock_cursor)
 
-    result = event_dal.list_events()
+    result = event_dal.list_events(start_date="2023-10-01")
 
-    # Assert that find was called with the correct filter
-    event_dal.database.events.find.assert_called_once_with({"team_id": "test_team"})
+    # Assert that find was called with the start of the day in the team's timezone
+    event_dal.database.events.find.assert_called_once_with(
+        {
+            "team_id": "test_team",
+            "starts_at": {"$gte": datetime(2023, 9, 30, 22, tzinfo=timezone.utc)},
+        },
+        None,
+    )
     # Assert that sort was called with the correct sorting criteria
-    mock_cursor.sort.assert_called_once_with([("date", 1), ("time", 1)])
+    mock_cursor.sort.assert_called_once_with([("starts_at", 1), ("_id", 1)])
     # Assert the result matches the mocked events
 
     # Assert that the result is a list of Event objects
@@ -104,6 +125,106 @@ def test_list_events(event_dal):
     assert len(result) == len(mock_events)
 
 
+def test_list_events_defaults_to_today(event_dal):
+    event_dal.database.events.find = MagicMock()
+
+    event_dal.list_events()
+
+    query = event_dal.database.events.find.call_args.args[0]
+    today = datetime.now(ZoneInfo(event_dal.timezone)).strftime("%Y-%m-%d")
+    assert query["starts_at"] == {"$gte": day_bounds(today, event_dal.timezone)[0]}
+
+
+def test_list_events_window_and_page(event_dal, get_mock_event):
+    mock_cursor = MagicMock()
+    mock_cursor.sort.return_value.limit.return_value = [get_mock_event]
+    event_dal.database.events.find = MagicMock(return_value=mock_cursor)
+    after = EventMongoDAL.page_cursor(Event(**get_mock_event))
+
+    result = event_dal.list_events(
+        start_date="2023-10-01",
+        end_date="2023-10-31",
+        limit=10,
+        after=after,
+        projection={"participants": 0},
+    )
+
+    query, projection = event_dal.database.events.find.call_args.args
+    assert query["starts_at"] == {
+        "$gte": datetime(2023, 9, 30, 22, tzinfo=timezone.utc),
+        "$lt": datetime(2023, 10, 31, 23, tzinfo=timezone.utc),
+    }
+    assert query["$or"][1] == {
+        "starts_at": datetime(2023, 10, 1, 16, tzinfo=timezone.utc),
+        "_id": {"$gt": ObjectId("0123456789ab0123456789ab")},
+    }
+    assert projection == {"participants": 0}
+    mock_cursor.sort.return_value.limit.assert_called_once_with(10)
+    assert len(result) == 1
+
+
+def test_list_events_inclusion_projection_loads_required_fields(event_dal):
+    event_dal.database.events.find = MagicMock()
+
+    event_dal.list_events(projection={"author": 1})
+
+    projection = event_dal.database.events.find.call_args.args[1]
+    assert projection == {
+        "author": 1,
+        "team_id": 1,
+        "date": 1,
+        "time": 1,
+        "starts_at": 1,
+        "timezone": 1,
+        "location": 1,
+    }
+
+
+def test_list_events_for_viewer(event_dal, get_mock_event):
+    event_dal.database.events.find.return_value.sort.return_value = [
+        {
+            **get_mock_event,
+            "participants": ["user1"],
+            "participant_count": 40,
+            "joined": True,
+        }
+    ]
+
+    (event,) = event_dal.list_events(viewer="user2")
+
+    projection = event_dal.database.events.find.call_args.args[1]
+    assert projection["joined"] == {
+        "$in": ["user2", {"$ifNull": ["$participants", []]}]
+    }
+    assert projection["participants"]["$slice"][1] == PARTICIPANT_PREVIEW_SIZE
+    assert (event.participant_count, event.joined) == (40, True)
+    assert event.is_participant("user2")
+
+
+def test_list_participants(event_dal):
+    event_id = ObjectId()
+    event_dal.database.events.find_one.return_value = {
+        "participants": ["user3"],
+        "participant_count": 3,
+    }
+
+    assert event_dal.list_participants(str(event_id), page=1, page_size=2) == (
+        ["user3"],
+        3,
+    )
+    query, projection = event_dal.database.events.find_one.call_args.args
+    assert query == {"_id": event_id}
+    assert projection["participants"] == {
+        "$slice": [{"$ifNull": ["$participants", []]}, 2, 2]
+    }
+
+
+def test_list_participants_of_missing_event(event_dal):
+    event_dal.database.events.find_one.return_value = None
+
+    assert event_dal.list_participants(str(ObjectId())) is None
+
+
 def test_get_event(event_dal, get_mock_event):
     mock_event = Event(**get_mock_event)
     event_dal.database.events.find_one = MagicMock(return_value=get_mock_event)
@@ -116,86 +237,268 @@ def test_get_event(event_dal, get_mock_event):
     assert result.team_id == mock_event.team_id
 
 
-def test_join_event(event_dal, get_mock_event):
-    mock_event = Event(**get_mock_event)
-    mock_event_id = mock_event._id
+def commands(collection) -> list[str]:
+    """
+    The names of the collection methods called, one per command sent to MongoDB
+    """
+    return [name for name, _, _ in collection.method_calls]
 
-    updated_event = {
-        "_id": mock_event_id,
-        "team_id": "test_team",
-        "date": "2023-10-01",
-        "time": "18:00",
-        "location": "Test Place",
-        "description": "Test Description",
-        "participants": ["user1", "user2", "test_user"],
-        "author": "test_user",
+
+def test_join_event(event_dal):
+    event_id = ObjectId()
+    event_dal.database.events.find_one_and_update.return_value = {
+        "_id": event_id,
+        "location": {"name": "Test Place"},
+        "participant": False,
     }
-    # Mock the find_one_and_update method to return a mock event
-    event_dal.database.events.find_one_and_update = MagicMock(
-        return_value=updated_event
+
+    event, error = event_dal.join_event(str(event_id), "test_user")
+
+    assert error is None
+    assert event.location.name() == "Test Place"
+    assert commands(event_dal.database.events) == ["find_one_and_update"]
+    participant = is_participant("test_user")
+    event_dal.database.events.find_one_and_update.assert_called_once_with(
+        {"_id": event_id},
+        set_participants(
+            {
+                "$concatArrays": [
+                    {"$ifNull": ["$participants", []]},
+                    [{"$literal": "test_user"}],
+                ]
+            },
+            {"$not": [participant]},
+        ),
+        projection={**CHANGED_EVENT_PROJECTION, "participant": participant},
     )
 
-    result = event_dal.join_event(str(mock_event_id), "test_user")
 
+def test_join_event_already_participating(event_dal):
+    event_dal.database.events.find_one_and_update.return_value = {
+        "_id": ObjectId(),
+        "participant": True,
+    }
+
+    assert event_dal.join_event(str(ObjectId()), "test_user") == (
+        None,
+        ALREADY_PARTICIPANT,
+    )
+    assert commands(event_dal.database.events) == ["find_one_and_update"]
+
+
+def test_join_missing_event(event_dal):
+    event_dal.database.events.find_one_and_update.return_value = None
+
+    assert event_dal.join_event(str(ObjectId()), "test_user") == (
+        None,
+        EVENT_NOT_FOUND,
+    )
+
+
+def test_leave_event(event_dal):
+    event_id = ObjectId()
+    event_dal.database.events.find_one_and_update.return_value = {
+        "_id": event_id,
+        "participant": True,
+    }
+
+    event, error = event_dal.leave_event(str(event_id), "user2")
+
+    assert error is None
+    assert commands(event_dal.database.events) == ["find_one_and_update"]
+    participant = is_participant("user2")
     event_dal.database.events.find_one_and_update.assert_called_once_with(
-        {"_id": ObjectId("0123456789ab0123456789ab")},
-        {"$addToSet": {"participants": "test_user"}},
-        return_document=True,
+        {"_id": event_id},
+        set_participants(
+            {
+                "$filter": {
+                    "input": "$participants",
+                    "cond": {"$ne": ["$$this", {"$literal": "user2"}]},
+                }
+            },
+            participant,
+        ),
+        projection={**CHANGED_EVENT_PROJECTION, "participant": participant},
     )
-    assert result.participants == updated_event["participants"]
 
 
-def test_leave_event(event_dal, get_mock_event):
-    mock_event = Event(**get_mock_event)
-    mock_event_id = mock_event._id
+def test_leave_event_not_participating(event_dal):
+    event_dal.database.events.find_one_and_update.return_value = {
+        "_id": ObjectId(),
+        "participant": False,
+    }
 
-    updated_event = {
-        "_id": mock_event_id,
+    assert event_dal.leave_event(str(ObjectId()), "user2") == (None, NOT_PARTICIPANT)
+
+
+def test_delete_event(event_dal):
+    event_id = ObjectId()
+    event_dal.database.events.find_one_and_delete.return_value = {
+        "_id": event_id,
         "team_id": "test_team",
         "date": "2023-10-01",
         "time": "18:00",
-        "location": "Test Place",
-        "description": "Test Description",
-        "participants": ["user1"],
-        "author": "test_user",
+        "location": {"name": "Test Place"},
     }
-    # Mock the find_one_and_update method to return a mock event
-    event_dal.database.events.find_one_and_update = MagicMock(
-        return_value=updated_event
+
+    event, error = event_dal.delete_event(str(event_id), "test_user")
+
+    assert commands(event_dal.database.events) == ["find_one_and_delete"]
+    event_dal.database.events.find_one_and_delete.assert_called_once_with(
+        {"_id": event_id, "author": "test_user"},
+        projection=CHANGED_EVENT_PROJECTION,
     )
+    assert error is None
+    assert event.location.name() == "Test Place"
+    assert mongodb.local_deletes.peek(str(event_id)) is True
 
-    result = event_dal.leave_event(str(mock_event_id), "user2")
 
-    event_dal.database.events.find_one_and_update.assert_called_once_with(
-        {"_id": ObjectId("0123456789ab0123456789ab")},
-        {"$pull": {"participants": "user2"}},
-        return_document=True,
+def test_delete_event_of_other_user(event_dal):
+    event_id = ObjectId()
+    event_dal.database.events.find_one_and_delete.return_value = None
+    event_dal.database.events.find_one.return_value = {"author": "other_user"}
+
+    assert event_dal.delete_event(str(event_id), "test_user") == (
+        None,
+        NOT_EVENT_AUTHOR,
     )
-    assert result.participants == updated_event["participants"]
+    assert commands(event_dal.database.events) == ["find_one_and_delete", "find_one"]
+    assert mongodb.local_deletes.peek(str(event_id)) is None
 
 
-def test_delete_event(event_dal):
-    mock_event_id = ObjectId()
-    event_dal.database.events.delete_one = MagicMock(
-        return_value=MagicMock(deleted_count=1)
+def test_delete_missing_event(event_dal):
+    event_dal.database.events.find_one_and_delete.return_value = None
+    event_dal.database.events.find_one.return_value = None
+
+    assert event_dal.delete_event(str(ObjectId()), "test_user") == (
+        None,
+        EVENT_NOT_FOUND,
     )
 
-    event_dal.database.events.find_one = MagicMock(
-        return_value={
-            "_id": mock_event_id,
-            "team_id": "test_team",
-            "date": "2023-10-01",
-            "time": "18:00",
-            "location": "Test Place",
-            "description": "Test Description",
-            "participants": ["user1"],
-            "author": "test_user",
-        }
+
+def test_events_between_groups_by_team(mock_mongo_client, get_mock_event):
+    dal = EventBatchMongoDAL(batch_size=10)
+    dal.database.events.aggregate.return_value = iter(
+        [
+            {**get_mock_event, "team_id": "T1", "time": "17:00"},
+            {**get_mock_event, "team_id": "T1", "time": "18:00"},
+            {**get_mock_event, "team_id": "T2"},
+        ]
     )
 
-    result = event_dal.delete_event(str(mock_event_id), "test_user")
+    start = datetime(2023, 10, 1, tzinfo=timezone.utc)
+    end = datetime(2023, 10, 8, tzinfo=timezone.utc)
+
+    grouped = [
+        (team_id, [event.time for event in events])
+        for team_id, events in dal.events_between(start, end, teams=["T1", "T2"])
+    ]
+
+    assert grouped == [("T1", ["17:00", "18:00"]), ("T2", ["18:00"])]
+    pipeline = dal.database.events.aggregate.call_args.args[0]
+    assert pipeline[0] == {
+        "$match": {
+            "starts_at": {"$gte": start, "$lt": end},
+            "team_id": {"$in": ["T1", "T2"]},
+        }
+    }
+    assert list(pipeline[1]["$sort"]) == ["team_id", "starts_at", "_id"]
+    assert dal.database.events.aggregate.call_args.kwargs["batchSize"] == 10
 
-    event_dal.database.events.delete_one.assert_called_once_with(
-        {"_id": mock_event_id, "author": "test_user"}
+
+def test_events_on_is_a_single_day(mock_mongo_client):
+    dal = EventBatchMongoDAL()
+    dal.database.events.aggregate.return_value = iter([])
+
+    assert list(dal.events_on("2023-10-01", tz="Europe/Stockholm")) == []
+    match = dal.database.events.aggregate.call_args.args[0][0]["$match"]
+    assert match == {
+        "starts_at": {
+            "$gte": datetime(2023, 9, 30, 22, tzinfo=timezone.utc),
+            "$lt": datetime(2023, 10, 1, 22, tzinfo=timezone.utc),
+        }
+    }
+
+
+def test_archive_before_moves_events_in_batches(mock_mongo_client):
+    dal = EventBatchMongoDAL(batch_size=2)
+    batches = [
+        [{"_id": 1, "date": "2020-01-01"}, {"_id": 2, "date": "2020-01-02"}],
+        [{"_id": 3, "date": "2020-01-03"}],
+        [],
+    ]
+    dal.database.events.find.return_value.sort.return_value.limit.side_effect = batches
+    dal.database.events.delete_many.side_effect = [
+        MagicMock(deleted_count=2),
+        MagicMock(deleted_count=1),
+    ]
+
+    before = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    assert dal.archive_before(before) == {"archived": 3, "batches": 2}
+
+    dal.database.events.find.assert_called_with({"starts_at": {"$lt": before}})
+    first_write = dal.database.events_archive.bulk_write.call_args_list[0].args[0]
+    assert [request._filter for request in first_write] == [{"_id": 1}, {"_id": 2}]
+    assert all(request._upsert for request in first_write)
+    dal.database.events.delete_many.assert_any_call({"_id": {"$in": [1, 2]}})
+
+
+def test_archive_before_dry_run_only_counts(mock_mongo_client):
+    dal = EventBatchMongoDAL()
+    dal.database.events.count_documents.return_value = 5
+
+    before = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    assert dal.archive_before(before, dry_run=True) == {
+        "archived": 0,
+        "to_archive": 5,
+        "batches": 0,
+    }
+    dal.database.events_archive.bulk_write.assert_not_called()
+    dal.database.events.delete_many.assert_not_called()
+
+
+def test_backfill_starts_at(mock_mongo_client):
+    dal = EventBatchMongoDAL(batch_size=2)
+    dal.database.events.find.return_value.batch_size.return_value = [
+        {"_id": 1, "date": "2023-10-01", "time": "18:00"},
+        {"_id": 2, "date": "2023-10-02", "time": "18:00", "timezone": "UTC"},
+        {"_id": 3, "date": "not a date", "time": "18:00"},
+        {"_id": 4, "date": "2023-10-03", "time": None},
+    ]
+    dal.database.events.bulk_write.side_effect = [
+        MagicMock(modified_count=2),
+        MagicMock(modified_count=1),
+    ]
+
+    assert dal.backfill_starts_at(tz="Europe/Stockholm") == {
+        "updated": 3,
+        "invalid": 1,
+    }
+
+    dal.database.events.find.assert_called_once_with(
+        {"starts_at": {"$exists": False}}, {"date": 1, "time": 1, "timezone": 1}
     )
-    assert result is not None
+    first, second = [
+        call.args[0] for call in dal.database.events.bulk_write.call_args_list
+    ]
+    assert first[0]._doc == {
+        "$set": {
+            "starts_at": datetime(2023, 10, 1, 16, tzinfo=timezone.utc),
+            "timezone": "Europe/Stockholm",
+        }
+    }
+    assert first[1]._doc["$set"]["timezone"] == "UTC"
+    assert second[0]._filter == {"_id": 4}
+
+
+def test_backfill_participant_count(mock_mongo_client):
+    dal = EventBatchMongoDAL()
+    dal.database.events.update_many.return_value.modified_count = 2
+
+    assert dal.backfill_participant_count() == {"updated": 2}
+
+    query, pipeline = dal.database.events.update_many.call_args.args
+    assert query == {"participant_count": {"$exists": False}}
+    assert pipeline[0]["$set"]["participant_count"] == {
+        "$size": {"$ifNull": ["$participants", []]}
+    }
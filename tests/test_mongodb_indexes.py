@@ -0,0 +1,231 @@
+"""
+Verifies with explain() that every query the DALs and the OAuth stores send
+is answered by an index scan. Needs a MongoDB instance, set
+MONGO_TEST_CONNECTION_STRING to run these tests.
+"""
+
+import os
+from datetime import datetime, timezone
+
+import pytest
+from pymongo import MongoClient, monitoring
+from slack_bolt.oauth.internals import Installation
+
+from lib.api import mongodb
+from lib.api.mongodb import (
+    EventBatchMongoDAL,
+    EventMongoDAL,
+    ReminderMongoDAL,
+    ensure_indexes,
+    index_report,
+)
+from lib.bolt.MongoDBBoltOAuth import MongoInstallationStore
+from lib.bolt.MongoDBBoltOAuthStateStore import MongoDBOAuthStateStore
+from lib.models.event import Event
+from lib.utils.date_utils import DEFAULT_TIMEZONE
+
+connection_string = os.getenv("MONGO_TEST_CONNECTION_STRING")
+pytestmark = pytest.mark.skipif(
+    connection_string is None, reason="MONGO_TEST_CONNECTION_STRING is not set"
+)
+
+DATABASE = "events_index_test"
+EXPLAINABLE = {"find", "findAndModify", "update", "delete", "aggregate", "count"}
+COMMAND_METADATA = {"lsid", "$db", "$clusterTime", "txnNumber", "$readPreference"}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name in EXPLAINABLE and event.database_name == DATABASE:
+            self.commands.append(
+                {
+                    key: value
+                    for key, value in event.command.items()
+                    if key not in COMMAND_METADATA
+                }
+            )
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def plan_stages(plan):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+@pytest.fixture
+def database():
+    recorder = CommandRecorder()
+    client = MongoClient(connection_string, event_listeners=[recorder])
+    client.drop_database(DATABASE)
+    database = client[DATABASE]
+    ensure_indexes(database)
+    # Make sure the planner has something to choose from
+    database.events.insert_many(
+        [
+            {
+                "team_id": f"T{i % 10}",
+                "date": "2030-01-01",
+                "time": "18:00",
+                "starts_at": datetime(2030, 1, 1, 17, tzinfo=timezone.utc),
+                "timezone": DEFAULT_TIMEZONE,
+            }
+            for i in range(100)
+        ]
+    )
+    recorder.commands.clear()
+    yield database, recorder
+    client.drop_database(DATABASE)
+    client.close()
+
+
+def assert_index_scans(database, recorder):
+    assert recorder.commands
+    for command in recorder.commands:
+        explained = database.command({"explain": command, "verbosity": "queryPlanner"})
+        planner = (
+            explained.get("queryPlanner")
+            or explained["stages"][0]["$cursor"]["queryPlanner"]
+        )
+        stages = set(plan_stages(planner["winningPlan"]))
+        assert "COLLSCAN" not in stages, command
+
+
+def test_event_dal_queries_use_indexes(database):
+    database, recorder = database
+    dal = EventMongoDAL("T1")
+    dal.database = database
+    event_id = dal.insert_event(
+        Event(
+            _id=None,
+            team_id="T1",
+            date="2030-01-02",
+            time="18:00",
+            location={"name": "Test Place"},
+            author="U1",
+        )
+    )
+    recorder.commands.clear()
+
+    dal.list_events(start_date="2030-01-01")
+    dal.list_events(start_date="2030-01-01", end_date="2030-02-01", limit=5)
+    dal.list_events(start_date="2030-01-01", limit=5, viewer="U2")
+    dal.get_event(event_id)
+    dal.join_event(event_id, "U2")
+    dal.list_participants(event_id)
+    dal.leave_event(event_id, "U2")
+    dal.delete_event(event_id, "U1")
+
+    assert_index_scans(database, recorder)
+
+
+def test_event_mutations_take_one_round_trip(database):
+    database, recorder = database
+    dal = EventMongoDAL("T1")
+    dal.database = database
+    event_id = dal.insert_event(
+        Event(
+            _id=None,
+            team_id="T1",
+            date="2030-01-02",
+            time="18:00",
+            location={"name": "Test Place"},
+            author="U1",
+        )
+    )
+
+    for action in (
+        lambda: dal.join_event(event_id, "U2"),
+        lambda: dal.leave_event(event_id, "U2"),
+        lambda: dal.delete_event(event_id, "U1"),
+    ):
+        recorder.commands.clear()
+        assert action()[1] is None
+        assert len(recorder.commands) == 1
+
+    recorder.commands.clear()
+    assert dal.join_event(event_id, "U9") == (None, mongodb.EVENT_NOT_FOUND)
+    assert len(recorder.commands) == 1
+
+    recorder.commands.clear()
+    assert dal.delete_event(event_id, "U1") == (None, mongodb.EVENT_NOT_FOUND)
+    assert len(recorder.commands) == 2
+
+
+def test_oauth_queries_use_indexes(database):
+    database, recorder = database
+    store = MongoInstallationStore()
+    store.db = database
+    store.save(Installation(team_id="T1", user_id="U1", bot_token="xoxb-1"))
+    recorder.commands.clear()
+
+    store.find_installation(enterprise_id=None, team_id="T1", user_id="U1")
+    store.find_installation(
+        enterprise_id="E1", team_id=None, user_id="U1", is_enterprise_install=True
+    )
+    store.find_bot(enterprise_id=None, team_id="T1")
+    store.find_bot(enterprise_id="E1", team_id=None, is_enterprise_install=True)
+    store.delete_installation(enterprise_id=None, team_id="T1", user_id="U1")
+    store.delete_bot(enterprise_id=None, team_id="T1")
+
+    dal = mongodb.OauthMongoDAL()
+    dal.database = database
+    mongodb.workspace_cache.clear()
+    dal.get_workspace("T1")
+
+    state_store = MongoDBOAuthStateStore(expiration_seconds=600)
+    state_store.oauth_dal.database = database
+    state_store.consume(state_store.issue())
+
+    assert_index_scans(database, recorder)
+
+
+def test_ensure_indexes_is_idempotent(database):
+    database, _ = database
+    first = ensure_indexes(database)
+    second = ensure_indexes(database)
+    assert first == second
+    report = index_report(database)
+    assert all(not collection["missing"] for collection in report.values())
+
+
+def test_reminder_queries_use_indexes(database):
+    database, recorder = database
+    dal = ReminderMongoDAL()
+    dal.database = database
+
+    dal.sent({"T1": "2030-01-01"})
+    dal.mark_sent("T1", "2030-01-01")
+    dal.acquire_lock("reminders", "owner", 60)
+    dal.release_lock("reminders", "owner")
+
+    assert_index_scans(database, recorder)
+
+
+def test_event_batch_queries_use_indexes(database):
+    database, recorder = database
+    dal = EventBatchMongoDAL()
+    dal.database = database
+
+    list(dal.events_on("2030-01-01"))
+    list(
+        dal.events_between(
+            datetime(2030, 1, 1, tzinfo=timezone.utc),
+            datetime(2030, 2, 1, tzinfo=timezone.utc),
+            teams=["T1", "T2"],
+        )
+    )
+    dal.archive_before(datetime(2030, 1, 2, tzinfo=timezone.utc))
+
+    assert_index_scans(database, recorder)
@@ -0,0 +1,79 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from slack_bolt.oauth.internals import Installation
+
+from lib.api.mongodb import AsyncOauthMongoDAL, OauthMongoDAL
+from lib.bolt.MongoDBBoltOAuth import MongoInstallationStore
+
+
+@pytest.fixture
+def mock_mongo_client():
+    with patch("lib.api.mongodb.MongoClient") as mock_client:
+        yield mock_client
+
+
+@pytest.fixture
+def oauth_dal(mock_mongo_client):
+    dal = OauthMongoDAL()
+    dal.database.slack_installations.find_one = MagicMock(
+        return_value={"team_id": "T123", "bot_token": "xoxb-123"}
+    )
+    return dal
+
+
+def test_get_workspace_is_cached(oauth_dal):
+    assert oauth_dal.get_workspace("T123")["bot_token"] == "xoxb-123"
+    assert oauth_dal.get_workspace("T123")["bot_token"] == "xoxb-123"
+    oauth_dal.database.slack_installations.find_one.assert_called_once_with(
+        {"team_id": "T123"}
+    )
+
+
+def test_missing_workspace_is_not_cached(oauth_dal):
+    oauth_dal.database.slack_installations.find_one.return_value = None
+    assert oauth_dal.get_workspace("T404") is None
+    assert oauth_dal.get_workspace("T404") is None
+    assert oauth_dal.database.slack_installations.find_one.call_count == 2
+
+
+def test_save_invalidates_workspace(oauth_dal):
+    oauth_dal.get_workspace("T123")
+    store = MongoInstallationStore()
+    with patch("lib.bolt.MongoDBBoltOAuth.WebClient"):
+        store.save(Installation(team_id="T123", user_id="U123", bot_token="xoxb-456"))
+    oauth_dal.get_workspace("T123")
+    assert oauth_dal.database.slack_installations.find_one.call_count == 2
+
+
+def test_delete_bot_invalidates_workspace(oauth_dal):
+    oauth_dal.get_workspace("T123")
+    MongoInstallationStore().delete_bot(enterprise_id=None, team_id="T123")
+    oauth_dal.get_workspace("T123")
+    assert oauth_dal.database.slack_installations.find_one.call_count == 2
+
+
+def test_enterprise_install_invalidates_enterprise_workspaces(oauth_dal):
+    oauth_dal.get_workspace("T123", "E123")
+    MongoInstallationStore().delete_installation(enterprise_id="E123", team_id=None)
+    oauth_dal.get_workspace("T123", "E123")
+    assert oauth_dal.database.slack_installations.find_one.call_count == 2
+
+
+def test_async_get_workspace_shares_cache(oauth_dal):
+    async_dal = AsyncOauthMongoDAL()
+    async_dal.database = MagicMock()
+    async_dal.database.slack_installations.find_one = AsyncMock(
+        return_value={"team_id": "T456", "bot_token": "xoxb-456"}
+    )
+
+    workspace = asyncio.run(async_dal.get_workspace("T456"))
+    assert workspace["bot_token"] == "xoxb-456"
+    assert asyncio.run(async_dal.get_workspace("T456")) == workspace
+    async_dal.database.slack_installations.find_one.assert_awaited_once_with(
+        {"team_id": "T456"}
+    )
+
+    oauth_dal.get_workspace("T123")
+    assert asyncio.run(async_dal.get_workspace("T123"))["bot_token"] == "xoxb-123"
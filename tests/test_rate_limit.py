@@ -0,0 +1,51 @@
+from lib.utils.rate_limit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+def test_burst_is_served_without_waiting():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=3, timer=clock, sleep=clock.sleep)
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert clock.sleeps == []
+
+
+def test_callers_wait_in_order_when_empty():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=1, timer=clock, sleep=clock.sleep)
+    bucket.acquire()
+    assert bucket.acquire() == 0.5
+    assert bucket.acquire() == 1.0
+
+
+def test_bucket_refills():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=1, timer=clock, sleep=clock.sleep)
+    bucket.acquire()
+    clock.now = 5
+    assert bucket.acquire() == 0
+
+
+def test_pause_holds_back_callers():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, capacity=10, timer=clock, sleep=clock.sleep)
+    bucket.pause(30)
+    assert bucket.acquire() == 30
+
+
+def test_reserve_leaves_the_waiting_to_the_caller():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=1, timer=clock, sleep=clock.sleep)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0.5
+    assert clock.sleeps == []
@@ -0,0 +1,160 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+
+from lib.models.event import Event
+from lib.reminders import ReminderScheduler
+
+
+def make_event(team_id, date="2030-01-01"):
+    return Event(
+        _id=None,
+        team_id=team_id,
+        date=date,
+        time="18:00",
+        location=None,
+        participants=["U1"],
+        author="U1",
+    )
+
+
+@pytest.fixture
+def reminder_dal():
+    dal = MagicMock()
+    dal.acquire_lock.return_value = True
+    dal.bots.return_value = [
+        {"team_id": "T1", "bot_token": "xoxb-1"},
+        {"team_id": "T2", "bot_token": "xoxb-2", "timezone": "America/New_York"},
+        {"team_id": "T3", "bot_token": "xoxb-3"},
+    ]
+    dal.sent.return_value = set()
+    dal.mark_sent.return_value = True
+    return dal
+
+
+@pytest.fixture
+def event_batch_dal():
+    dal = MagicMock()
+    dal.events_between.side_effect = lambda start, end, teams: iter(
+        [("T1", [make_event("T1"), make_event("T1", "2029-12-31")])]
+        if "T1" in teams
+        else []
+    )
+    return dal
+
+
+@pytest.fixture
+def scheduler(reminder_dal, event_batch_dal):
+    with patch("lib.reminders.ChannelDirectory") as channel_directory:
+        channel_directory.return_value.get_channel_id.return_value = "C1"
+        services = MagicMock()
+        services.event_dal.return_value.timezone = "Europe/Stockholm"
+        yield ReminderScheduler(
+            services,
+            reminder_dal=reminder_dal,
+            event_batch_dal=event_batch_dal,
+            hour=9,
+            concurrency=2,
+        )
+
+
+# 10:00 in Stockholm, 04:00 in New York
+NOW = datetime(2030, 1, 1, 9, 0, tzinfo=timezone.utc)
+
+
+def test_due_teams_respect_timezone(scheduler, reminder_dal):
+    assert scheduler.due(reminder_dal.bots(), NOW) == {
+        "T1": "2030-01-01",
+        "T3": "2030-01-01",
+    }
+
+
+def test_due_date_is_the_day_of_the_event_list(scheduler):
+    # 10:00 on January 1st in Kiritimati, still December 31st in Stockholm
+    now = datetime(2029, 12, 31, 20, 0, tzinfo=timezone.utc)
+    bots = [{"team_id": "T1", "bot_token": "xoxb-1", "timezone": "Pacific/Kiritimati"}]
+
+    assert scheduler.due(bots, now) == {"T1": "2029-12-31"}
+
+
+def test_run_once_reminds_due_teams(scheduler, reminder_dal, event_batch_dal):
+    assert scheduler.run_once(now=NOW) == {"T1": 1, "T3": 0}
+
+    # Midnight to midnight in Stockholm
+    event_batch_dal.events_between.assert_called_once_with(
+        datetime(2029, 12, 31, 23, tzinfo=timezone.utc),
+        datetime(2030, 1, 1, 23, tzinfo=timezone.utc),
+        teams={"T1": "2030-01-01", "T3": "2030-01-01"},
+    )
+    scheduler.services.event_handler.assert_called_once()
+    assert scheduler.services.event_handler.call_args.args == ("T1",)
+    reminder_dal.release_lock.assert_called_once()
+
+
+def test_channel_is_looked_up_with_the_team_client(scheduler):
+    with patch("lib.reminders.ChannelDirectory") as channel_directory:
+        channel_directory.return_value.get_channel_id.return_value = "C1"
+        scheduler.run_once(now=NOW)
+
+    client = scheduler.services.web_client
+    client.assert_called_once_with("T1", "xoxb-1")
+    channel_directory.assert_called_once_with(client.return_value, "T1")
+    event_handler = scheduler.services.event_handler.return_value
+    assert event_handler.todays_event.call_args.kwargs == {"channel_id": "C1"}
+
+
+def test_nothing_is_posted_without_the_channel(scheduler, reminder_dal):
+    with patch("lib.reminders.ChannelDirectory") as channel_directory:
+        channel_directory.return_value.get_channel_id.return_value = None
+        assert scheduler.run_once(now=NOW) == {"T1": 0, "T3": 0}
+
+    scheduler.services.event_handler.assert_not_called()
+    reminder_dal.unmark_sent.assert_called_once_with("T1", "2030-01-01")
+
+
+def test_failed_reminder_is_retried(scheduler, reminder_dal):
+    event_handler = scheduler.services.event_handler.return_value
+    event_handler.todays_event.side_effect = Exception("channel_not_found")
+
+    assert scheduler.run_once(now=NOW) == {"T1": 0, "T3": 0}
+    reminder_dal.unmark_sent.assert_called_once_with("T1", "2030-01-01")
+
+
+def test_only_posted_events_are_counted(scheduler, reminder_dal, event_batch_dal):
+    event_batch_dal.events_between.side_effect = lambda start, end, teams: iter(
+        [("T1", [make_event("T1"), make_event("T1")])]
+    )
+    event_handler = scheduler.services.event_handler.return_value
+    event_handler.todays_event.side_effect = [None, Exception("ratelimited")]
+
+    with patch("lib.reminders.metrics") as metrics:
+        assert scheduler.run_once(now=NOW) == {"T1": 1, "T3": 0}
+
+    assert metrics.inc.call_args_list == [
+        call("reminders_failed_total"),
+        call("reminders_sent_total", 1),
+    ]
+    reminder_dal.unmark_sent.assert_not_called()
+
+
+def test_run_once_skips_teams_already_reminded(scheduler, reminder_dal):
+    reminder_dal.sent.return_value = {"T1"}
+    reminder_dal.mark_sent.side_effect = lambda team_id, date: team_id != "T3"
+
+    assert scheduler.run_once(now=NOW) == {}
+    scheduler.services.event_handler.assert_not_called()
+
+
+def test_run_once_needs_the_lock(scheduler, reminder_dal):
+    reminder_dal.acquire_lock.return_value = False
+
+    assert scheduler.run_once(now=NOW) == {}
+    reminder_dal.bots.assert_not_called()
+
+
+def test_dry_run_posts_nothing(scheduler, reminder_dal):
+    assert scheduler.run_once(now=NOW, dry_run=True) == {"T1": 1, "T3": 0}
+    reminder_dal.acquire_lock.assert_not_called()
+    reminder_dal.mark_sent.assert_not_called()
+    scheduler.services.event_handler.assert_not_called()
@@ -0,0 +1,107 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from lib.api.memory import MemoryStorage
+from lib.api.storage import MongoStorage
+from lib.services import ServiceContainer
+from lib.utils.date_utils import DEFAULT_TIMEZONE
+
+
+@pytest.fixture
+def services():
+    with patch("lib.services.Slack") as mock_slack:
+        mock_slack.side_effect = lambda team_id, **kwargs: MagicMock(team_id=team_id)
+        yield ServiceContainer(google_places=MagicMock(), storage=MemoryStorage())
+
+
+def test_dependencies_are_built_once_per_team(services):
+    first = services.event_handler("team_a")
+    second = services.event_handler("team_a")
+
+    assert first is not second
+    assert first.event_dal is second.event_dal
+    assert first.slack is second.slack
+    assert first.google_places is second.google_places
+
+
+def test_dependencies_are_scoped_by_team(services):
+    team_a = services.event_handler("team_a")
+    team_b = services.event_handler("team_b")
+
+    assert team_a.event_dal.team_id == "team_a"
+    assert team_b.event_dal.team_id == "team_b"
+    assert team_a.google_places is team_b.google_places
+
+
+def test_event_handler_uses_request_functions(services):
+    client, say, respond = MagicMock(), MagicMock(), MagicMock()
+    handler = services.event_handler("team_a", client, say, respond)
+
+    assert handler.team_id == "team_a"
+    assert handler.bolt_client is client
+    assert handler.say is say
+    assert handler.respond is respond
+
+
+def test_google_places_is_created_lazily():
+    with patch("lib.services.GooglePlaces") as mock_places:
+        services = ServiceContainer()
+        mock_places.assert_not_called()
+        assert services.google_places is services.google_places
+        mock_places.assert_called_once()
+
+
+def test_web_clients_are_shared_per_team_and_token(services):
+    client = services.web_client("team_a", "xoxb-1")
+
+    assert services.web_client("team_a", "xoxb-1") is client
+    assert services.web_client("team_b", "xoxb-2") is not client
+    assert services.web_client("team_a", "xoxb-3").token == "xoxb-3"
+    assert services.async_web_client("team_a", "xoxb-3").team_id == "team_a"
+
+
+def test_slack_uses_the_client_of_the_team():
+    storage = MemoryStorage()
+    storage.save_installation({"team_id": "T1", "bot_token": "xoxb-1"})
+    services = ServiceContainer(google_places=MagicMock(), storage=storage)
+
+    slack = services.slack("T1")
+
+    assert slack.client is services.web_client("T1", "xoxb-1")
+    assert slack.channels.client is slack.client
+
+
+def test_event_dal_is_in_the_timezone_of_the_team():
+    storage = MemoryStorage()
+    storage.save_installation({"team_id": "T1", "timezone": "America/New_York"})
+    storage.save_installation({"team_id": "T2", "timezone": "Not/A_Zone"})
+    services = ServiceContainer(google_places=MagicMock(), storage=storage)
+
+    assert services.event_dal("T1").timezone == "America/New_York"
+    assert services.event_dal("T2").timezone == DEFAULT_TIMEZONE
+    assert services.event_dal("T3").timezone == DEFAULT_TIMEZONE
+
+
+def test_place_details_are_not_persisted_by_the_memory_storage(monkeypatch):
+    monkeypatch.delenv("PLACES_CACHE_PERSIST", raising=False)
+    with patch("lib.services.GooglePlaces") as mock_places:
+        ServiceContainer(storage=MemoryStorage()).google_places
+
+    details_cache = mock_places.call_args.kwargs["details_cache"]
+    assert details_cache.persist is False
+    assert details_cache.place_dal is None
+
+
+def test_storage_is_selected_by_storage_backend(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    assert isinstance(
+        ServiceContainer(google_places=MagicMock()).storage, MemoryStorage
+    )
+
+    monkeypatch.delenv("STORAGE_BACKEND")
+    assert isinstance(ServiceContainer(google_places=MagicMock()).storage, MongoStorage)
+
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    with pytest.raises(ValueError):
+        ServiceContainer(google_places=MagicMock())
@@ -0,0 +1,156 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from slack_sdk.errors import SlackApiError
+
+from lib.api.slack import (
+    AsyncRateLimitedWebClient,
+    ChannelDirectory,
+    RateLimitedWebClient,
+    Slack,
+    method_bucket,
+)
+from lib.utils.metrics import metrics
+
+
+@pytest.fixture
+def client():
+    client = MagicMock()
+    client.conversations_list.side_effect = [
+        {
+            "channels": [{"name": "general", "id": "C1"}],
+            "response_metadata": {"next_cursor": "page2"},
+        },
+        {
+            "channels": [{"name": "afterwork", "id": "C2"}],
+            "response_metadata": {"next_cursor": ""},
+        },
+    ]
+    return client
+
+
+def test_get_channel_id_paginates(client):
+    directory = ChannelDirectory(client, "T123")
+    assert directory.get_channel_id("afterwork") == "C2"
+    assert client.conversations_list.call_count == 2
+    assert client.conversations_list.call_args.kwargs["cursor"] == "page2"
+
+
+def test_get_channel_id_is_cached(client):
+    ChannelDirectory(client, "T123").get_channel_id("general")
+    directory = ChannelDirectory(client, "T123")
+    assert directory.get_channel_id("general") == "C1"
+    assert directory.get_channel_id("missing") is None
+    assert client.conversations_list.call_count == 2
+
+
+def test_get_channel_id_from_persisted_directory(client):
+    channel_dal = MagicMock()
+    channel_dal.get_channels.return_value = {"afterwork": "C9"}
+    directory = ChannelDirectory(client, "T123", channel_dal=channel_dal)
+    assert directory.get_channel_id("afterwork") == "C9"
+    client.conversations_list.assert_not_called()
+
+
+def test_refresh_persists_directory(client):
+    channel_dal = MagicMock()
+    channel_dal.get_channels.return_value = None
+    directory = ChannelDirectory(client, "T123", channel_dal=channel_dal)
+    directory.get_channel_id("afterwork")
+    channel_dal.save_channels.assert_called_once_with(
+        "T123", {"general": "C1", "afterwork": "C2"}
+    )
+
+
+def test_slack_uses_the_bot_token_of_the_team(monkeypatch):
+    monkeypatch.setenv("SLACK_BOT_TOKEN", "xoxb-env")
+    workspaces = {"T1": {"bot_token": "xoxb-1"}}
+    oauth_dal = MagicMock()
+    oauth_dal.get_workspace.side_effect = workspaces.get
+
+    slack = Slack("T1", oauth_dal=oauth_dal)
+    channels = slack.channels
+    assert channels.client.token == "xoxb-1"
+    assert slack.channels is channels
+
+    # Installed again with a new token
+    workspaces["T1"] = {"bot_token": "xoxb-2"}
+    assert slack.channels.client.token == "xoxb-2"
+    assert Slack("T2", oauth_dal=oauth_dal).client.token == "xoxb-env"
+
+
+@pytest.fixture
+def base_api_call():
+    with patch("slack_sdk.web.base_client.BaseClient.api_call") as api_call:
+        yield api_call
+
+
+def slack_error(status, headers=None):
+    return SlackApiError(
+        "error", MagicMock(status_code=status, headers=headers or {"Retry-After": "0"})
+    )
+
+
+def test_rate_limited_call_is_retried(base_api_call):
+    base_api_call.side_effect = [slack_error(429), {"ok": True}]
+    client = RateLimitedWebClient(token="xoxb", team_id="T123")
+    rate_limited = metrics.get(
+        "slack_api_rate_limited_total", method="chat.postEphemeral"
+    )
+
+    assert client.chat_postEphemeral(channel="C1", user="U1", text="hi") == {"ok": True}
+    assert base_api_call.call_count == 2
+    assert (
+        metrics.get("slack_api_rate_limited_total", method="chat.postEphemeral")
+        == rate_limited + 1
+    )
+
+
+def test_rate_limited_call_gives_up(base_api_call):
+    base_api_call.side_effect = slack_error(429)
+    client = RateLimitedWebClient(token="xoxb", team_id="T123", max_retries=1)
+
+    with pytest.raises(SlackApiError):
+        client.views_publish(user_id="U1", view={})
+    assert base_api_call.call_count == 2
+
+
+def test_server_errors_are_retried_for_idempotent_calls(base_api_call):
+    base_api_call.side_effect = [slack_error(503), {"ok": True}]
+    client = RateLimitedWebClient(token="xoxb", team_id="T123", backoff=0)
+
+    assert client.views_publish(user_id="U1", view={}) == {"ok": True}
+    assert base_api_call.call_count == 2
+
+
+def test_server_errors_are_not_retried_for_messages(base_api_call):
+    base_api_call.side_effect = [slack_error(503), {"ok": True}]
+    client = RateLimitedWebClient(token="xoxb", team_id="T123", backoff=0)
+
+    with pytest.raises(SlackApiError):
+        client.chat_postMessage(channel="C1", text="hi")
+    base_api_call.assert_called_once()
+
+
+def test_async_rate_limited_call_is_retried():
+    client = AsyncRateLimitedWebClient(token="xoxb", team_id="T123")
+    with patch(
+        "slack_sdk.web.async_base_client.AsyncBaseClient.api_call",
+        new_callable=AsyncMock,
+    ) as api_call, patch("lib.api.slack.asyncio.sleep", new_callable=AsyncMock):
+        api_call.side_effect = [slack_error(429, {"Retry-After": "2"}), {"ok": True}]
+        response = asyncio.run(client.views_publish(user_id="U1", view={}))
+
+    assert response == {"ok": True}
+    assert api_call.await_count == 2
+    # The pause is shared with the sync clients of the team
+    assert method_bucket("T123", "views.publish").paused_until > 0
+
+
+def test_buckets_are_scoped_by_team_and_method():
+    assert method_bucket("T1", "views.publish") is method_bucket("T1", "views.publish")
+    assert method_bucket("T1", "views.publish") is not method_bucket(
+        "T2", "views.publish"
+    )
+    assert method_bucket("T1", "conversations.list").rate == 20 / 60
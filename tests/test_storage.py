@@ -0,0 +1,212 @@
+"""
+The storage contract, run against the in-memory engine and, when
+MONGO_TEST_CONNECTION_STRING is set, against MongoDB.
+"""
+
+import os
+
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient
+
+from lib.api.identity_map import request_scope
+from lib.api.memory import MemoryStorage, project
+from lib.api.mongodb import (
+    ALREADY_PARTICIPANT,
+    EVENT_NOT_FOUND,
+    NOT_EVENT_AUTHOR,
+    NOT_PARTICIPANT,
+    ensure_indexes,
+)
+from lib.api.storage import MongoStorage
+from lib.models.event import Event
+
+connection_string = os.getenv("MONGO_TEST_CONNECTION_STRING")
+DATABASE = "events_storage_test"
+
+
+@pytest.fixture(
+    params=[
+        "memory",
+        pytest.param(
+            "mongodb",
+            marks=pytest.mark.skipif(
+                connection_string is None,
+                reason="MONGO_TEST_CONNECTION_STRING is not set",
+            ),
+        ),
+    ]
+)
+def storage(request):
+    if request.param == "memory":
+        yield MemoryStorage()
+        return
+    client = MongoClient(connection_string)
+    client.drop_database(DATABASE)
+    ensure_indexes(client[DATABASE])
+    yield MongoStorage(client[DATABASE])
+    client.drop_database(DATABASE)
+    client.close()
+
+
+def make_event(date, time="18:00", team_id="T1", author="U1"):
+    return Event(
+        _id=None,
+        team_id=team_id,
+        date=date,
+        time=time,
+        location={"name": f"Place on {date}"},
+        author=author,
+    )
+
+
+@pytest.fixture
+def event_dal(storage):
+    return storage.event_dal("T1")
+
+
+def test_lists_a_window_of_the_team_in_order(storage, event_dal):
+    for date, time in [
+        ("2030-01-03", "18:00"),
+        ("2030-01-01", "19:00"),
+        ("2030-01-01", "17:00"),
+        ("2029-12-31", "18:00"),
+        ("2030-02-01", "18:00"),
+    ]:
+        event_dal.insert_event(make_event(date, time))
+    storage.event_dal("T2").insert_event(make_event("2030-01-02", team_id="T2"))
+
+    events = event_dal.list_events(start_date="2030-01-01", end_date="2030-01-31")
+
+    assert [(event.date, event.time) for event in events] == [
+        ("2030-01-01", "17:00"),
+        ("2030-01-01", "19:00"),
+        ("2030-01-03", "18:00"),
+    ]
+
+
+def test_pages_with_a_cursor(event_dal):
+    for day in range(1, 6):
+        event_dal.insert_event(make_event(f"2030-01-0{day}"))
+
+    first = event_dal.list_events(start_date="2030-01-01", limit=2)
+    second = event_dal.list_events(
+        start_date="2030-01-01", limit=2, after=event_dal.page_cursor(first[-1])
+    )
+
+    assert [event.date for event in first + second] == [
+        "2030-01-01",
+        "2030-01-02",
+        "2030-01-03",
+        "2030-01-04",
+    ]
+
+
+def test_join_adds_a_participant_once(event_dal):
+    id = event_dal.insert_event(make_event("2030-01-01"))
+
+    event, error = event_dal.join_event(id, "U2")
+    assert error is None
+    assert event.location.name() == "Place on 2030-01-01"
+    assert event_dal.join_event(id, "U2") == (None, ALREADY_PARTICIPANT)
+    assert event_dal.join_event(id, "U3")[1] is None
+
+    event = event_dal.get_event(id)
+    assert (event.participants, event.participant_count) == (["U2", "U3"], 2)
+
+
+def test_leave_removes_a_participant(event_dal):
+    id = event_dal.insert_event(make_event("2030-01-01"))
+    event_dal.join_event(id, "U2")
+
+    assert event_dal.leave_event(id, "U2")[1] is None
+    assert event_dal.leave_event(id, "U2") == (None, NOT_PARTICIPANT)
+
+    event = event_dal.get_event(id)
+    assert (event.participants, event.participant_count) == ([], 0)
+
+
+def test_join_and_leave_of_missing_event(event_dal):
+    assert event_dal.join_event(str(ObjectId()), "U2") == (None, EVENT_NOT_FOUND)
+    assert event_dal.leave_event(str(ObjectId()), "U2") == (None, EVENT_NOT_FOUND)
+
+
+def test_only_the_author_deletes(event_dal):
+    id = event_dal.insert_event(make_event("2030-01-01", author="U1"))
+
+    assert event_dal.delete_event(id, "U2") == (None, NOT_EVENT_AUTHOR)
+    event, error = event_dal.delete_event(id, "U1")
+    assert error is None
+    assert event.location.name() == "Place on 2030-01-01"
+    assert event_dal.get_event(id) is None
+    assert event_dal.delete_event(id, "U1") == (None, EVENT_NOT_FOUND)
+    assert event_dal.list_events(start_date="2030-01-01") == []
+
+
+def test_lists_events_for_a_viewer(event_dal):
+    id = event_dal.insert_event(make_event("2030-01-01"))
+    for i in range(12):
+        event_dal.join_event(id, f"U{i:02d}")
+
+    joined, other = [
+        event_dal.list_events(start_date="2030-01-01", viewer=viewer)[0]
+        for viewer in ("U05", "U99")
+    ]
+
+    assert (joined.participant_count, joined.joined) == (12, True)
+    assert (other.participant_count, other.joined) == (12, False)
+    assert len(joined.participants) == 10
+
+
+def test_pages_through_participants(event_dal):
+    id = event_dal.insert_event(make_event("2030-01-01"))
+    for i in range(5):
+        event_dal.join_event(id, f"U{i}")
+
+    assert event_dal.list_participants(id, page=1, page_size=2) == (["U2", "U3"], 5)
+    assert event_dal.list_participants(str(ObjectId())) is None
+
+
+def test_returned_events_are_copies(event_dal):
+    id = event_dal.insert_event(make_event("2030-01-01"))
+
+    event_dal.get_event(id).participants.append("U2")
+
+    assert event_dal.get_event(id).participants == []
+
+
+def test_writes_are_recorded_in_the_identity_map(event_dal):
+    with request_scope() as identity_map:
+        id = event_dal.insert_event(make_event("2030-01-01"))
+        event_dal.join_event(id, "U2")
+
+    assert [kind for kind, _, _ in identity_map.take_changes()] == [
+        "inserted",
+        "joined",
+    ]
+
+
+def test_finds_workspaces_by_team_or_enterprise(storage):
+    if isinstance(storage, MemoryStorage):
+        storage.save_installation({"team_id": "T1", "bot_token": "xoxb-1"})
+        storage.save_installation({"enterprise_id": "E1", "bot_token": "xoxb-2"})
+    else:
+        storage.database.slack_installations.insert_many(
+            [
+                {"team_id": "T1", "bot_token": "xoxb-1"},
+                {"enterprise_id": "E1", "team_id": None, "bot_token": "xoxb-2"},
+            ]
+        )
+    oauth_dal = storage.oauth_dal()
+
+    assert oauth_dal.get_workspace("T1")["bot_token"] == "xoxb-1"
+    assert oauth_dal.get_workspace(None, "E1")["bot_token"] == "xoxb-2"
+    assert oauth_dal.get_workspace("T2") is None
+
+
+def test_project():
+    document = {"_id": 1, "a": 1, "b": {"c": 2, "d": 3}}
+
+    assert project(document, {"b.c": 1}) == {"_id": 1, "b": {"c": 2}}
+    assert project(document, {"b": 0}) == {"_id": 1, "a": 1}
+    assert project(document, None) is document